@@ -0,0 +1,73 @@
+"""
+Per-call latency of 'python -m pIcon.client' with and without a resident daemon.
+
+    python benchmarks/daemon_latency.py [--calls 20] [--size 512]
+
+Both runs spawn a fresh interpreter per call, exactly like a Make/Ninja rule.
+Without a daemon the client falls back to running the CLI in-process.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _time_calls(argv, env, calls):
+    out = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        subprocess.run(argv, env=env, check=True, stdout=subprocess.DEVNULL)
+        out.append(time.perf_counter() - t0)
+    return out
+
+def _wait_for(path, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise RuntimeError("daemon did not start")
+        time.sleep(0.05)
+
+def _row(label, samples):
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return f"{label:<16} mean {statistics.mean(ms):7.1f} ms   p50 {statistics.median(ms):7.1f} ms   p95 {p95:7.1f} ms"
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--calls", type=int, default=20)
+    p.add_argument("--size", type=int, default=512, help="Side of the synthetic input PNG")
+    ns = p.parse_args(argv)
+
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "in.png")
+        Image.new("RGBA", (ns.size, ns.size), (40, 120, 200, 255)).save(src)
+        sock = os.path.join(tmp, "pIcon.sock")
+        env = dict(os.environ, PICON_SOCKET=sock,
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        call = [sys.executable, "-m", "pIcon.client", src, os.path.join(tmp, "out.ico")]
+
+        cold = _time_calls(call, env, ns.calls)
+
+        daemon = subprocess.Popen([sys.executable, "-m", "pIcon.cli", "--cli", "daemon", "--socket", sock,
+                                   "--idle-timeout", "120"], env=env, stderr=subprocess.DEVNULL)
+        try:
+            _wait_for(sock)
+            warm = _time_calls(call, env, ns.calls)
+        finally:
+            subprocess.run([sys.executable, "-m", "pIcon.cli", "--cli", "daemon", "--stop", "--socket", sock],
+                           env=env, stderr=subprocess.DEVNULL)
+            daemon.wait(timeout=10)
+
+    print(f"{ns.calls} calls, {ns.size}x{ns.size} PNG -> default sizes")
+    print(_row("in-process", cold))
+    print(_row("via daemon", warm))
+    print(f"speedup (mean): {statistics.mean(cold) / statistics.mean(warm):.2f}x")
+
+if __name__ == "__main__":
+    main()
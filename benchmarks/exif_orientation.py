@@ -0,0 +1,94 @@
+"""
+Eager vs deferred EXIF orientation on rotated 12 MP photos.
+
+    python benchmarks/exif_orientation.py [--repeat 5] [--orientations 1,3,6,8] [--work-dir DIR]
+
+For each orientation a 4000x3000 JPEG (and PNG) tagged with it is generated once.
+Two ways to reach the same icon frames are timed (best of --repeat):
+- eager: load_image_as_rgba transposes the decoded image, then render_frames
+- deferred: load stays in stored orientation, render_frames(orientation=...)
+  transposes only the pyramid level feeding the final filter
+Decoding runs with and without JPEG draft scaling ("full" = no draft, as when
+the crop zoom or an upscale needs every pixel). The frames are checked for
+byte equality so the speed-up is never bought with different output.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+W, H = 4000, 3000
+
+def _make_inputs(work: str, orientations) -> None:
+    from PIL import Image
+
+    img = None
+    for o in orientations:
+        for ext, kwargs in ((".jpg", {"quality": 90}), (".png", {"compress_level": 1})):
+            path = os.path.join(work, f"o{o}{ext}")
+            if os.path.exists(path):
+                continue
+            if img is None:
+                print("generating inputs ...", file=sys.stderr, flush=True)
+                img = Image.merge("RGB", [Image.linear_gradient("L").resize((W, H)),
+                                          Image.effect_noise((W, H), 48),
+                                          Image.linear_gradient("L").rotate(90).resize((W, H))])
+            exif = Image.Exif()
+            exif[0x0112] = o
+            img.save(path + ".part", format=ext[1:].replace("jpg", "jpeg").upper(),
+                     exif=exif.tobytes(), **kwargs)
+            os.replace(path + ".part", path)
+
+def _best(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--orientations", default="1,3,6,8")
+    p.add_argument("--work-dir", default=None)
+    ns = p.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from pIcon.core import DEFAULT_SIZES, load_image_as_rgba, oriented_size, plan_square, render_frames
+    from pIcon.core.images import ORIENTATION_KEY
+
+    orientations = [int(v) for v in ns.orientations.split(",") if v.strip()]
+    work = ns.work_dir or os.path.join(tempfile.gettempdir(), "pIcon-bench-orientation")
+    os.makedirs(work, exist_ok=True)
+    _make_inputs(work, orientations)
+    sizes = [n for n in DEFAULT_SIZES if n <= 256]
+
+    def eager(path, hint, mode):
+        base = load_image_as_rgba(path, target_size=hint)
+        return render_frames(base, plan_square(base.size, mode), sizes)
+
+    def deferred(path, hint, mode):
+        base = load_image_as_rgba(path, target_size=hint, defer_orientation=True)
+        o = base.info.get(ORIENTATION_KEY, 1)
+        return render_frames(base, plan_square(oriented_size(base.size, o), mode), sizes, orientation=o)
+
+    print(f"{'input':<10}{'decode':<8}{'fit':<6}{'eager ms':>10}{'deferred ms':>13}{'speed-up':>10}")
+    mismatches = 0
+    for o in orientations:
+        for ext, hints in ((".jpg", ((256, "draft"), (None, "full"))), (".png", ((None, "full"),))):
+            path = os.path.join(work, f"o{o}{ext}")
+            for hint, label in hints:
+                for mode in ("pad", "crop"):
+                    te, fe = _best(lambda: eager(path, hint, mode), ns.repeat)
+                    td, fd = _best(lambda: deferred(path, hint, mode), ns.repeat)
+                    same = all(fe[n].tobytes() == fd[n].tobytes() for n in sizes)
+                    mismatches += not same
+                    print(f"o{o}{ext:<8}{label:<8}{mode:<6}{te * 1000:>10.1f}{td * 1000:>13.1f}"
+                          f"{te / td:>9.2f}x" + ("" if same else "  OUTPUT DIFFERS"), flush=True)
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Stage-by-stage benchmark of the core conversion pipeline on synthetic inputs.
+
+    python benchmarks/pipeline.py run -o results.json [--scales small,medium,large,huge] [--repeat 3]
+    python benchmarks/pipeline.py compare baseline.json results.json [--threshold 10]
+
+Inputs are generated once into --work-dir: PNG/JPEG/WebP/TIFF, from 0.06 MP to
+100 MP ('huge'), opaque and with alpha, square and 4:1. Every case runs in its
+own interpreter so peak RSS is per case; on Linux the RSS high-water mark is
+also reset before each stage (/proc/self/clear_refs), giving each stage its own
+peak and growth over the RSS it started with. Stages timed separately:
+load (load_image_as_rgba), make_square per fit mode, resize (render_frames to
+the default ladder), ico_save (write_ico) and end_to_end (create_multi_resolution_ico).
+Times are the median (and best) of --repeat runs; compare uses the best. tracemalloc
+peaks come from one extra traced run (Python-side allocations only; Pillow's
+pixel buffers show up in RSS).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORMATS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp", "tiff": ".tif"}
+SCALES = {"small": 256 * 256, "medium": 2048 * 2048, "large": 6000 * 4000, "huge": 10000 * 10000}
+ASPECTS = {"square": 1.0, "wide": 4.0}
+FIT_MODES = ("pad", "crop", "stretch")
+STAGES = ("load",) + tuple(f"make_square_{m}" for m in FIT_MODES) + ("resize", "ico_save", "end_to_end")
+_WEBP_MAX_SIDE = 16383
+
+def _dims(scale: str, aspect: str):
+    px, ratio = SCALES[scale], ASPECTS[aspect]
+    h = max(1, int(round((px / ratio) ** 0.5)))
+    return max(1, int(round(h * ratio))), h
+
+def _cases(formats, scales, aspects):
+    for fmt in formats:
+        for scale in scales:
+            for aspect in aspects:
+                for alpha in (False, True):
+                    if alpha and fmt == "jpeg":
+                        continue
+                    yield f"{fmt}-{scale}-{aspect}-{'alpha' if alpha else 'opaque'}", fmt, scale, aspect, alpha
+
+def _make_input(path: str, fmt: str, scale: str, aspect: str, alpha: bool) -> None:
+    """Gradients plus noise, so codecs do realistic work."""
+    from PIL import Image
+
+    w, h = _dims(scale, aspect)
+    if fmt == "webp" and max(w, h) > _WEBP_MAX_SIDE:
+        f = _WEBP_MAX_SIDE / max(w, h)
+        w, h = int(w * f), int(h * f)
+    r = Image.linear_gradient("L").resize((w, h))
+    g = Image.effect_noise((w, h), 48)
+    b = Image.linear_gradient("L").rotate(90).resize((w, h))
+    bands = [r, g, b]
+    mode = "RGB"
+    if alpha:
+        bands.append(Image.radial_gradient("L").resize((w, h)).point(lambda v: 255 - v))
+        mode = "RGBA"
+    img = Image.merge(mode, bands)
+    kwargs = {"jpeg": {"quality": 90}, "webp": {"quality": 90}, "tiff": {"compression": "tiff_lzw"}}.get(fmt, {})
+    tmp = path + ".part"
+    img.save(tmp, format=fmt.upper(), **kwargs)
+    os.replace(tmp, path)
+
+def _run_case(path: str, repeat: int) -> dict:
+    """Child process: time each stage, then one traced pass for tracemalloc peaks."""
+    import resource
+    import tracemalloc
+    sys.path.insert(0, ROOT)
+    from PIL import Image
+    from pIcon.core import (DEFAULT_SIZES, create_multi_resolution_ico, load_image_as_rgba,
+                            make_square, plan_square, render_frames, write_ico)
+
+    sizes = list(DEFAULT_SIZES)
+    hint = max(n for n in sizes if n <= 256)
+    out_dir = tempfile.mkdtemp(prefix="pIcon-bench-")
+    ico = os.path.join(out_dir, "out.ico")
+    state = {}
+
+    def stage_fns():
+        def load():
+            state["base"] = load_image_as_rgba(path, target_size=hint)
+
+        def square(mode):
+            return lambda: make_square(state["base"], mode)
+
+        def resize():
+            base = state["base"]
+            plan = plan_square(base.size, "pad")
+            frames = render_frames(base, plan, sizes)
+            state["frames"] = [frames[n] for n in sizes]
+
+        def ico_save():
+            write_ico(ico, state["frames"])
+
+        def end_to_end():
+            create_multi_resolution_ico(path, ico, sizes)
+
+        fns = [("load", load)] + [(f"make_square_{m}", square(m)) for m in FIT_MODES]
+        return fns + [("resize", resize), ("ico_save", ico_save), ("end_to_end", end_to_end)]
+
+    def proc_status_mb(field):
+        try:
+            with open("/proc/self/status", "r") as f:
+                for line in f:
+                    if line.startswith(field + ":"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def case_peak_mb():
+        # VmHWM resets at exec; ru_maxrss on Linux carries over the parent's peak
+        peak = proc_status_mb("VmHWM")
+        if peak is not None:
+            return peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    def reset_peak():
+        """Reset VmHWM to the current RSS (Linux >= 4.0); False where that is unavailable."""
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            return False
+        return proc_status_mb("VmHWM") is not None
+
+    times = {name: [] for name in STAGES}
+    rss = {name: {"rss_peak_mb": 0.0, "rss_growth_mb": 0.0} for name in STAGES}
+    per_stage = True
+    case_peak = 0.0
+    for _ in range(repeat):
+        for name, fn in stage_fns():
+            case_peak = max(case_peak, case_peak_mb())  # before a reset forgets it
+            per_stage = per_stage and reset_peak()
+            start = proc_status_mb("VmRSS") if per_stage else None
+            t0 = time.perf_counter()
+            fn()
+            times[name].append(time.perf_counter() - t0)
+            if per_stage:
+                peak = proc_status_mb("VmHWM")
+                r = rss[name]
+                r["rss_peak_mb"] = max(r["rss_peak_mb"], peak)
+                r["rss_growth_mb"] = max(r["rss_growth_mb"], round(peak - start, 1))
+    case_peak = max(case_peak, case_peak_mb())
+
+    traced = {}
+    tracemalloc.start()
+    for name, fn in stage_fns():
+        tracemalloc.reset_peak()
+        fn()
+        traced[name] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+    tracemalloc.stop()
+
+    with Image.open(path) as im:
+        info = {"format": im.format, "mode": im.mode, "width": im.width, "height": im.height,
+                "bytes": os.path.getsize(path)}
+    try:
+        os.remove(ico)
+        os.rmdir(out_dir)
+    except OSError:
+        pass
+    stages = {name: {"seconds": round(statistics.median(times[name]), 6),
+                     "min_seconds": round(min(times[name]), 6),
+                     "tracemalloc_peak_mb": traced[name],
+                     # without a resettable high-water mark only the case peak means anything
+                     **(rss[name] if per_stage else {})} for name in STAGES}
+    return {"input": info, "rss_peak_mb": case_peak, "stages": stages}
+
+def cmd_run(ns) -> int:
+    sys.path.insert(0, ROOT)
+    import PIL
+    from pIcon import __version__
+
+    formats = _split(ns.formats, FORMATS)
+    scales = _split(ns.scales, SCALES)
+    aspects = _split(ns.aspects, ASPECTS)
+    work = ns.work_dir or os.path.join(tempfile.gettempdir(), "pIcon-bench-inputs")
+    os.makedirs(work, exist_ok=True)
+
+    results = {}
+    for name, fmt, scale, aspect, alpha in _cases(formats, scales, aspects):
+        path = os.path.join(work, name + FORMATS[fmt])
+        if not os.path.exists(path):
+            print(f"generating {name} ...", file=sys.stderr, flush=True)
+            _make_input(path, fmt, scale, aspect, alpha)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_case", path, str(ns.repeat)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{name}: FAILED\n{proc.stderr}", file=sys.stderr)
+            results[name] = {"error": proc.stderr.strip().splitlines()[-1:] or ["unknown"]}
+            continue
+        res = json.loads(proc.stdout)
+        results[name] = res
+        st = res["stages"]
+        print(f"{name:<28} " + "  ".join(f"{k} {st[k]['seconds'] * 1000:8.1f}ms" for k in ("load", "resize", "ico_save"))
+              + f"  rss peak {res['rss_peak_mb']:7.1f}MB", flush=True)
+
+    doc = {"meta": {"pIcon": __version__, "pillow": PIL.__version__, "python": platform.python_version(),
+                    "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                    "repeat": ns.repeat, "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+           "results": results}
+    with open(ns.output, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=1, sort_keys=True)
+    print(f"wrote {ns.output} ({len(results)} cases)")
+    return 1 if any("error" in r for r in results.values()) else 0
+
+def cmd_compare(ns) -> int:
+    with open(ns.baseline, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(ns.current, "r", encoding="utf-8") as f:
+        cur = json.load(f)
+    limit = 1 + ns.threshold / 100
+    regressions, compared = [], 0
+    for case, b in sorted(base["results"].items()):
+        c = cur["results"].get(case)
+        if c is None or "stages" not in b or "stages" not in c:
+            continue
+        if b.get("rss_peak_mb") and c.get("rss_peak_mb") is not None:
+            compared += 1
+            old, new = b["rss_peak_mb"], c["rss_peak_mb"]
+            if new > old * limit and new - old > ns.min_mb:
+                regressions.append((case, "case", "rss_peak_mb", old, new))
+        for stage, bs in b["stages"].items():
+            cs = c["stages"].get(stage)
+            if cs is None:
+                continue
+            # best-of-N time is far less noisy than the median on a shared machine
+            for metric, floor in (("min_seconds", ns.min_ms / 1000), ("rss_peak_mb", ns.min_mb),
+                                  ("rss_growth_mb", ns.min_mb), ("tracemalloc_peak_mb", ns.min_mb)):
+                old, new = bs.get(metric), cs.get(metric)
+                if not old or new is None:
+                    continue
+                compared += 1
+                if new > old * limit and new - old > floor:
+                    regressions.append((case, stage, metric, old, new))
+
+    for case, stage, metric, old, new in regressions:
+        print(f"REGRESSION {case} {stage} {metric}: {old:g} -> {new:g} (+{(new / old - 1) * 100:.0f}%)")
+    print(f"{compared} metrics compared, {len(regressions)} regressions beyond {ns.threshold:g}% "
+          f"(baseline pIcon {base['meta'].get('pIcon')}/Pillow {base['meta'].get('pillow')}, "
+          f"current pIcon {cur['meta'].get('pIcon')}/Pillow {cur['meta'].get('pillow')})")
+    return 1 if regressions else 0
+
+def _split(value: str, known: dict):
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    bad = [v for v in items if v not in known]
+    if bad:
+        raise SystemExit(f"unknown value(s) {', '.join(bad)}; choose from {', '.join(known)}")
+    return items
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_case"]:
+        print(json.dumps(_run_case(argv[1], int(argv[2]))))
+        return 0
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Run the suite and write JSON results")
+    r.add_argument("-o", "--output", required=True)
+    r.add_argument("--formats", default=",".join(FORMATS))
+    r.add_argument("--scales", default="small,medium,large",
+                   help=f"Comma list of {', '.join(SCALES)} ('huge' is 100 MP)")
+    r.add_argument("--aspects", default=",".join(ASPECTS))
+    r.add_argument("--repeat", type=int, default=3)
+    r.add_argument("--work-dir", default=None, help="Where generated inputs are kept between runs")
+    c = sub.add_parser("compare", help="Flag regressions against a saved baseline")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown/growth in percent")
+    c.add_argument("--min-ms", type=float, default=5.0, help="Ignore time differences below this")
+    c.add_argument("--min-mb", type=float, default=4.0, help="Ignore memory differences below this")
+    ns = p.parse_args(argv)
+    return cmd_run(ns) if ns.cmd == "run" else cmd_compare(ns)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Per-frame cost of the crop preview while dragging, on a synthetic 50 MP source.
+
+    python benchmarks/preview_drag.py [--megapixels 50] [--side 512] [--frames 60]
+
+Simulates a drag (the crop centre moves a few source pixels per frame) at
+several zoom levels and reports p50/p95/max milliseconds per frame for:
+- pyramid: MipPyramid.render at the on-screen side (what the GUI does)
+- full: make_square on the full-resolution image + resize (the previous path;
+  timed on a few frames only, it is slow)
+PhotoImage creation is not included (needs a display); it depends only on
+the preview side, not on the source.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _stats(samples):
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+    return pick(0.5) * 1000, pick(0.95) * 1000, s[-1] * 1000
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--megapixels", type=float, default=50.0)
+    p.add_argument("--side", type=int, default=512, help="On-screen preview side in px")
+    p.add_argument("--frames", type=int, default=60)
+    p.add_argument("--full-frames", type=int, default=3, help="Frames timed on the previous full-resolution path")
+    ns = p.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from PIL import Image
+    from pIcon.core import make_square
+    from pIcon.core.geometry import MipPyramid
+
+    h = int((ns.megapixels * 1e6 / 1.5) ** 0.5)
+    w = int(h * 1.5)
+    print(f"generating {w}x{h} RGBA ...", file=sys.stderr, flush=True)
+    img = Image.merge("RGBA", [Image.linear_gradient("L").resize((w, h)), Image.effect_noise((w, h), 48),
+                               Image.linear_gradient("L").rotate(90).resize((w, h)),
+                               Image.new("L", (w, h), 255)])
+    t0 = time.perf_counter()
+    pyramid = MipPyramid(img)
+    print(f"pyramid build: {(time.perf_counter() - t0) * 1000:.0f} ms, {len(pyramid.levels)} levels")
+
+    print(f"{'zoom':>6}{'path':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for zoom in (1.0, 2.0, 5.0, 20.0):
+        for name, frames in (("pyramid", ns.frames), ("full", ns.full_frames)):
+            samples = []
+            for i in range(frames):
+                center = (w / 2 + 7 * i, h / 2 - 3 * i)
+                t0 = time.perf_counter()
+                if name == "pyramid":
+                    pyramid.render(ns.side, "crop", crop_center=center, crop_zoom=zoom)
+                else:
+                    make_square(img, "crop", crop_center=center, crop_zoom=zoom).resize((ns.side, ns.side))
+                samples.append(time.perf_counter() - t0)
+            p50, p95, mx = _stats(samples)
+            print(f"{zoom:>6g}{name:>9}{p50:>9.1f}{p95:>9.1f}{mx:>9.1f}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,52 @@
+import contextlib
 import sys
+import time
 from .core.sizes import DEFAULT_SIZES, parse_custom_sizes
-from .core.images import create_multi_resolution_ico
+from .core.images import build_ico, create_multi_resolution_ico
+from .core.cache import DEFAULT_MAX_BYTES
+from .core.ico import DEFAULT_COMPRESS_LEVEL, PNG_MIN_SIZE, write_bytes_atomic
+from .core.probe import probe_image
+from .core.tiled import DEFAULT_MAX_MEMORY, parse_memory
+from .core.timings import TimingRecorder, format_table, peak_rss_mb, recording, stage
 
-def _cli(args):
-    import argparse
-    p = argparse.ArgumentParser(description="Create a multi-resolution Windows .ico from an image (PNG/JPG/GIF/WEBP first frame/HEIC via pi-heif).")
-    p.add_argument("input_png", help="Path to input image")
-    p.add_argument("output_ico", help="Path to output .ico")
+def _add_common_args(p):
     p.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
                    help="Comma/space-separated sizes (e.g., 16,24,32,48,64,96,128,192,256)")
     p.add_argument("--fit", choices=["pad", "crop", "stretch"], default="pad")
     p.add_argument("--padrgb", default="0,0,0,0",
                    help="Pad RGBA color, e.g., 0,0,0,0 (transparent)")
-    ns = p.parse_args(args)
+    p.add_argument("--png-min-size", type=int, default=PNG_MIN_SIZE,
+                   help=f"Store entries of at least this size as PNG, smaller as BMP (default {PNG_MIN_SIZE})")
+    p.add_argument("--compress-level", type=int, choices=range(10), default=DEFAULT_COMPRESS_LEVEL,
+                   metavar="0-9", help=f"PNG zlib level: 0 fastest .. 9 smallest (default {DEFAULT_COMPRESS_LEVEL})")
+    p.add_argument("--cache-dir", default=None,
+                   help="Reuse results from this content-addressed cache directory")
+    p.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                   help="Cache size cap in MB; least recently used entries are evicted")
+    p.add_argument("--cache-stats", action="store_true",
+                   help="Print cache hits/misses and size after converting")
+    p.add_argument("--max-memory", default=f"{DEFAULT_MAX_MEMORY // (1024 * 1024)}M",
+                   help="Decode larger sources in bands to stay under this (e.g. 512M, 2G; 0 = off)")
+    p.add_argument("--max-megapixels", type=float, default=0,
+                   help="Reject sources with more pixels than this before decoding (0 = only Pillow's bomb check)")
 
+def _add_timing_args(p):
+    p.add_argument("--timings", action="store_true",
+                   help="Print time spent per pipeline stage (decode, render, encode, ...)")
+    p.add_argument("--timings-json", default=None, metavar="FILE",
+                   help="Write per-stage timing/memory events as JSON ('-' = stdout)")
+
+def _write_timings_json(path, doc):
+    import json
+    text = json.dumps(doc, indent=1)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+
+def _parse_common(ns):
+    """Validate --sizes/--padrgb; exits with status 1 on bad values."""
     sizes = parse_custom_sizes(ns.sizes)
     if not sizes:
         print("No valid sizes provided.", file=sys.stderr)
@@ -28,11 +61,383 @@ def _cli(args):
         sys.exit(1)
 
     try:
-        create_multi_resolution_ico(ns.input_png, ns.output_ico, sizes, fit_mode=ns.fit, pad_rgba=rgba)
+        ns.max_memory = parse_memory(ns.max_memory)
+    except ValueError:
+        print("--max-memory must be a size like 512M or 2G", file=sys.stderr)
+        sys.exit(1)
+    if ns.max_megapixels < 0:
+        print("--max-megapixels must be >= 0", file=sys.stderr)
+        sys.exit(1)
+    ns.max_pixels = int(ns.max_megapixels * 1_000_000) or None
+    return sizes, rgba
+
+def _encode_kwargs(ns):
+    return {"png_min_size": ns.png_min_size, "compress_level": ns.compress_level,
+            "cache_dir": ns.cache_dir, "cache_max_bytes": ns.cache_max_mb * 1024 * 1024,
+            "max_memory": ns.max_memory, "max_pixels": ns.max_pixels}
+
+def _print_cache_stats(ns, hits=None, misses=None, file=None):
+    from .core.cache import IconCache, cache_counters
+    if not ns.cache_dir:
+        print("Cache: disabled (no --cache-dir)", file=file)
+        return
+    st = IconCache(ns.cache_dir, ns.cache_max_mb * 1024 * 1024).stats()
+    if hits is None:
+        hits, misses = cache_counters()["hits"], cache_counters()["misses"]
+    print(f"Cache: {hits} hits, {misses} misses; {st['entries']} entries, "
+          f"{st['bytes'] / 1048576:.1f}/{st['max_bytes'] / 1048576:.0f} MB", file=file)
+
+def _cli(args):
+    if args and args[0] == "batch":
+        return _cli_batch(args[1:])
+    if args and args[0] == "build":
+        return _cli_build(args[1:])
+    if args and args[0] == "watch":
+        return _cli_watch(args[1:])
+    if args and args[0] == "daemon":
+        return _cli_daemon(args[1:])
+    if args and args[0] == "probe":
+        return _cli_probe(args[1:])
+
+    import argparse
+    p = argparse.ArgumentParser(description="Create a multi-resolution Windows .ico from an image (PNG/JPG/GIF/WEBP first frame/HEIC via pi-heif).",
+                                epilog="Use 'batch' as the first argument to convert many files at once, "
+                                       "'build' to rebuild a manifest incrementally, 'watch' to follow a folder, "
+                                       "'probe' to inspect image headers, "
+                                       "or 'daemon' to keep a resident worker for pIcon.client.")
+    p.add_argument("input_png", help="Path to input image ('-' reads stdin)")
+    p.add_argument("output_ico", help="Path to output .ico ('-' writes stdout)")
+    _add_common_args(p)
+    p.add_argument("--compare-resize", action="store_true",
+                   help="Also report time and max pixel error of mip-chain vs direct resizing")
+    _add_timing_args(p)
+    ns = p.parse_args(args)
+
+    sizes, rgba = _parse_common(ns)
+
+    to_stdout = ns.output_ico == "-"
+    if to_stdout and ns.timings_json == "-":
+        print("--timings-json - conflicts with writing the icon to stdout", file=sys.stderr)
+        sys.exit(1)
+    if ns.cache_dir and (to_stdout or ns.input_png == "-"):
+        print("--cache-dir needs an input and an output file; it cannot be used with '-'", file=sys.stderr)
+        sys.exit(1)
+    log = sys.stderr if to_stdout else sys.stdout
+    source = sys.stdin.buffer.read() if ns.input_png == "-" else ns.input_png
+
+    if not isinstance(source, bytes):
+        try:
+            # headers only: reject missing/unsupported/oversized inputs before any decoding
+            probe_image(source, ns.max_pixels)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    if ns.compare_resize:
+        try:
+            _print_resize_comparison(source, sizes, ns.fit, rgba, file=log)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    rec = TimingRecorder() if (ns.timings or ns.timings_json) else None
+    t0 = time.perf_counter()
+    try:
+        with (recording(rec) if rec is not None else contextlib.nullcontext()):
+            if isinstance(source, bytes) or to_stdout:
+                data = build_ico(source, sizes, fit_mode=ns.fit, pad_rgba=rgba,
+                                 png_min_size=ns.png_min_size, compress_level=ns.compress_level,
+                                 max_memory=ns.max_memory, max_pixels=ns.max_pixels)
+                with stage("write", bytes=len(data)):
+                    if to_stdout:
+                        sys.stdout.buffer.write(data)
+                        sys.stdout.buffer.flush()
+                    else:
+                        write_bytes_atomic(ns.output_ico, data)
+            else:
+                create_multi_resolution_ico(ns.input_png, ns.output_ico, sizes, fit_mode=ns.fit, pad_rgba=rgba,
+                                            **_encode_kwargs(ns))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(2)
-    print(f"Saved {ns.output_ico}")
+    wall = time.perf_counter() - t0
+    if not to_stdout:
+        print(f"Saved {ns.output_ico}")
+    if ns.cache_stats:
+        _print_cache_stats(ns, file=log)
+    if rec is not None:
+        if ns.timings:
+            print(format_table(rec.totals(), wall), file=log)
+        if ns.timings_json:
+            _write_timings_json(ns.timings_json, {"input": ns.input_png, "output": ns.output_ico,
+                                                  "wall_seconds": wall, "totals": rec.totals(),
+                                                  "rss_peak_mb": peak_rss_mb(), "events": rec.events})
+
+def _print_resize_comparison(source, sizes, fit_mode, rgba, file=None):
+    from .core.images import ORIENTATION_KEY, load_and_plan
+    from .core.geometry import compare_strategies, oriented_size
+
+    file = file or sys.stdout
+    base, plan, ico_sizes = load_and_plan(source, sizes, fit_mode, rgba)
+    orientation = base.info.get(ORIENTATION_KEY, 1)
+    res = compare_strategies(base, plan, ico_sizes, orientation=orientation)
+    direct, mip = res["direct_seconds"], res["mip_seconds"]
+    w, h = oriented_size(base.size, orientation)
+    print(f"Resize {w}x{h} -> {','.join(map(str, ico_sizes))} ({fit_mode})", file=file)
+    print(f"  direct: {direct * 1000:8.1f} ms", file=file)
+    print(f"  mip:    {mip * 1000:8.1f} ms  ({direct / mip if mip else float('inf'):.2f}x)", file=file)
+    print("  max pixel error (mip vs direct): " +
+          ", ".join(f"{n}:{e}" for n, e in res["max_error"].items()), file=file)
+
+def _cli_batch(args):
+    import argparse
+    from .core.batch import collect_jobs, run_batch
+
+    p = argparse.ArgumentParser(prog="pIcon batch",
+                                description="Convert many images to .ico in parallel, mirroring the input tree.")
+    p.add_argument("inputs", nargs="*", help="Files, directories or glob patterns (quote globs)")
+    p.add_argument("-o", "--out-dir", required=True, help="Output root directory")
+    p.add_argument("--from-file", action="append", default=[], metavar="LIST",
+                   help="Text file with one input path per line (repeatable)")
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="Worker processes (default: CPU count)")
+    _add_common_args(p)
+    _add_timing_args(p)
+    ns = p.parse_args(args)
+
+    sizes, rgba = _parse_common(ns)
+    if ns.jobs is not None and ns.jobs < 1:
+        print("--jobs must be >= 1", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        jobs = collect_jobs(ns.inputs, ns.out_dir, ns.from_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if not jobs:
+        print("No input images found.", file=sys.stderr)
+        sys.exit(1)
+
+    total = len(jobs)
+    done = [0]
+
+    def _report(res):
+        done[0] += 1
+        prefix = f"[{done[0]}/{total}]"
+        if res.ok:
+            print(f"{prefix} ok   {res.job.input_path} -> {res.job.output_path} ({res.seconds:.2f}s)", flush=True)
+        else:
+            print(f"{prefix} FAIL {res.job.input_path}: {res.error}", file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    want_timings = bool(ns.timings or ns.timings_json)
+    results = run_batch(jobs, sizes, fit_mode=ns.fit, pad_rgba=rgba,
+                        max_workers=ns.jobs, on_result=_report, collect_timings=want_timings,
+                        **_encode_kwargs(ns))
+    elapsed = time.perf_counter() - t0
+
+    failed = sum(1 for r in results if not r.ok)
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(f"Converted {total - failed}/{total} files in {elapsed:.2f}s "
+          f"({rate:.1f} files/s), {failed} failed")
+    if ns.cache_stats:
+        hits = sum(1 for r in results if r.cached)
+        _print_cache_stats(ns, hits, total - failed - hits)
+    if want_timings:
+        _report_batch_timings(ns, results)
+    if failed:
+        sys.exit(2)
+
+def _report_batch_timings(ns, results):
+    from .core.timings import percentiles
+
+    samples = {}
+    for r in results:
+        for name, secs in r.timings.items():
+            samples.setdefault(name, []).append(secs)
+    samples["total"] = [r.seconds for r in results if r.ok]
+    stats = percentiles(samples)
+    if ns.timings:
+        print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'files':>7}")
+        for name, row in stats.items():
+            print(f"{name:<16}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['count']:>7}")
+    if ns.timings_json:
+        _write_timings_json(ns.timings_json, {
+            "stages": stats,
+            "files": [{"input": r.job.input_path, "output": r.job.output_path, "ok": r.ok,
+                       "seconds": r.seconds, "cached": r.cached, "timings": r.timings} for r in results],
+        })
+
+def _cli_probe(args):
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser(prog="pIcon probe",
+                                description="Print format, size, mode, frames, EXIF orientation and ICC presence "
+                                            "of images by reading only their headers.")
+    p.add_argument("inputs", nargs="+", help="Image files")
+    p.add_argument("--max-megapixels", type=float, default=0,
+                   help="Also report files with more pixels than this as rejected")
+    p.add_argument("--json", action="store_true", help="One JSON object per line")
+    ns = p.parse_args(args)
+
+    max_pixels = int(ns.max_megapixels * 1_000_000) or None
+    rejected = 0
+    for path in ns.inputs:
+        try:
+            pr = probe_image(path, max_pixels)
+        except (OSError, ValueError) as e:
+            rejected += 1
+            err = str(e) if isinstance(e, FileNotFoundError) else f"{path}: {e}"
+            if ns.json:
+                print(json.dumps({"path": path, "error": err}))
+            else:
+                print(f"REJECT {err}", file=sys.stderr)
+            continue
+        if ns.json:
+            print(json.dumps({"path": path, "format": pr.format, "width": pr.size[0], "height": pr.size[1],
+                              "mode": pr.mode, "frames": pr.frames, "orientation": pr.orientation,
+                              "icc": pr.has_icc}))
+        else:
+            print(f"{path}: {pr.format} {pr.size[0]}x{pr.size[1]} {pr.mode}, {pr.frames} frame(s), "
+                  f"orientation {pr.orientation}{', ICC' if pr.has_icc else ''}")
+    if rejected:
+        sys.exit(2)
+
+def _cli_build(args):
+    import argparse
+    from .core.manifest import build, default_state_path, load_manifest, plan_build, read_state
+
+    p = argparse.ArgumentParser(prog="pIcon build",
+                                description="Rebuild the icons listed in a TOML/JSON manifest, skipping up-to-date outputs.")
+    p.add_argument("manifest", help="Manifest file (.toml or .json)")
+    p.add_argument("--state", default=None,
+                   help="State file (default: <manifest>.state.json next to the manifest)")
+    p.add_argument("--dry-run", action="store_true", help="List what would be rebuilt and why, then exit")
+    p.add_argument("--force", action="store_true", help="Rebuild every entry")
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="Worker processes (default: CPU count)")
+    ns = p.parse_args(args)
+
+    if ns.jobs is not None and ns.jobs < 1:
+        print("--jobs must be >= 1", file=sys.stderr)
+        sys.exit(1)
+    try:
+        entries = load_manifest(ns.manifest)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    state_path = ns.state or default_state_path(ns.manifest)
+
+    t0 = time.perf_counter()
+    plan = plan_build(entries, read_state(state_path), ns.force)
+    if ns.dry_run:
+        for e, reason in plan.stale:
+            print(f"would build {e.output} ({reason})")
+        print(f"{len(plan.stale)} stale, {len(plan.fresh)} up to date "
+              f"(checked in {time.perf_counter() - t0:.2f}s)")
+        return
+
+    total = len(plan.stale)
+    done = [0]
+
+    def _report(res):
+        done[0] += 1
+        prefix = f"[{done[0]}/{total}]"
+        if res.ok:
+            print(f"{prefix} ok   {res.job.output_path} ({res.seconds:.2f}s)", flush=True)
+        else:
+            print(f"{prefix} FAIL {res.job.input_path}: {res.error}", file=sys.stderr, flush=True)
+
+    try:
+        _, results = build(entries, state_path, max_workers=ns.jobs, on_result=_report, plan=plan)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    failed = sum(1 for r in results if not r.ok)
+    print(f"Built {total - failed}/{total} stale icons, {len(plan.fresh)} up to date, "
+          f"{failed} failed in {time.perf_counter() - t0:.2f}s")
+    if failed:
+        sys.exit(2)
+
+def _cli_watch(args):
+    import argparse
+    from .core.watch import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, IconWatcher
+
+    p = argparse.ArgumentParser(prog="pIcon watch",
+                                description="Watch a folder and regenerate the matching .ico whenever an image changes.")
+    p.add_argument("src_dir", help="Folder to watch (recursively)")
+    p.add_argument("out_dir", help="Output root; the source tree is mirrored")
+    p.add_argument("-j", "--jobs", type=int, default=2, help="Worker processes (default: 2)")
+    p.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                   help=f"Seconds a file must stay unchanged before converting (default {DEFAULT_DEBOUNCE:g})")
+    p.add_argument("--backend", choices=["auto", "inotify", "poll"], default="auto",
+                   help="Change detection: inotify (Linux) or mtime polling (default: auto)")
+    p.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                   help=f"Seconds between scans with the poll backend (default {DEFAULT_POLL_INTERVAL:g})")
+    p.add_argument("--no-catch-up", action="store_true",
+                   help="Do not convert sources whose .ico is missing or older at startup")
+    _add_common_args(p)
+    ns = p.parse_args(args)
+
+    sizes, rgba = _parse_common(ns)
+    if ns.jobs < 1:
+        print("--jobs must be >= 1", file=sys.stderr)
+        sys.exit(1)
+
+    def _report(ev):
+        res = ev.result
+        stamp = time.strftime("%H:%M:%S")
+        if res.ok:
+            print(f"{stamp} rebuilt {res.job.output_path} in {ev.latency * 1000:.0f} ms "
+                  f"(convert {res.seconds * 1000:.0f} ms)", flush=True)
+        else:
+            print(f"{stamp} FAIL {res.job.input_path}: {res.error}", file=sys.stderr, flush=True)
+
+    watcher = IconWatcher(ns.src_dir, ns.out_dir, sizes, fit_mode=ns.fit, pad_rgba=rgba,
+                          workers=ns.jobs, debounce=ns.debounce, poll_interval=ns.poll_interval,
+                          backend=ns.backend, catch_up=not ns.no_catch_up, on_event=_report,
+                          **_encode_kwargs(ns))
+    print(f"Watching {watcher.src_root} -> {watcher.out_root} (Ctrl+C to stop)", file=sys.stderr, flush=True)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def _cli_daemon(args):
+    import argparse
+    from .client import default_socket_path
+    from .daemon import DEFAULT_IDLE_TIMEOUT, serve, stop
+
+    p = argparse.ArgumentParser(prog="pIcon daemon",
+                                description="Stay resident on a Unix socket and run CLI calls forwarded by 'python -m pIcon.client'.")
+    p.add_argument("--socket", default=None, help=f"Socket path (default: {default_socket_path()})")
+    p.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                   help="Exit after this many seconds without requests (0 = never)")
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="Forwarded calls run at once, each in a forked child (default: CPU count)")
+    p.add_argument("--stop", action="store_true", help="Stop a running daemon and exit")
+    ns = p.parse_args(args)
+
+    if ns.stop:
+        if not stop(ns.socket):
+            print("No pIcon daemon is running.", file=sys.stderr)
+            sys.exit(1)
+        return
+    if ns.jobs is not None and ns.jobs < 1:
+        print("--jobs must be >= 1", file=sys.stderr)
+        sys.exit(1)
+    try:
+        serve(ns.socket, ns.idle_timeout, ns.jobs)
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--cli":
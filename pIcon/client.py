@@ -0,0 +1,109 @@
+"""
+Thin CLI client for the pIcon daemon.
+
+    python -m pIcon.client INPUT.png OUTPUT.ico --sizes 16,32,256
+
+Takes the same arguments as 'python -m pIcon.cli --cli'. If a daemon is
+listening (see 'pIcon daemon'), argv is forwarded over its Unix socket and its
+stdout/stderr/exit code are relayed; otherwise the CLI runs in-process.
+Deliberately imports nothing heavy (no Pillow) so startup stays cheap.
+"""
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+_HEADER = struct.Struct(">I")
+_CONNECT_TIMEOUT = 0.5
+
+def default_socket_path() -> str:
+    """$PICON_SOCKET, else a per-user socket in $XDG_RUNTIME_DIR or the temp dir."""
+    env = os.environ.get("PICON_SOCKET")
+    if env:
+        return env
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(base, f"pIcon-{uid}.sock")
+
+def send_msg(sock: socket.socket, obj: Dict[str, Any]) -> None:
+    data = json.dumps(obj).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+def recv_msg(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    head = _recv_exact(sock, _HEADER.size)
+    if head is None:
+        return None
+    (n,) = _HEADER.unpack(head)
+    body = _recv_exact(sock, n)
+    if body is None:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+def connect(path: Optional[str] = None) -> Optional[socket.socket]:
+    """Connected socket to a running daemon, or None."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = path or default_socket_path()
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(_CONNECT_TIMEOUT)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        return None
+    s.settimeout(None)
+    return s
+
+def run(argv: List[str], socket_path: Optional[str] = None) -> int:
+    """Run one CLI invocation via the daemon if possible; returns the exit code."""
+    # stdin/stdout piping needs our own file descriptors
+    sock = None if "-" in argv else connect(socket_path)
+    if sock is None:
+        return _run_in_process(argv)
+    try:
+        send_msg(sock, {"argv": argv, "cwd": os.getcwd()})
+        reply = recv_msg(sock)
+    except OSError:
+        reply = None
+    finally:
+        sock.close()
+    if reply is None:
+        return _run_in_process(argv)
+    if reply.get("stdout"):
+        sys.stdout.write(reply["stdout"])
+        sys.stdout.flush()
+    if reply.get("stderr"):
+        sys.stderr.write(reply["stderr"])
+        sys.stderr.flush()
+    return int(reply.get("code", 1))
+
+def _run_in_process(argv: List[str]) -> int:
+    from .cli import _cli
+    try:
+        _cli(argv)
+    except SystemExit as e:
+        return _exit_code(e.code)
+    return 0
+
+def _exit_code(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
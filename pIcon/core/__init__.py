@@ -3,14 +3,45 @@
 from .images import (
     load_image_as_rgba,
     make_square,
+    build_ico,
     create_multi_resolution_ico,
 )
+from .geometry import FitPlan, oriented_size, plan_square, render_frames
+from .ico import encode_ico, write_ico
 from .sizes import DEFAULT_SIZES, parse_custom_sizes
+from .batch import BatchQueue, collect_jobs, run_batch
+from .manifest import load_manifest, plan_build, build
+from .watch import IconWatcher
+from .timings import TimingRecorder, recording
+from .probe import ImageProbe, probe_image
+from .session import IconSession
+from .progress import CancelToken, ExportCancelled
 
 __all__ = [
     "load_image_as_rgba",
     "make_square",
+    "build_ico",
     "create_multi_resolution_ico",
+    "FitPlan",
+    "oriented_size",
+    "plan_square",
+    "render_frames",
+    "encode_ico",
+    "write_ico",
     "DEFAULT_SIZES",
     "parse_custom_sizes",
+    "BatchQueue",
+    "collect_jobs",
+    "run_batch",
+    "load_manifest",
+    "plan_build",
+    "build",
+    "IconWatcher",
+    "TimingRecorder",
+    "recording",
+    "ImageProbe",
+    "probe_image",
+    "IconSession",
+    "CancelToken",
+    "ExportCancelled",
 ]
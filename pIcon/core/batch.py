@@ -0,0 +1,423 @@
+import copy
+import glob
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import cache_counters
+from .images import create_multi_resolution_ico, RGBA
+from .timings import TimingRecorder, recording
+
+# Extensions picked up when a directory or glob pattern is expanded
+IMAGE_EXTENSIONS = (
+    ".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp",
+    ".tif", ".tiff", ".ico", ".heic", ".heif",
+)
+
+def source_extensions(src_root: str, out_root: str) -> Tuple[str, ...]:
+    """
+    IMAGE_EXTENSIONS to treat as sources under src_root when writing to out_root.
+    .ico is left out when outputs can land in the source tree (out_root is
+    src_root or above it), so earlier outputs are never converted again.
+    """
+    if _contains(out_root, src_root):
+        return tuple(e for e in IMAGE_EXTENSIONS if e != ".ico")
+    return IMAGE_EXTENSIONS
+
+@dataclass
+class BatchJob:
+    input_path: str
+    output_path: str
+    # Per-job create_multi_resolution_ico arguments (sizes, fit_mode, ...) overriding the run's
+    options: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class BatchResult:
+    job: BatchJob
+    ok: bool
+    seconds: float
+    error: str = ""
+    cached: bool = False
+    # Seconds per pipeline stage, filled when run_batch(collect_timings=True)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+def collect_jobs(inputs: Iterable[str], output_root: str,
+                 list_files: Iterable[str] = ()) -> List[BatchJob]:
+    """
+    Expand inputs into (input, output) pairs under output_root.
+    - directory: walked recursively; the tree below it is mirrored
+    - glob pattern: the part below the first wildcard is mirrored
+    - plain file (or a line of a list file): written as <output_root>/<name>.ico
+    Expansion skips output_root when it lies below the expanded directory, and
+    .ico files when output_root is that directory or above it (see
+    source_extensions), so earlier outputs are not picked up as sources.
+    An input that some job writes (e.g. x.ico converted in place) is dropped.
+    Raises ValueError if two inputs would write the same output.
+    """
+    pairs = []
+    for item in inputs:
+        pairs.extend(_expand(item, output_root))
+    for lf in list_files:
+        with open(lf, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    pairs.append((line, os.path.dirname(line) or "."))
+
+    planned = []
+    seen_in = set()
+    for src, base in pairs:
+        key = os.path.normcase(os.path.abspath(src))
+        if key in seen_in:
+            continue
+        seen_in.add(key)
+        rel = os.path.relpath(src, base)
+        out = os.path.join(output_root, os.path.splitext(rel)[0] + ".ico")
+        planned.append((key, src, out, os.path.normcase(os.path.abspath(out))))
+
+    outputs = {out_key for _, _, _, out_key in planned}
+    jobs: List[BatchJob] = []
+    seen_out = {}
+    for key, src, out, out_key in planned:
+        if key in outputs:
+            continue
+        if out_key in seen_out:
+            raise ValueError(f"{src} and {seen_out[out_key]} both map to {out}")
+        seen_out[out_key] = src
+        jobs.append(BatchJob(src, out))
+    return jobs
+
+def run_batch(jobs: Sequence[BatchJob],
+              sizes: Iterable[int],
+              fit_mode: str = "pad",
+              pad_rgba: RGBA = (0, 0, 0, 0),
+              max_workers: Optional[int] = None,
+              on_result: Optional[Callable[[BatchResult], None]] = None,
+              collect_timings: bool = False,
+              **convert_kwargs) -> List[BatchResult]:
+    """
+    Convert every job, in a process pool of max_workers (default: CPU count).
+    on_result is called in the calling process as each item finishes.
+    convert_kwargs are passed through to create_multi_resolution_ico; job.options
+    override them and the run-level sizes/fit_mode/pad_rgba.
+    collect_timings records per-stage seconds into each result's timings.
+    Results are returned in completion order; failures never raise.
+    """
+    sizes = list(sizes)
+    workers = max(1, int(max_workers or os.cpu_count() or 1))
+    results: List[BatchResult] = []
+
+    def _emit(res: BatchResult):
+        results.append(res)
+        if on_result is not None:
+            on_result(res)
+
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            _emit(convert_job(job, sizes, fit_mode, pad_rgba, convert_kwargs, collect_timings))
+        return results
+
+    # At most 2 x workers jobs are submitted at a time, so a run over thousands of
+    # files never holds a future (and pickled arguments) for every one of them
+    pending = iter(jobs)
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as ex:
+        running: Dict[Future, BatchJob] = {}
+        while True:
+            for job in pending:
+                running[ex.submit(convert_job, job, sizes, fit_mode, pad_rgba, convert_kwargs,
+                                  collect_timings)] = job
+                if len(running) >= 2 * workers:
+                    break
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = running.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:  # worker died (e.g., BrokenProcessPool)
+                    res = BatchResult(job, False, 0.0, str(e) or type(e).__name__)
+                _emit(res)
+    return results
+
+@dataclass
+class QueueItem:
+    id: int
+    job: BatchJob
+    state: str = "queued"   # queued | running | done | failed | cancelled
+    result: Optional[BatchResult] = None
+
+class BatchQueue:
+    """
+    Long-lived conversion queue for interactive use (the GUI batch page).
+    - add(jobs): items wait in FIFO order; at most max_workers are handed to
+      the process pool at a time, so the pool never holds hundreds of futures
+      and anything still queued can be cancelled
+    - cancel(id) / cancel_all(): drop items not started yet (running ones finish)
+    - retry(id): queue a failed or cancelled item again
+    - updates(): copies of the items changed since the last call, for a UI
+      event loop to poll; on_update, if given, is called with each change from
+      the pool's callback thread as well (under the queue's lock: it must not block)
+    - rate(): finished items per second over the last `window` seconds
+    Conversions run convert_job like run_batch, with sizes/fit_mode/pad_rgba
+    and convert_kwargs as run-level settings that job.options override.
+    The pool uses spawn, never fork: the GUI process runs Tk and worker threads.
+    If a dead worker broke the pool, items it never started go to a fresh pool.
+    """
+    def __init__(self, sizes: Iterable[int] = (),
+                 fit_mode: str = "pad",
+                 pad_rgba: RGBA = (0, 0, 0, 0),
+                 max_workers: Optional[int] = None,
+                 on_update: Optional[Callable[[QueueItem], None]] = None,
+                 window: float = 10.0,
+                 **convert_kwargs):
+        self.sizes = list(sizes)
+        self.fit_mode = fit_mode
+        self.pad_rgba = pad_rgba
+        self.convert_kwargs = convert_kwargs
+        self.workers = max(1, int(max_workers or os.cpu_count() or 1))
+        self.on_update = on_update
+        self.window = float(window)
+        self._lock = threading.RLock()  # RLock: a future can complete (and call _done) inside submit
+        self._items: Dict[int, QueueItem] = {}
+        self._queued: Deque[int] = deque()
+        self._running: Dict[Future, int] = {}
+        self._changed: Dict[int, None] = {}  # ordered set of item ids
+        self._finished_at: Deque[float] = deque()
+        self._next_id = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+
+    def add(self, jobs: Iterable[BatchJob]) -> List[int]:
+        """Queue jobs; an input already queued or running is skipped. Returns the new item ids."""
+        ids = []
+        with self._lock:
+            active = {os.path.normcase(os.path.abspath(it.job.input_path))
+                      for it in self._items.values() if it.state in ("queued", "running")}
+            for job in jobs:
+                key = os.path.normcase(os.path.abspath(job.input_path))
+                if key in active:
+                    continue
+                active.add(key)
+                self._next_id += 1
+                item = self._items[self._next_id] = QueueItem(self._next_id, job)
+                self._queued.append(item.id)
+                ids.append(item.id)
+                self._touch(item)
+            self._pump()
+        return ids
+
+    def cancel(self, item_id: int) -> bool:
+        """Cancel a queued item; False if it already started or finished."""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.state != "queued":
+                return False
+            self._queued.remove(item_id)
+            item.state = "cancelled"
+            self._touch(item)
+            return True
+
+    def cancel_all(self) -> int:
+        """Cancel every queued item; returns how many were cancelled."""
+        with self._lock:
+            ids, self._queued = list(self._queued), deque()
+            for i in ids:
+                self._items[i].state = "cancelled"
+                self._touch(self._items[i])
+            return len(ids)
+
+    def retry(self, item_id: int) -> bool:
+        """Queue a failed or cancelled item again (at the back)."""
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item.state not in ("failed", "cancelled") or self._closed:
+                return False
+            item.state, item.result = "queued", None
+            self._queued.append(item_id)
+            self._touch(item)
+            self._pump()
+            return True
+
+    def remove_finished(self) -> List[int]:
+        """Forget done/failed/cancelled items; returns their ids."""
+        with self._lock:
+            ids = [i for i, it in self._items.items() if it.state in ("done", "failed", "cancelled")]
+            for i in ids:
+                del self._items[i]
+                self._changed.pop(i, None)
+            return ids
+
+    def get(self, item_id: int) -> Optional[QueueItem]:
+        """Copy of one item, or None if unknown/removed."""
+        with self._lock:
+            item = self._items.get(item_id)
+            return copy.copy(item) if item is not None else None
+
+    def updates(self) -> List[QueueItem]:
+        with self._lock:
+            ids, self._changed = list(self._changed), {}
+            return [copy.copy(self._items[i]) for i in ids if i in self._items]
+
+    def counts(self) -> Dict[str, int]:
+        """Items per state."""
+        out = dict.fromkeys(("queued", "running", "done", "failed", "cancelled"), 0)
+        with self._lock:
+            for it in self._items.values():
+                out[it.state] += 1
+        return out
+
+    def rate(self) -> float:
+        with self._lock:
+            now = time.perf_counter()
+            while self._finished_at and now - self._finished_at[0] > self.window:
+                self._finished_at.popleft()
+            if not self._finished_at:
+                return 0.0
+            span = max(now - self._finished_at[0], 1.0)
+            return len(self._finished_at) / span
+
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self._queued or self._running)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Cancel what is queued and stop the pool (running items are abandoned unless wait)."""
+        self.cancel_all()
+        with self._lock:
+            self._closed = True
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=wait, cancel_futures=True)
+
+    def _pump(self) -> None:
+        # caller holds the lock
+        while self._queued and len(self._running) < self.workers and not self._closed:
+            item = self._items[self._queued.popleft()]
+            fresh = self._executor is None
+            if fresh:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            try:
+                fut = self._executor.submit(convert_job, item.job, self.sizes, self.fit_mode, self.pad_rgba,
+                                            self.convert_kwargs)
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                if not fresh:  # the item never ran: requeue it on a fresh pool
+                    self._queued.appendleft(item.id)
+                    continue
+                self._fail(item, "Could not start a worker process")
+                continue
+            except Exception as e:
+                self._executor = None
+                self._fail(item, str(e) or type(e).__name__)
+                continue
+            item.state = "running"
+            self._running[fut] = item.id
+            self._touch(item)
+            fut.add_done_callback(self._done)
+
+    def _done(self, fut: Future) -> None:
+        with self._lock:
+            item = self._items.get(self._running.pop(fut, None))
+            if item is not None:
+                try:
+                    res = fut.result()
+                except Exception as e:  # worker died (e.g., BrokenProcessPool) or pool shut down
+                    res = BatchResult(item.job, False, 0.0, str(e) or type(e).__name__)
+                item.result = res
+                item.state = "done" if res.ok else "failed"
+                self._finished_at.append(time.perf_counter())
+                self._touch(item)
+            self._pump()
+
+    def _fail(self, item: QueueItem, error: str) -> None:
+        # caller holds the lock
+        item.result = BatchResult(item.job, False, 0.0, error)
+        item.state = "failed"
+        self._touch(item)
+
+    def _touch(self, item: QueueItem) -> None:
+        # caller holds the lock
+        self._changed[item.id] = None
+        if self.on_update is not None:
+            self.on_update(copy.copy(item))
+
+def convert_job(job: BatchJob, sizes: List[int], fit_mode: str, pad_rgba: RGBA,
+                convert_kwargs: Dict[str, Any], collect_timings: bool = False) -> BatchResult:
+    """
+    Convert a single job and report instead of raising (the process-pool
+    worker of run_batch, BatchQueue and IconWatcher).
+    """
+    t0 = time.perf_counter()
+    hits = cache_counters()["hits"]
+    rec = TimingRecorder(memory=False) if collect_timings else None
+    try:
+        out_dir = os.path.dirname(job.output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        kwargs = dict(convert_kwargs, sizes=sizes, fit_mode=fit_mode, pad_rgba=pad_rgba)
+        kwargs.update(job.options)
+        if rec is None:
+            create_multi_resolution_ico(job.input_path, job.output_path, **kwargs)
+        else:
+            with recording(rec):
+                create_multi_resolution_ico(job.input_path, job.output_path, **kwargs)
+    except Exception as e:
+        return BatchResult(job, False, time.perf_counter() - t0, str(e) or type(e).__name__)
+    cached = cache_counters()["hits"] > hits
+    timings = rec.totals() if rec is not None else {}
+    return BatchResult(job, True, time.perf_counter() - t0, cached=cached, timings=timings)
+
+def _expand(item: str, output_root: str):
+    """Yield (path, mirror_base) for a directory, glob pattern or file."""
+    if os.path.isdir(item):
+        exts = source_extensions(item, output_root)
+        skip = os.path.normcase(os.path.abspath(output_root))
+        for root, dirs, files in os.walk(item):
+            dirs[:] = sorted(d for d in dirs
+                             if os.path.normcase(os.path.abspath(os.path.join(root, d))) != skip)
+            for name in sorted(files):
+                if name.lower().endswith(exts):
+                    yield os.path.join(root, name), item
+        return
+    if _has_magic(item):
+        base = _glob_base(item)
+        exts = source_extensions(base, output_root)
+        prune = not _contains(output_root, base)  # an output_root inside the tree holds only outputs
+        for path in sorted(glob.glob(item, recursive=True)):
+            if os.path.isfile(path) and path.lower().endswith(exts):
+                if prune and _contains(output_root, path):
+                    continue
+                yield path, base
+        return
+    yield item, os.path.dirname(item) or "."
+
+def _glob_base(pattern: str) -> str:
+    """Longest leading directory of a glob pattern that contains no wildcard."""
+    parts = pattern.replace("\\", "/").split("/")
+    fixed = []
+    for part in parts[:-1]:
+        if _has_magic(part):
+            break
+        fixed.append(part)
+    if not fixed:
+        return "."
+    return "/".join(fixed) or "/"
+
+def _has_magic(s: str) -> bool:
+    """True if s contains a glob wildcard."""
+    return any(c in s for c in "*?[")
+
+def _contains(parent: str, path: str) -> bool:
+    """True if path is parent or lies below it."""
+    parent = os.path.normcase(os.path.abspath(parent))
+    path = os.path.normcase(os.path.abspath(path))
+    return path == parent or path.startswith(parent.rstrip(os.sep) + os.sep)
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import PIL
+
+from .. import __version__
+
+# Default size cap for a cache directory
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Bump when the key recipe or the stored format changes
+_KEY_VERSION = 1
+_TMP_PREFIX = ".tmp-"
+# Empty sidecar next to an entry whose mtime records its last hit (see IconCache)
+_USED_SUFFIX = ".used"
+_STALE_TMP_SECONDS = 3600
+# Stores between full directory scans; other processes sharing the directory are
+# only seen by a scan, so each may overshoot max_bytes by at most this many entries
+_RESCAN_STORES = 64
+
+# Per-process counters (each pool worker has its own; see cache_counters)
+_COUNTERS = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+# Per-process running size of each cache directory: {abs root: [bytes, stores since the last scan]}
+_TOTALS: Dict[str, List[int]] = {}
+
+def cache_counters() -> Dict[str, int]:
+    """Snapshot of this process's cache hit/miss/store/eviction counters."""
+    return dict(_COUNTERS)
+
+class IconCache:
+    """
+    Content-addressed store of finished .ico files.
+    - entries live at <root>/<k[:2]>/<k>.ico; the key hashes the input bytes and
+      every parameter that affects the output (see make_key)
+    - publishing is atomic (temp file + os.replace), so parallel workers can share
+      one directory; readers never see a partial entry
+    - the LRU clock is the later of the entry's mtime (its store) and that of an
+      empty <k>.used sidecar that hits touch; the entry itself is never touched,
+      since hits hardlink it into place and its mtime is every such output's mtime.
+      Eviction removes the least recently used entries until the directory is
+      under max_bytes
+    - stores keep a per-process running total and only scan the directory when
+      it goes over max_bytes or every _RESCAN_STORES stores, so a batch of N
+      files does O(N) directory work rather than O(N^2)
+    """
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES, link: bool = True):
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self.link = link
+        os.makedirs(root, exist_ok=True)
+        self._total_key = os.path.abspath(root)
+
+    @staticmethod
+    def make_key(input_path: str, params: Dict[str, Any]) -> str:
+        """sha256 of the input file bytes, params (JSON) and pIcon/Pillow versions."""
+        h = hashlib.sha256()
+        meta = {"v": _KEY_VERSION, "pIcon": __version__, "pillow": PIL.__version__, "params": params}
+        h.update(json.dumps(meta, sort_keys=True, default=list).encode("utf-8"))
+        h.update(b"\0")
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".ico")
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """Place the cached entry at dest (hardlink, else copy). Returns False on a miss."""
+        entry = self.entry_path(key)
+        tmp = _tmp_name(dest)
+        try:
+            if self.link:
+                try:
+                    os.link(entry, tmp)
+                except OSError:
+                    shutil.copyfile(entry, tmp)
+            else:
+                shutil.copyfile(entry, tmp)
+            os.replace(tmp, dest)
+        except FileNotFoundError:
+            _unlink_quiet(tmp)
+            _COUNTERS["misses"] += 1
+            return False
+        except OSError:
+            _unlink_quiet(tmp)
+            raise
+        _touch_quiet(_used_path(entry))
+        _COUNTERS["hits"] += 1
+        return True
+
+    def store(self, key: str, src: str) -> None:
+        """Atomically publish src under key, then evict down to max_bytes if it is over."""
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = _tmp_name(entry)
+        try:
+            shutil.copyfile(src, tmp)
+            replaced = _size_quiet(entry)
+            os.replace(tmp, entry)
+        except OSError:
+            _unlink_quiet(tmp)
+            raise
+        _COUNTERS["stores"] += 1
+        total = _TOTALS.get(self._total_key)
+        if total is None:
+            self.evict()  # first store in this process: scan once to learn the size
+            return
+        total[0] += _size_quiet(entry) - replaced
+        total[1] += 1
+        if total[0] > self.max_bytes or total[1] >= _RESCAN_STORES:
+            self.evict()
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Delete least-recently-used entries until total size <= max_bytes; returns count."""
+        limit = self.max_bytes if max_bytes is None else max(0, int(max_bytes))
+        entries = list(self._scan())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > limit:
+            for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # another worker got there first
+                except OSError:
+                    continue
+                _unlink_quiet(_used_path(path))
+                total -= size
+                removed += 1
+        _TOTALS[self._total_key] = [total, 0]
+        _COUNTERS["evictions"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Directory totals plus this process's counters."""
+        entries = list(self._scan())
+        out = {"entries": len(entries), "bytes": sum(size for _, size, _ in entries),
+               "max_bytes": self.max_bytes}
+        out.update(cache_counters())
+        return out
+
+    def _scan(self) -> Iterable:
+        """Yield (path, size, last use) for every entry; sweeps stale temp files and orphaned sidecars."""
+        now = time.time()
+        try:
+            shards = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            entries, used = {}, {}
+            for e in os.scandir(shard.path):
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                if e.name.startswith(_TMP_PREFIX):
+                    if now - st.st_mtime > _STALE_TMP_SECONDS:
+                        _unlink_quiet(e.path)
+                    continue
+                if e.name.endswith(".ico"):
+                    entries[e.path] = st
+                elif e.name.endswith(_USED_SUFFIX):
+                    used[e.path] = st.st_mtime
+            for path, st in entries.items():
+                yield path, st.st_size, max(st.st_mtime, used.pop(_used_path(path), 0.0))
+            for path, mtime in used.items():
+                if now - mtime > _STALE_TMP_SECONDS:  # its entry was evicted by another process
+                    _unlink_quiet(path)
+
+def _tmp_name(target: str) -> str:
+    d = os.path.dirname(target) or "."
+    return os.path.join(d, f"{_TMP_PREFIX}{os.getpid()}-{secrets.token_hex(4)}")
+
+def _used_path(entry: str) -> str:
+    return os.path.splitext(entry)[0] + _USED_SUFFIX
+
+def _touch_quiet(path: str) -> None:
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        try:
+            open(path, "ab").close()
+        except OSError:
+            pass
+    except OSError:
+        pass
+
+def _size_quiet(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
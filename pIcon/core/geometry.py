@@ -0,0 +1,347 @@
+import math
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageChops
+
+RGBA = Tuple[int, int, int, int]
+Box = Tuple[int, int, int, int]
+
+# EXIF Orientation -> transpose from stored pixels to upright (as ImageOps.exif_transpose)
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# EXIF Orientation -> (upright x runs along stored y, upright x reversed, upright y reversed)
+_ORIENT_AXES = {
+    1: (False, False, False), 2: (False, True, False), 3: (False, True, True), 4: (False, False, True),
+    5: (True, False, False), 6: (True, True, False), 7: (True, True, True), 8: (True, False, True),
+}
+
+class FitPlan(NamedTuple):
+    """
+    How a source maps onto a side x side square at 1:1 scale.
+    - src_box: visible source region (integer pixels)
+    - dst_box: where that region lands on the square
+    - side: square side, in source pixels
+    - pad_rgba: fill for the part of the square outside dst_box
+    """
+    src_box: Box
+    dst_box: Box
+    side: int
+    pad_rgba: RGBA
+
+def plan_square(size: Tuple[int, int], mode: str = "pad",
+                pad_rgba: RGBA = (0, 0, 0, 0),
+                crop_center: Optional[Tuple[float, float]] = None,
+                crop_zoom: float = 1.0) -> FitPlan:
+    """
+    Describe a fit mode as boxes, without touching any pixels.
+    - pad: whole source centered on a max(w, h) square
+    - crop: a square area; if crop_center/zoom provided, uses them
+    - stretch: whole source scaled non-uniformly onto a max(w, h) square
+    """
+    w, h = size
+    if mode == "crop":
+        cx = (w / 2) if (crop_center is None) else float(crop_center[0])
+        cy = (h / 2) if (crop_center is None) else float(crop_center[1])
+        zoom = max(1.0, float(crop_zoom) if crop_zoom else 1.0)
+
+        base_side = min(w, h)
+        crop_side = max(1, int(round(base_side / zoom)))
+        half = crop_side / 2
+
+        cx = min(max(cx, half), w - half)
+        cy = min(max(cy, half), h - half)
+
+        left = int(round(cx - half))
+        top = int(round(cy - half))
+        return FitPlan((left, top, left + crop_side, top + crop_side),
+                       (0, 0, crop_side, crop_side), crop_side, pad_rgba)
+
+    side = max(w, h)
+    if mode == "stretch":
+        return FitPlan((0, 0, w, h), (0, 0, side, side), side, pad_rgba)
+
+    # pad
+    x0 = (side - w) // 2
+    y0 = (side - h) // 2
+    return FitPlan((0, 0, w, h), (x0, y0, x0 + w, y0 + h), side, pad_rgba)
+
+def scaled_dst_box(plan: FitPlan, n: int) -> Box:
+    """plan.dst_box on an n x n output (at least 1 px wide/high)."""
+    if n == plan.side:
+        return plan.dst_box
+    s = n / plan.side
+    x0, y0, x1, y1 = (int(round(v * s)) for v in plan.dst_box)
+    x0, y0 = min(x0, n - 1), min(y0, n - 1)
+    return x0, y0, min(n, max(x1, x0 + 1)), min(n, max(y1, y0 + 1))
+
+def oriented_size(size: Tuple[int, int], orientation: int = 1) -> Tuple[int, int]:
+    """Upright (w, h) of an image stored with the given EXIF orientation."""
+    return (size[1], size[0]) if _ORIENT_AXES.get(orientation, _ORIENT_AXES[1])[0] else tuple(size)
+
+def upright_to_stored_box(box, upright: Tuple[int, int], orientation: int = 1):
+    """Map a box in upright coordinates (image of size upright) to stored-pixel coordinates."""
+    swap, rev_x, rev_y = _ORIENT_AXES.get(orientation, _ORIENT_AXES[1])
+    x0, y0, x1, y1 = box
+    if rev_x:
+        x0, x1 = upright[0] - x1, upright[0] - x0
+    if rev_y:
+        y0, y1 = upright[1] - y1, upright[1] - y0
+    return (y0, x0, y1, x1) if swap else (x0, y0, x1, y1)
+
+def render_frames(img: Image.Image, plan: FitPlan, sizes: Iterable[int],
+                  resample: int = Image.Resampling.LANCZOS,
+                  strategy: str = "mip",
+                  orientation: int = 1,
+                  levels: Optional[List[Image.Image]] = None) -> Dict[int, Image.Image]:
+    """
+    Render the plan at every requested size, each resampled once from the source
+    region straight into its final square. Padding is added at output resolution,
+    so no max(w, h)^2 intermediate canvas is ever allocated.
+    - strategy="mip": halve the region with Image.reduce into a pyramid and run the
+      final filter from the smallest level still >= 2x the target (default)
+    - strategy="direct": filter every size from the full-resolution region
+    - orientation: EXIF orientation of img's stored pixels; plan is in upright
+      coordinates. Crop and pyramid run on the stored pixels and only the level
+      feeding the final filter is transposed, so the output is identical to
+      rendering ImageOps.exif_transpose(img)
+    - levels: a list to keep the region's pyramid in; pass the same list again
+      (same img, orientation and plan.src_box) and later sizes skip the crop
+      and the reductions already done. Once it holds reduced levels the caller
+      may set levels[0] (the full-resolution premultiplied region) to None; a
+      size that needs it recreates it for that call only
+    """
+    if strategy not in ("mip", "direct"):
+        raise ValueError(f"Unknown resize strategy: {strategy}")
+    if orientation not in EXIF_TRANSPOSE:
+        orientation = 1
+    upright = oriented_size(img.size, orientation)
+    src_box = upright_to_stored_box(plan.src_box, upright, orientation)
+    rw, rh = oriented_size((src_box[2] - src_box[0], src_box[3] - src_box[1]), orientation)
+    region = None
+    if levels is None:
+        levels = []  # levels[k] = region reduced 2**k (premultiplied, stored orientation)
+    upright_levels: Dict[int, Image.Image] = {}
+    frames: Dict[int, Image.Image] = {}
+    for n in sorted(set(int(s) for s in sizes), reverse=True):
+        dst = scaled_dst_box(plan, n)
+        dw, dh = dst[2] - dst[0], dst[3] - dst[1]
+        if region is None and ((dw, dh) == (rw, rh) or not levels):
+            region = img if src_box == (0, 0) + img.size else img.crop(src_box)
+        if (dw, dh) == (rw, rh):
+            content = _upright(region, orientation)
+        else:
+            if not levels:
+                # Image.resize premultiplies RGBA on every call; do it once for all sizes
+                levels.append(_premultiplied(region))
+            k = 0
+            if strategy == "mip":
+                k = _mip_level(levels, dw, dh, orientation)
+            if k not in upright_levels:
+                level = levels[k]
+                if level is None:  # dropped by the caller (see levels)
+                    if region is None:
+                        region = img if src_box == (0, 0) + img.size else img.crop(src_box)
+                    level = _premultiplied(region)
+                upright_levels[k] = _upright(level, orientation)
+            level, f = upright_levels[k], 2 ** k
+            box = (0, 0, rw / f, rh / f)
+            content = level.resize((dw, dh), resample, box=box)
+            if content.mode == "RGBa":
+                content = content.convert("RGBA")
+
+        if dst == (0, 0, n, n):
+            frames[n] = content
+        else:
+            canvas = Image.new("RGBA", (n, n), plan.pad_rgba)
+            canvas.paste(content, dst[:2])
+            frames[n] = canvas
+    return frames
+
+def compare_strategies(img: Image.Image, plan: FitPlan, sizes: Iterable[int],
+                       repeat: int = 3, orientation: int = 1) -> Dict[str, object]:
+    """
+    Time "direct" vs "mip" rendering (best of repeat) and measure the largest
+    per-channel pixel difference between them at each size (premultiplied, so
+    colour under fully transparent pixels does not count).
+    """
+    sizes = sorted(set(int(s) for s in sizes))
+    out: Dict[str, object] = {}
+    rendered = {}
+    for strategy in ("direct", "mip"):
+        best = float("inf")
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            frames = render_frames(img, plan, sizes, strategy=strategy, orientation=orientation)
+            best = min(best, time.perf_counter() - t0)
+        rendered[strategy] = frames
+        out[f"{strategy}_seconds"] = best
+    errors = {}
+    for n in sizes:
+        a, b = rendered["direct"][n], rendered["mip"][n]
+        if a.mode == "RGBA":
+            a, b = a.convert("RGBa"), b.convert("RGBa")
+        diff = ImageChops.difference(a, b)
+        errors[n] = max(hi for _, hi in diff.getextrema())
+    out["max_error"] = errors
+    return out
+
+class MipPyramid:
+    """
+    Halving pyramid of an image for interactive previews. render() plans in
+    full-resolution units (crop_center etc. as for make_square) and draws from
+    the smallest level that still covers the on-screen size, so the cost of a
+    preview frame depends on the preview size, not on the source size.
+    - levels[0] is the source; levels[k] is it reduced 2**k, kept premultiplied
+      (RGBa) so frames skip the per-frame alpha conversion
+    - levels stop once the short side would drop below min_side
+    - scale: img is the source already reduced by this factor (see proxy());
+      render() still takes crop_center in source units
+    """
+    def __init__(self, img: Image.Image, min_side: int = 64, scale: float = 1.0):
+        self.levels = [img]
+        self.scale = scale
+        cur = img.convert("RGBa") if img.mode == "RGBA" else img
+        while min(cur.size) >= 2 * max(1, min_side):
+            cur = cur.reduce(2)
+            self.levels.append(cur)
+
+    @classmethod
+    def proxy(cls, img: Image.Image, max_side: int = 256) -> "MipPyramid":
+        """
+        Coarse stand-in built in about a millisecond at any source size (nearest
+        neighbour samples only the output pixels), for placeholders while the
+        real pyramid is being built.
+        """
+        f = max(1.0, max(img.size) / max(1, max_side))
+        small = img.resize((max(1, round(img.width / f)), max(1, round(img.height / f))),
+                           Image.Resampling.NEAREST) if f > 1 else img
+        return cls(small, min_side=max_side, scale=f)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.levels[0].size
+
+    def level_for(self, region: Tuple[float, float], dst: Tuple[int, int]) -> int:
+        """Deepest level at which a full-resolution region (w, h) is still >= dst (w, h)."""
+        k = 0
+        while (k + 1 < len(self.levels) and region[0] / 2 ** (k + 1) >= dst[0]
+               and region[1] / 2 ** (k + 1) >= dst[1]):
+            k += 1
+        return k
+
+    def render(self, side: int, mode: str = "pad",
+               pad_rgba: RGBA = (0, 0, 0, 0),
+               crop_center: Optional[Tuple[float, float]] = None,
+               crop_zoom: float = 1.0,
+               margin: int = 0) -> Image.Image:
+        """
+        side x side RGBA preview of make_square(img, mode, ...) at side px.
+        Downscales use a box filter (the chosen level is at most 2x the target),
+        upscales bicubic; close to, not identical with, the exported frames.
+        margin (crop mode): also render that many px of the surrounding source
+        on every side, giving a (side + 2 * margin)^2 buffer that can be panned
+        without re-rendering; parts beyond the image stay transparent.
+        """
+        side = max(1, int(side))
+        if crop_center is not None and self.scale != 1:
+            crop_center = (float(crop_center[0]) / self.scale, float(crop_center[1]) / self.scale)
+        plan = plan_square(self.size, mode, pad_rgba, crop_center, crop_zoom)
+        if margin > 0 and mode == "crop":
+            return self._render_margin(plan, side, int(margin))
+        dst = scaled_dst_box(plan, side)
+        content = self._resample(plan.src_box, (dst[2] - dst[0], dst[3] - dst[1]))
+        if dst == (0, 0, side, side):
+            return content
+        canvas = Image.new("RGBA", (side, side), plan.pad_rgba)
+        canvas.paste(content, dst[:2])
+        return canvas
+
+    def _render_margin(self, plan: FitPlan, side: int, margin: int) -> Image.Image:
+        x0, y0, x1, y1 = plan.src_box
+        s = (x1 - x0) / side  # source px per output px
+        w, h = self.size
+        ext = (x0 - margin * s, y0 - margin * s, x1 + margin * s, y1 + margin * s)
+        box = (max(0.0, ext[0]), max(0.0, ext[1]), min(float(w), ext[2]), min(float(h), ext[3]))
+        full = side + 2 * margin
+        out = (round((box[0] - ext[0]) / s), round((box[1] - ext[1]) / s),
+               round((box[2] - ext[0]) / s), round((box[3] - ext[1]) / s))
+        content = self._resample(box, (max(1, out[2] - out[0]), max(1, out[3] - out[1])))
+        if content.size == (full, full):
+            return content
+        canvas = Image.new("RGBA", (full, full), (0, 0, 0, 0))
+        canvas.paste(content, out[:2])
+        return canvas
+
+    def _resample(self, box, size: Tuple[int, int]) -> Image.Image:
+        """Source box (source px, within the image) resampled to size, as RGBA."""
+        x0, y0, x1, y1 = box
+        dw, dh = size
+        k = self.level_for((x1 - x0, y1 - y0), (dw, dh))
+        if k:
+            f = 2 ** k
+            level, box = self.levels[k], (x0 / f, y0 / f, x1 / f, y1 / f)
+        else:
+            ib = (int(x0), int(y0), math.ceil(x1), math.ceil(y1))
+            level = self.levels[0].crop(ib)
+            if level.mode == "RGBA":
+                level = level.convert("RGBa")
+            box = (x0 - ib[0], y0 - ib[1], x1 - ib[0], y1 - ib[1])
+        downscale = box[2] - box[0] >= dw and box[3] - box[1] >= dh
+        content = level.resize((dw, dh), Image.Resampling.BOX if downscale else Image.Resampling.BICUBIC,
+                               box=box)
+        if content.mode != "RGBA":
+            content = content.convert("RGBA")
+        return content
+
+def _mip_level(levels, dw: int, dh: int, orientation: int = 1) -> int:
+    """Index of the smallest pyramid level still >= 2x (dw, dh) upright; extends the pyramid as needed."""
+    k = 0
+    while True:
+        if k + 1 >= len(levels):
+            cur = levels[k]
+            cw, ch = oriented_size(cur.size, orientation)
+            if cw < 4 * dw or ch < 4 * dh or min(cur.size) < 2:
+                return k
+            levels.append(_reduce2(cur, orientation))
+        nw, nh = oriented_size(levels[k + 1].size, orientation)
+        if nw < 2 * dw or nh < 2 * dh:
+            return k
+        k += 1
+
+def _premultiplied(img: Image.Image) -> Image.Image:
+    return img.convert("RGBa") if img.mode == "RGBA" else img
+
+def _upright(img: Image.Image, orientation: int) -> Image.Image:
+    method = EXIF_TRANSPOSE.get(orientation)
+    return img if method is None else img.transpose(method)
+
+def _reduce2(img: Image.Image, orientation: int = 1) -> Image.Image:
+    """
+    img.reduce(2) such that _upright(result) == _upright(img).reduce(2) exactly.
+    On an odd side reduce leaves the partial box at the end; where the upright
+    axis runs backwards in storage that end is the stored start, so the lone
+    first row/column is reduced on its own and the rest in aligned pairs.
+    """
+    swap, rev_x, rev_y = _ORIENT_AXES[orientation]
+    rev_sx, rev_sy = (rev_y, rev_x) if swap else (rev_x, rev_y)
+    w, h = img.size
+    ox = 1 if rev_sx and w % 2 else 0
+    oy = 1 if rev_sy and h % 2 else 0
+    if not ox and not oy:
+        return img.reduce(2)
+    out = Image.new(img.mode, ((w + 1) // 2, (h + 1) // 2))
+    xs = [(0, ox), (ox, w)] if ox else [(0, w)]
+    ys = [(0, oy), (oy, h)] if oy else [(0, h)]
+    for x0, x1 in xs:
+        for y0, y1 in ys:
+            if x1 > x0 and y1 > y0:
+                part = img.reduce(2, box=(x0, y0, x1, y1))
+                out.paste(part, ((x0 + 1) // 2, (y0 + 1) // 2))
+    return out
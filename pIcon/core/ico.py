@@ -0,0 +1,111 @@
+import io
+import os
+import secrets
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+from PIL import Image
+
+# Entries at least this large are stored as PNG; smaller ones as 32-bit BMP + AND mask
+PNG_MIN_SIZE = 64
+# zlib level for PNG entries (0 = fastest/largest .. 9 = slowest/smallest)
+DEFAULT_COMPRESS_LEVEL = 6
+
+_ICONDIR = struct.Struct("<HHH")             # reserved, type (1 = icon), count
+_ICONDIRENTRY = struct.Struct("<BBBBHHII")   # w, h, colors, reserved, planes, bpp, size, offset
+_BITMAPINFOHEADER = struct.Struct("<IiiHHIIiiII")
+
+def encode_ico(frames: Sequence[Image.Image],
+               png_min_size: int = PNG_MIN_SIZE,
+               compress_level: int = DEFAULT_COMPRESS_LEVEL,
+               max_workers: Optional[int] = None) -> bytes:
+    """
+    Encode square frames (<= 256 px, one per size) into ICO file bytes.
+    - frames smaller than png_min_size: 32-bit BGRA DIB with a 1-bit AND mask
+    - the rest: PNG at compress_level
+    Entries are encoded concurrently in a thread pool (zlib and Pillow's
+    encoders release the GIL); max_workers=1 encodes serially.
+    """
+    frames = sorted(frames, key=lambda f: f.width)
+    if not frames:
+        raise ValueError("No frames to encode.")
+    for f in frames:
+        if f.width != f.height or not 1 <= f.width <= 256:
+            raise ValueError(f"ICO frames must be square and at most 256 px, got {f.width}x{f.height}")
+
+    def _encode(frame: Image.Image) -> bytes:
+        return encode_entry(frame, png_min_size=png_min_size, compress_level=compress_level)
+
+    workers = max_workers or min(len(frames), os.cpu_count() or 1)
+    if workers <= 1 or len(frames) == 1:
+        payloads = [_encode(f) for f in frames]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            payloads = list(ex.map(_encode, frames))
+    return pack_ico([f.width for f in frames], payloads)
+
+def write_ico(path: str, frames: Sequence[Image.Image], **kwargs) -> None:
+    """
+    encode_ico() and write the result to path.
+    Writes a temp file next to path and renames it over, so readers (and
+    hardlinked cache entries) never see a partial file.
+    """
+    write_bytes_atomic(path, encode_ico(frames, **kwargs))
+
+def write_bytes_atomic(path: str, data: bytes, cancel=None) -> None:
+    """
+    Write data to a temp file beside path, then rename it over path.
+    cancel (a core.progress.CancelToken) is checked just before the rename;
+    a cancelled write removes the temp file and leaves path as it was.
+    """
+    tmp = os.path.join(os.path.dirname(path) or ".",
+                       f".tmp-{os.getpid()}-{secrets.token_hex(4)}-{os.path.basename(path)}")
+    try:
+        with open(tmp, "xb") as f:
+            f.write(data)
+        if cancel is not None:
+            cancel.check()
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def pack_ico(sides: Sequence[int], payloads: Sequence[bytes]) -> bytes:
+    """Assemble ICONDIR + ICONDIRENTRY tables around already-encoded entries."""
+    out: List[bytes] = [_ICONDIR.pack(0, 1, len(payloads))]
+    offset = _ICONDIR.size + _ICONDIRENTRY.size * len(payloads)
+    for side, data in zip(sides, payloads):
+        dim = side if side < 256 else 0  # 0 means 256
+        out.append(_ICONDIRENTRY.pack(dim, dim, 0, 0, 1, 32, len(data), offset))
+        offset += len(data)
+    out.extend(payloads)
+    return b"".join(out)
+
+def encode_entry(frame: Image.Image,
+                 png_min_size: int = PNG_MIN_SIZE,
+                 compress_level: int = DEFAULT_COMPRESS_LEVEL) -> bytes:
+    """Encode one ICO entry as PNG or BMP depending on its size."""
+    if frame.mode != "RGBA":
+        frame = frame.convert("RGBA")
+    if frame.width >= png_min_size:
+        return _encode_png(frame, compress_level)
+    return _encode_bmp(frame)
+
+def _encode_png(frame: Image.Image, compress_level: int) -> bytes:
+    buf = io.BytesIO()
+    frame.save(buf, format="PNG", compress_level=max(0, min(9, int(compress_level))))
+    return buf.getvalue()
+
+def _encode_bmp(frame: Image.Image) -> bytes:
+    """BITMAPINFOHEADER (double height) + bottom-up BGRA pixels + AND mask."""
+    w, h = frame.size
+    xor = frame.tobytes("raw", "BGRA", 0, -1)
+    # AND mask: 1 where fully transparent, rows padded to 32 bits, bottom-up
+    mask_stride = ((w + 31) // 32) * 4
+    mask = frame.getchannel("A").point([255] + [0] * 255, "1")
+    and_bits = mask.tobytes("raw", "1", mask_stride, -1)
+    header = _BITMAPINFOHEADER.pack(40, w, h * 2, 1, 32, 0, len(xor) + len(and_bits), 0, 0, 0, 0)
+    return header + xor + and_bits
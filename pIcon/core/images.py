@@ -1,7 +1,16 @@
+import io
+import math
 import os
-from typing import Iterable, Optional, Tuple
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
 from PIL import Image, ImageOps, ImageDraw, UnidentifiedImageError
 
+from .cache import DEFAULT_MAX_BYTES, IconCache
+from .geometry import FitPlan, oriented_size, plan_square, render_frames
+from .ico import DEFAULT_COMPRESS_LEVEL, PNG_MIN_SIZE, encode_ico, write_bytes_atomic
+from .probe import exif_orientation, probe_image
+from .tiled import DEFAULT_MAX_MEMORY, load_bounded
+from .timings import stage
+
 # Optional HEIC/HEIF
 try:
     import pi_heif  # type: ignore
@@ -9,32 +18,59 @@ except Exception:
     pi_heif = None  # type: ignore
 
 RGBA = Tuple[int, int, int, int]
+# Anything load_image_as_rgba/build_ico accept as input
+ImageSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview, BinaryIO, Image.Image]
+
+# Largest entry the ICO directory can describe; bigger requested sizes are skipped
+MAX_ICO_SIZE = 256
+
+# Set on images returned by load_image_as_rgba: divide original-pixel coordinates by it
+DRAFT_SCALE_KEY = "draft_scale"
+# Formats decoded by the JPEG DCT decoder (MPO: multi-picture JPEG, as many phones write)
+DRAFT_FORMATS = ("JPEG", "MPO")
+# Set by load_image_as_rgba(defer_orientation=True): EXIF orientation still to apply
+ORIENTATION_KEY = "orientation"
 
-def load_image_as_rgba(path: str) -> Image.Image:
+def load_image_as_rgba(source: ImageSource, target_size: Optional[int] = None,
+                       defer_orientation: bool = False) -> Image.Image:
     """
     Open common image formats and return an RGBA image.
+    - source: path, bytes/bytearray/memoryview, binary file-like, or a PIL.Image
     - Uses pi-heif for .heic/.heif if available
-    - Applies EXIF orientation
+    - JPEG/MPO + target_size: decodes via DCT scaling (1/2, 1/4, 1/8) to the smallest
+      scale whose sides are still >= target_size; the factor used is stored in
+      img.info[DRAFT_SCALE_KEY] (absent when decoded at full size)
+    - Applies EXIF orientation; with defer_orientation the pixels stay as stored
+      and a non-trivial orientation is put in img.info[ORIENTATION_KEY] for
+      render_frames(orientation=...) to apply to the finished (small) frames
     - If animated (GIF/WEBP), uses the first frame
+    - A PIL.Image source is never drafted and its .info is never written to;
+      the metadata keys go on a copy
+    - Timed as open/decode/exif_transpose/convert stages (see core.timings)
     """
-    lower = path.lower()
-    img = None
+    with stage("open"):
+        img = _open_source(source)
 
-    if lower.endswith((".heic", ".heif")) and pi_heif is not None:
-        img = _open_heif_as_pil(path)
-    else:
-        try:
-            img = Image.open(path)
-        except UnidentifiedImageError:
-            if pi_heif is not None:
-                img = _open_heif_as_pil(path)
-            else:
-                raise
+    scale = 1
+    if (target_size and img is not source
+            and getattr(img, "format", None) in DRAFT_FORMATS):
+        scale = _draft_jpeg(img, int(target_size))
 
-    try:
-        img = ImageOps.exif_transpose(img)
-    except Exception:
-        pass
+    with stage("decode", format=getattr(img, "format", None), draft_scale=scale):
+        img.load()
+
+    orientation = 1
+    if defer_orientation:
+        try:
+            orientation = exif_orientation(img)
+        except Exception:
+            pass
+    else:
+        with stage("exif_transpose"):
+            try:
+                img = ImageOps.exif_transpose(img)
+            except Exception:
+                pass
 
     if getattr(img, "is_animated", False):
         try:
@@ -43,9 +79,51 @@ def load_image_as_rgba(path: str) -> Image.Image:
             pass
 
     if img.mode != "RGBA":
-        img = img.convert("RGBA")
+        with stage("convert", mode=img.mode):
+            img = img.convert("RGBA")
+    if img is source and (scale != 1 or orientation in range(2, 9)):
+        img = img.copy()
+    if scale != 1:
+        img.info[DRAFT_SCALE_KEY] = scale
+    if orientation in range(2, 9):
+        img.info[ORIENTATION_KEY] = orientation
     return img
 
+def _open_source(source: ImageSource) -> Image.Image:
+    """Lazily open any supported source; bytes and file-likes never touch disk."""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.lower().endswith((".heic", ".heif")) and pi_heif is not None:
+            return _open_heif_as_pil(path)
+
+    try:
+        return Image.open(source)
+    except UnidentifiedImageError:
+        if pi_heif is None:
+            raise
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return _open_heif_as_pil(source)
+
+def _draft_jpeg(img: Image.Image, target_size: int) -> int:
+    """Ask the JPEG decoder for a reduced DCT scale; returns the factor actually used."""
+    w, h = img.size
+    if target_size <= 0 or min(w, h) < 2 * target_size:
+        return 1
+    try:
+        res = img.draft(None, (target_size, target_size))
+    except Exception:
+        return 1
+    if not res:
+        return 1
+    box = res[1]
+    return max(1, int(round(w / box[2])))
+
 def make_square(img: Image.Image, mode: str = "pad",
                 pad_rgba: RGBA = (0, 0, 0, 0),
                 crop_center: Optional[Tuple[float, float]] = None,
@@ -55,36 +133,90 @@ def make_square(img: Image.Image, mode: str = "pad",
     - pad: centers on square RGBA canvas
     - crop: crops a square area; if crop_center/zoom provided, uses them
     - stretch: non-uniformly resizes to square
+    Honors img.info[ORIENTATION_KEY]; the result is always upright.
     """
-    w, h = img.size
-    if w == h and mode != "crop":
+    orientation = img.info.get(ORIENTATION_KEY, 1)
+    w, h = oriented_size(img.size, orientation)
+    if w == h and mode != "crop" and orientation == 1:
         return img
 
-    if mode == "crop":
-        cx = (w / 2) if (crop_center is None) else float(crop_center[0])
-        cy = (h / 2) if (crop_center is None) else float(crop_center[1])
-        zoom = max(1.0, float(crop_zoom) if crop_zoom else 1.0)
-
-        base_side = min(w, h)
-        crop_side = max(1, int(round(base_side / zoom)))
-        half = crop_side / 2
+    with stage("make_square", mode=mode):
+        plan = plan_square((w, h), mode, pad_rgba, crop_center, crop_zoom)
+        return render_frames(img, plan, [plan.side], orientation=orientation)[plan.side]
 
-        cx = min(max(cx, half), w - half)
-        cy = min(max(cy, half), h - half)
+def load_and_plan(source: ImageSource,
+                  sizes: Iterable[int],
+                  fit_mode: str = "pad",
+                  pad_rgba: RGBA = (0, 0, 0, 0),
+                  crop_center: Optional[Tuple[float, float]] = None,
+                  crop_zoom: float = 1.0,
+                  max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+                  max_pixels: Optional[int] = None) -> Tuple[Image.Image, FitPlan, List[int]]:
+    """
+    Decode source (at reduced scale when possible) and plan the fit.
+    Returns (image, plan, ico_sizes); crop_center is in original-pixel units.
+    The image keeps its stored pixel orientation while the plan is in upright
+    coordinates: pass orientation=image.info.get(ORIENTATION_KEY, 1) to render_frames.
+    Path sources whose decoded size would exceed max_memory bytes are read in
+    bands and reduced on the fly (see core.tiled); None/0 disables the ceiling.
+    Path sources are probed first (core.probe): unsupported files, decompression
+    bombs and sources above max_pixels raise ValueError before any decoding.
+    """
+    sizes = sorted(set(int(s) for s in sizes))
+    if not sizes:
+        raise ValueError("No icon sizes specified.")
+    if isinstance(source, (str, os.PathLike)) and not os.path.isfile(source):
+        raise FileNotFoundError(f"Input file not found: {os.fspath(source)}")
+    ico_sizes = [n for n in sizes if n <= MAX_ICO_SIZE]
+    if not ico_sizes:
+        raise ValueError(f"ICO entries are limited to {MAX_ICO_SIZE} px.")
 
-        left = int(round(cx - half))
-        top = int(round(cy - half))
-        return img.crop((left, top, left + crop_side, top + crop_side))
+    max_req = max(ico_sizes)
+    hint = max_req
+    if fit_mode == "crop":
+        hint = int(math.ceil(max_req * max(1.0, float(crop_zoom) if crop_zoom else 1.0)))
+    base = None
+    if isinstance(source, (str, os.PathLike)):
+        probe = probe_image(os.fspath(source), max_pixels)
+        if max_memory and probe.decoded_bytes > max_memory:
+            base = load_bounded(os.fspath(source), hint, fit_mode, max_memory)
+    if base is None:
+        base = load_image_as_rgba(source, target_size=hint, defer_orientation=True)
+    scale = base.info.get(DRAFT_SCALE_KEY, 1)
+    if crop_center is not None and scale != 1:
+        crop_center = (float(crop_center[0]) / scale, float(crop_center[1]) / scale)
 
-    if mode == "stretch":
-        side = max(w, h)
-        return img.resize((side, side), Image.Resampling.LANCZOS)
+    upright = oriented_size(base.size, base.info.get(ORIENTATION_KEY, 1))
+    plan = plan_square(upright, fit_mode, pad_rgba, crop_center, crop_zoom)
+    return base, plan, ico_sizes
 
-    # pad
-    side = max(w, h)
-    canvas = Image.new("RGBA", (side, side), pad_rgba)
-    canvas.paste(img, ((side - w) // 2, (side - h) // 2))
-    return canvas
+def build_ico(source: ImageSource,
+              sizes: Iterable[int],
+              fit_mode: str = "pad",
+              pad_rgba: RGBA = (0, 0, 0, 0),
+              crop_center: Optional[Tuple[float, float]] = None,
+              crop_zoom: float = 1.0,
+              png_min_size: int = PNG_MIN_SIZE,
+              compress_level: int = DEFAULT_COMPRESS_LEVEL,
+              out: Optional[BinaryIO] = None,
+              max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+              max_pixels: Optional[int] = None) -> bytes:
+    """
+    In-memory conversion: returns the encoded .ico bytes.
+    source may be a path, bytes/memoryview, a binary file-like or a PIL.Image;
+    nothing is written to disk. If out is given, the bytes are also written to it.
+    """
+    base, plan, ico_sizes = load_and_plan(source, sizes, fit_mode, pad_rgba,
+                                          crop_center, crop_zoom, max_memory, max_pixels)
+    # fit + resize in one pass; upscale when the source is smaller than the largest entry
+    with stage("render", sizes=len(ico_sizes), upscale=plan.side < max(ico_sizes)):
+        frames = render_frames(base, plan, ico_sizes, orientation=base.info.get(ORIENTATION_KEY, 1))
+    with stage("encode"):
+        data = encode_ico([frames[n] for n in ico_sizes],
+                          png_min_size=png_min_size, compress_level=compress_level)
+    if out is not None:
+        out.write(data)
+    return data
 
 def create_multi_resolution_ico(input_png_path: str,
                                 output_ico_path: str,
@@ -92,29 +224,60 @@ def create_multi_resolution_ico(input_png_path: str,
                                 fit_mode: str = "pad",
                                 pad_rgba: RGBA = (0, 0, 0, 0),
                                 crop_center: Optional[Tuple[float, float]] = None,
-                                crop_zoom: float = 1.0) -> None:
+                                crop_zoom: float = 1.0,
+                                png_min_size: int = PNG_MIN_SIZE,
+                                compress_level: int = DEFAULT_COMPRESS_LEVEL,
+                                cache_dir: Optional[str] = None,
+                                cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                                max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+                                max_pixels: Optional[int] = None) -> None:
     """
-    Safe, reusable function. Writes a multi-size .ico file.
+    Safe, reusable function. Writes a multi-size .ico file (path in, path out;
+    see build_ico for the in-memory variant).
+    Entries >= png_min_size are PNG (zlib compress_level 0-9), smaller ones 32-bit BMP.
+    With cache_dir, an identical earlier result (same input bytes and parameters)
+    is linked/copied into place without decoding anything.
+    Sources larger than max_memory decoded are processed in bands (core.tiled).
+    The header probe runs before the cache lookup, so a source above max_pixels
+    (or not an image at all) is rejected with ValueError even on a cache hit.
+    Emits timing events for every stage to an active core.timings recorder.
     """
-    sizes = sorted(set(int(s) for s in sizes))
-    if not sizes:
-        raise ValueError("No icon sizes specified.")
     if not os.path.isfile(input_png_path):
         raise FileNotFoundError(f"Input file not found: {input_png_path}")
+    probe_image(input_png_path, max_pixels)
 
-    base = load_image_as_rgba(input_png_path)
-    square = make_square(base, mode=fit_mode, pad_rgba=pad_rgba,
-                         crop_center=crop_center, crop_zoom=crop_zoom)
+    cache = key = None
+    if cache_dir:
+        cache = IconCache(cache_dir, cache_max_bytes)
+        with stage("cache_lookup"):
+            key = cache.make_key(input_png_path, {
+                "sizes": sorted(set(int(s) for s in sizes)),
+                "fit": fit_mode,
+                "pad": list(pad_rgba),
+                "crop_center": list(crop_center) if crop_center is not None else None,
+                "crop_zoom": float(crop_zoom or 1.0),
+                "png_min_size": int(png_min_size),
+                "compress_level": int(compress_level),
+                "max_memory": int(max_memory or 0),
+            })
+            hit = cache.fetch(key, output_ico_path)
+        if hit:
+            return
 
-    max_req = max(sizes)
-    if square.width < max_req:
-        square = square.resize((max_req, max_req), Image.Resampling.LANCZOS)
-
-    size_pairs = [(n, n) for n in sizes]
-    square.save(output_ico_path, format="ICO", sizes=size_pairs)
+    data = build_ico(input_png_path, sizes, fit_mode, pad_rgba, crop_center, crop_zoom,
+                     png_min_size=png_min_size, compress_level=compress_level,
+                     max_memory=max_memory, max_pixels=max_pixels)
+    with stage("write", bytes=len(data)):
+        write_bytes_atomic(output_ico_path, data)
+    if cache is not None:
+        try:
+            with stage("cache_store"):
+                cache.store(key, output_ico_path)
+        except OSError:
+            pass  # a full or read-only cache must not fail the conversion
 
-def _open_heif_as_pil(path: str) -> Image.Image:
-    """Open a HEIC/HEIF image using pi-heif and return a PIL Image with ICC/EXIF when available."""
+def _open_heif_as_pil(path: Union[str, BinaryIO]) -> Image.Image:
+    """Open a HEIC/HEIF image (path or file-like) using pi-heif and return a PIL Image with ICC/EXIF when available."""
     if pi_heif is None:
         raise RuntimeError("HEIF/HEIC support requires 'pi-heif' (pip install pi-heif).")
 
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .. import __version__
+from .batch import BatchJob, BatchResult, run_batch
+from .sizes import DEFAULT_SIZES, parse_custom_sizes
+
+_FIT_MODES = ("pad", "crop", "stretch")
+_STATE_VERSION = 1
+
+@dataclass
+class ManifestEntry:
+    source: str                 # absolute path
+    output: str                 # absolute path
+    options: Dict[str, Any]     # create_multi_resolution_ico keyword arguments
+
+@dataclass
+class BuildPlan:
+    stale: List[Tuple[ManifestEntry, str]] = field(default_factory=list)  # (entry, reason)
+    fresh: List[ManifestEntry] = field(default_factory=list)
+    # output -> new source mtime, for sources touched without a content change
+    touched: Dict[str, int] = field(default_factory=dict)
+
+def load_manifest(path: str) -> List[ManifestEntry]:
+    """
+    Read a TOML or JSON manifest:
+
+        [defaults]                      # optional, applies to every icon
+        sizes = [16, 32, 48, 256]
+        fit = "pad"
+
+        [[icon]]
+        source = "art/logo.png"         # relative to the manifest
+        output = "build/logo.ico"
+        fit = "crop"
+        crop_center = [512, 300]        # source pixels
+        crop_zoom = 1.5
+        padrgb = [0, 0, 0, 0]
+
+    JSON uses the same keys: {"defaults": {...}, "icon": [{...}, ...]}.
+    Raises ValueError on malformed entries.
+    """
+    data = _read_manifest_data(path)
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = data.get("defaults") or {}
+    raw = data.get("icon", data.get("icons"))
+    if not isinstance(raw, list) or not raw:
+        raise ValueError(f"{path}: no [[icon]] entries")
+
+    entries: List[ManifestEntry] = []
+    seen = {}
+    for i, item in enumerate(raw):
+        where = f"{path}: icon #{i + 1}"
+        if not isinstance(item, dict):
+            raise ValueError(f"{where}: expected a table")
+        merged = dict(defaults, **item)
+        try:
+            src, out = merged["source"], merged["output"]
+        except KeyError as e:
+            raise ValueError(f"{where}: missing {e.args[0]!r}")
+        entry = ManifestEntry(os.path.normpath(os.path.join(base, src)),
+                              os.path.normpath(os.path.join(base, out)),
+                              _entry_options(merged, where))
+        key = os.path.normcase(entry.output)
+        if key in seen:
+            raise ValueError(f"{where}: output {out} already produced by icon #{seen[key]}")
+        seen[key] = i + 1
+        entries.append(entry)
+    return entries
+
+def default_state_path(manifest_path: str) -> str:
+    return os.path.splitext(manifest_path)[0] + ".state.json"
+
+def plan_build(entries: List[ManifestEntry], state: Dict[str, Any], force: bool = False) -> BuildPlan:
+    """
+    Split entries into stale/fresh using the state file records.
+    Only stat() calls unless a source's size/mtime changed, in which case its
+    bytes are hashed so a touch without an edit does not trigger a rebuild.
+    """
+    plan = BuildPlan()
+    records = state.get("entries", {})
+    for e in entries:
+        reason = "forced" if force else _stale_reason(e, records.get(e.output), plan.touched)
+        if reason:
+            plan.stale.append((e, reason))
+        else:
+            plan.fresh.append(e)
+    return plan
+
+def build(entries: List[ManifestEntry], state_path: str, force: bool = False,
+          max_workers: Optional[int] = None,
+          on_result: Optional[Callable[[BatchResult], None]] = None,
+          plan: Optional[BuildPlan] = None) -> Tuple[BuildPlan, List[BatchResult]]:
+    """Rebuild stale entries in parallel and update the state file."""
+    state = read_state(state_path)
+    if plan is None:
+        plan = plan_build(entries, state, force)
+    records = state.setdefault("entries", {})
+
+    # Hash sources before converting, so an edit during the build stays stale
+    pending = {}
+    for e, _ in plan.stale:
+        try:
+            pending[e.output] = _source_record(e)
+        except OSError:
+            pass  # missing source: the conversion reports it
+
+    jobs = [BatchJob(e.source, e.output, e.options) for e, _ in plan.stale]
+    results = run_batch(jobs, DEFAULT_SIZES, max_workers=max_workers, on_result=on_result) if jobs else []
+
+    for r in results:
+        rec = pending.get(r.job.output_path)
+        if not r.ok or rec is None:
+            records.pop(r.job.output_path, None)
+            continue
+        try:
+            st = os.stat(r.job.output_path)
+        except OSError:
+            continue
+        rec["out_mtime_ns"], rec["out_size"] = st.st_mtime_ns, st.st_size
+        records[r.job.output_path] = rec
+    # Remember the new mtime of touched sources so the next run skips hashing them
+    for out, mtime_ns in plan.touched.items():
+        if out in records:
+            records[out]["src_mtime_ns"] = mtime_ns
+
+    wanted = {e.output for e in entries}
+    for out in list(records):
+        if out not in wanted:
+            del records[out]
+    write_state(state_path, state)
+    return plan, results
+
+def read_state(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {"version": _STATE_VERSION, "entries": {}}
+    if data.get("version") != _STATE_VERSION or not isinstance(data.get("entries"), dict):
+        return {"version": _STATE_VERSION, "entries": {}}
+    return data
+
+def write_state(path: str, state: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _stale_reason(e: ManifestEntry, rec: Optional[Dict[str, Any]], touched: Dict[str, int]) -> str:
+    if rec is None:
+        return "new"
+    if rec.get("params") != _params_hash(e):
+        return "parameters changed"
+    try:
+        out_st = os.stat(e.output)
+    except OSError:
+        return "output missing"
+    if (out_st.st_mtime_ns, out_st.st_size) != (rec.get("out_mtime_ns"), rec.get("out_size")):
+        return "output modified"
+    try:
+        src_st = os.stat(e.source)
+    except OSError:
+        return "source missing"
+    if (src_st.st_mtime_ns, src_st.st_size) == (rec.get("src_mtime_ns"), rec.get("src_size")):
+        return ""
+    if src_st.st_size == rec.get("src_size") and _hash_file(e.source) == rec.get("src_hash"):
+        touched[e.output] = src_st.st_mtime_ns
+        return ""
+    return "source changed"
+
+def _source_record(e: ManifestEntry) -> Dict[str, Any]:
+    st = os.stat(e.source)
+    return {"source": e.source, "src_mtime_ns": st.st_mtime_ns, "src_size": st.st_size,
+            "src_hash": _hash_file(e.source), "params": _params_hash(e)}
+
+def _params_hash(e: ManifestEntry) -> str:
+    blob = json.dumps({"pIcon": __version__, "source": e.source, **e.options},
+                      sort_keys=True, default=list)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _entry_options(m: Dict[str, Any], where: str) -> Dict[str, Any]:
+    opts: Dict[str, Any] = {}
+    sizes = m.get("sizes", DEFAULT_SIZES)
+    if isinstance(sizes, str):
+        sizes = parse_custom_sizes(sizes)
+    elif isinstance(sizes, list) and all(isinstance(n, int) for n in sizes):
+        sizes = parse_custom_sizes(" ".join(map(str, sizes)))
+    else:
+        raise ValueError(f"{where}: sizes must be a list of integers or a string")
+    if not sizes:
+        raise ValueError(f"{where}: no valid sizes")
+    opts["sizes"] = sizes
+
+    fit = m.get("fit", "pad")
+    if fit not in _FIT_MODES:
+        raise ValueError(f"{where}: fit must be one of {', '.join(_FIT_MODES)}")
+    opts["fit_mode"] = fit
+
+    pad = m.get("padrgb", [0, 0, 0, 0])
+    if isinstance(pad, str):
+        pad = pad.split(",")
+    try:
+        pad = [int(c) for c in pad]
+        if len(pad) != 4 or not all(0 <= c <= 255 for c in pad):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: padrgb must be R,G,B,A with each value 0-255")
+    opts["pad_rgba"] = tuple(pad)
+
+    if m.get("crop_center") is not None:
+        cc = m["crop_center"]
+        if not isinstance(cc, list) or len(cc) != 2:
+            raise ValueError(f"{where}: crop_center must be [x, y]")
+        opts["crop_center"] = (_number(cc[0], where, "crop_center x"), _number(cc[1], where, "crop_center y"))
+    if m.get("crop_zoom") is not None:
+        opts["crop_zoom"] = _number(m["crop_zoom"], where, "crop_zoom")
+        if opts["crop_zoom"] <= 0:
+            raise ValueError(f"{where}: crop_zoom must be > 0")
+    if m.get("png_min_size") is not None:
+        opts["png_min_size"] = _integer(m["png_min_size"], where, "png_min_size")
+    if m.get("compress_level") is not None:
+        opts["compress_level"] = _integer(m["compress_level"], where, "compress_level")
+        if not 0 <= opts["compress_level"] <= 9:
+            raise ValueError(f"{where}: compress_level must be 0-9")
+    return opts
+
+def _number(v: Any, where: str, name: str) -> float:
+    try:
+        if isinstance(v, bool):
+            raise TypeError
+        f = float(v)
+        if not math.isfinite(f):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: {name} must be a number")
+    return f
+
+def _integer(v: Any, where: str, name: str) -> int:
+    try:
+        if isinstance(v, (bool, float)):
+            raise TypeError
+        return int(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: {name} must be an integer")
+
+def _read_manifest_data(path: str) -> Dict[str, Any]:
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    try:
+        import tomllib  # Python 3.11+
+    except ImportError:
+        try:
+            import tomli as tomllib  # type: ignore
+        except ImportError:
+            raise RuntimeError("TOML manifests need Python 3.11+ or 'tomli' (pip install tomli); "
+                               "JSON manifests work everywhere.")
+    with open(path, "rb") as f:
+        return tomllib.load(f)
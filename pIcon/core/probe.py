@@ -0,0 +1,146 @@
+import os
+import struct
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from .timings import stage
+
+# Optional HEIC/HEIF
+try:
+    import pi_heif  # type: ignore
+except Exception:
+    pi_heif = None  # type: ignore
+
+# Probes kept per process; keyed by (path, mtime_ns, size) so an edited file is re-read
+PROBE_CACHE_SIZE = 512
+
+_CACHE: "OrderedDict[Tuple[str, int, int], ImageProbe]" = OrderedDict()
+_LOCK = threading.Lock()
+_COUNTERS = {"hits": 0, "misses": 0}
+
+class ImageProbe(NamedTuple):
+    path: str
+    format: Optional[str]
+    size: Tuple[int, int]        # as stored (before EXIF orientation)
+    mode: str
+    frames: int
+    orientation: int             # EXIF Orientation, 1 if absent
+    has_icc: bool
+
+    @property
+    def pixels(self) -> int:
+        return self.size[0] * self.size[1]
+
+    @property
+    def is_animated(self) -> bool:
+        return self.frames > 1
+
+    @property
+    def oriented_size(self) -> Tuple[int, int]:
+        """(w, h) as displayed, after EXIF orientation."""
+        return (self.size[1], self.size[0]) if self.orientation in (5, 6, 7, 8) else self.size
+
+    @property
+    def decoded_bytes(self) -> int:
+        return decoded_bytes(self.size, self.mode)
+
+def decoded_bytes(size: Tuple[int, int], mode: str) -> int:
+    """Bytes the normal (non-banded) path holds at once: decoded image plus its RGBA copy."""
+    try:
+        bands = Image.getmodebands(mode)
+    except (KeyError, ValueError):
+        bands = 4
+    return size[0] * size[1] * (bands + 4)
+
+def exif_orientation(img: Image.Image) -> int:
+    """EXIF Orientation (1-8) of an opened image, 1 if absent or invalid; never decodes pixels."""
+    if img.format == "PNG":
+        # PngImageFile.getexif() decodes the whole image to find a trailing eXIf chunk
+        exif = Image.Exif()
+        if img.info.get("exif"):
+            exif.load(img.info["exif"])
+    else:
+        exif = img.getexif()
+    return _checked_orientation(exif.get(0x0112, 1))
+
+def probe_image(path: str, max_pixels: Optional[int] = None) -> ImageProbe:
+    """
+    Read only the headers of path and describe it (format, stored size, mode,
+    frame count, EXIF orientation, ICC presence) without decoding pixels.
+    Results are cached by (path, mtime, size), so repeated probes cost one stat().
+    Raises FileNotFoundError for a missing file and ValueError for anything that
+    should be rejected before decoding: unreadable/unsupported data, Pillow's
+    decompression-bomb limit, or more than max_pixels pixels (None/0 = no limit).
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise FileNotFoundError(f"Input file not found: {path}")
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _LOCK:
+        probe = _CACHE.get(key)
+        if probe is not None:
+            _CACHE.move_to_end(key)
+            _COUNTERS["hits"] += 1
+    if probe is None:
+        with stage("probe"):
+            probe = _read_headers(path)
+        with _LOCK:
+            _COUNTERS["misses"] += 1
+            _CACHE[key] = probe
+            while len(_CACHE) > PROBE_CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    if max_pixels and probe.pixels > max_pixels:
+        raise ValueError(f"{probe.size[0]}x{probe.size[1]} is {probe.pixels / 1e6:.1f} MP, "
+                         f"above the {max_pixels / 1e6:.1f} MP limit")
+    return probe
+
+def probe_counters() -> Dict[str, int]:
+    """Snapshot of this process's probe cache hits/misses."""
+    return dict(_COUNTERS)
+
+def clear_probe_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
+
+def _read_headers(path: str) -> ImageProbe:
+    if path.lower().endswith((".heic", ".heif")) and pi_heif is not None:
+        return _read_heif_headers(path)
+    try:
+        with warnings.catch_warnings():
+            # Between MAX_IMAGE_PIXELS and twice that Pillow only warns; the caller sets its own limit
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(path) as img:
+                return ImageProbe(path, img.format, img.size, img.mode,
+                                  int(getattr(img, "n_frames", 1) or 1),
+                                  exif_orientation(img), bool(img.info.get("icc_profile")))
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Rejected as a possible decompression bomb ({e})")
+    except UnidentifiedImageError:
+        if pi_heif is not None:
+            try:
+                return _read_heif_headers(path)
+            except Exception:
+                pass
+        raise ValueError("Not a supported image")
+    except (OSError, SyntaxError, struct.error) as e:
+        raise ValueError(f"Unreadable image header ({e})")
+
+def _read_heif_headers(path: str) -> ImageProbe:
+    heif = pi_heif.open_heif(path)  # lazy: pixel data is decoded on first access
+    exif = Image.Exif()
+    if heif.info.get("exif"):
+        exif.load(heif.info["exif"])
+    return ImageProbe(path, "HEIF", tuple(heif.size), heif.mode, max(1, len(heif)),
+                      _checked_orientation(exif.get(0x0112, 1)), bool(heif.info.get("icc_profile")))
+
+def _checked_orientation(value) -> int:
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return value if 1 <= value <= 8 else 1
@@ -0,0 +1,256 @@
+"""
+Export in a warm child process, with the decoded image shared instead of copied.
+
+The GUI's export thread spends most of its time in Pillow and zlib, and the
+pure-Python parts of the save path still hold the GIL often enough to make
+the Tk loop stutter. ProcessExporter runs IconSession.export in one child
+process instead:
+- the image goes to the child once, through multiprocessing.shared_memory,
+  and the child wraps that memory with Image.frombuffer (no pickle, no
+  re-decode); later exports of the same image reuse it and the child's
+  session memo
+- requests, progress and results travel over a Pipe
+- the child is started once (start() warms it ahead of time) and reused
+"""
+import multiprocessing
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Optional
+
+from PIL import Image
+
+from .progress import CancelToken, ExportCancelled, ProgressCallback
+
+# Rows copied into shared memory per tobytes() call, to bound the temporary copy
+_COPY_BAND_BYTES = 16 * 1024 * 1024
+
+class ProcessExporter:
+    """
+    One warm child process that runs IconSession exports.
+    - export() blocks the calling (worker) thread, which only waits on the pipe,
+      relaying progress to on_progress and forwarding a cancel as a message
+    - one export at a time; the shared image is replaced when a different
+      image is exported and freed by close()
+    - a child that dies is restarted on the next export (the failing export
+      raises RuntimeError)
+    - an export abandoned midway (on_progress raised) is cancelled and its
+      remaining replies are read, so the next export starts in step; a child
+      that does not finish within SETTLE_SECONDS is restarted instead
+    """
+    POLL_SECONDS = 0.05
+    SETTLE_SECONDS = 5.0
+
+    def __init__(self):
+        self._ctx = multiprocessing.get_context("spawn")  # never fork a process that runs Tk threads
+        self._proc = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        # Image copied into _shm. A weak reference: it does not keep a closed
+        # session's image alive, and unlike id() it cannot match a later image
+        self._shm_image: Optional[weakref.ref] = None
+        self.spawned = 0
+        self.exports = 0
+        self.shared = 0   # images copied into shared memory
+
+    def start(self) -> None:
+        """Spawn the child now so the first export does not pay for it."""
+        with self._lock:
+            self._ensure_child()
+
+    def export(self, image: Image.Image, output_ico_path: str, sizes: Iterable[int],
+               on_progress: Optional[ProgressCallback] = None,
+               cancel: Optional[CancelToken] = None,
+               **kwargs) -> None:
+        """
+        IconSession(image).export(output_ico_path, sizes, **kwargs) in the child.
+        image must be upright RGBA (e.g. IconSession.image); kwargs are the fit
+        settings and png_min_size/compress_level. Raises ExportCancelled,
+        ValueError/OSError as the export would, or RuntimeError if the child died.
+        """
+        if image.mode != "RGBA":
+            raise ValueError(f"Shared images must be RGBA, got {image.mode}")
+        with self._lock:
+            self._ensure_child()
+            name = self._share(image)
+            self.exports += 1
+            sent = settled = False  # settled: the child's final reply to this export was read
+            try:
+                self._conn.send(("export", name, image.size, output_ico_path, list(sizes), kwargs))
+                sent = True
+                cancel_sent = False
+                while True:
+                    ready = self._conn.poll(self.POLL_SECONDS)
+                    if cancel is not None and cancel.cancelled and not cancel_sent:
+                        self._conn.send(("cancel",))
+                        cancel_sent = True
+                    if not ready:
+                        continue
+                    msg = self._conn.recv()
+                    if msg[0] == "progress":
+                        if on_progress is not None:
+                            on_progress(*msg[1:])
+                        continue
+                    settled = True
+                    if msg[0] == "done":
+                        return
+                    if msg[0] == "cancelled":
+                        raise ExportCancelled("Export cancelled")
+                    raise _rebuild_error(msg[1], msg[2])  # ("error", exception type name, message)
+            except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+                settled = True
+                self._reset_child()
+                raise RuntimeError(f"Export process exited unexpectedly ({e or type(e).__name__})")
+            finally:
+                if sent and not settled:
+                    self._settle()
+
+    def stats(self) -> Dict[str, int]:
+        return {"spawned": self.spawned, "exports": self.exports, "shared": self.shared}
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the child and free the shared image.
+        close() waits for a running export; with a timeout, an export still
+        running after timeout seconds is cut short by terminating the child
+        (that export raises RuntimeError).
+        """
+        if not self._lock.acquire(timeout=-1 if timeout is None else max(0.0, timeout)):
+            proc = self._proc
+            if proc is not None:
+                proc.terminate()  # export() sees EOF, resets the child and releases the lock
+            self._lock.acquire()
+        try:
+            if self._conn is not None:
+                try:
+                    self._conn.send(("close",))
+                except (OSError, BrokenPipeError):
+                    pass
+            self._stop_child(grace=2)
+            self._free_shm()
+        finally:
+            self._lock.release()
+
+    # ---- internals (caller holds _lock)
+    def _ensure_child(self) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            return
+        self._reset_child()
+        parent, child = self._ctx.Pipe(duplex=True)
+        self._proc = self._ctx.Process(target=_child_main, args=(child,), name="pIcon-export", daemon=True)
+        self._proc.start()
+        child.close()
+        self._conn = parent
+        self.spawned += 1
+
+    def _reset_child(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = self._proc = None
+
+    def _stop_child(self, grace: float = 0.0) -> None:
+        """Wait up to grace seconds for the child to exit, then terminate it."""
+        if self._proc is not None:
+            self._proc.join(timeout=grace)
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join(timeout=2)
+        self._reset_child()
+
+    def _settle(self) -> None:
+        """Cancel an abandoned export and read its remaining replies, or restart the child."""
+        try:
+            self._conn.send(("cancel",))
+            deadline = time.monotonic() + self.SETTLE_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._conn.poll(remaining):
+                    break
+                if self._conn.recv()[0] != "progress":
+                    return
+        except (OSError, EOFError):
+            pass
+        self._stop_child()
+
+    def _share(self, image: Image.Image) -> str:
+        """Name of the shared block holding image, copying it in if it is not there yet."""
+        if self._shm is not None and self._shm_image is not None and self._shm_image() is image:
+            return self._shm.name
+        self._free_shm()
+        w, h = image.size
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, w * h * 4))
+        rows = max(1, _COPY_BAND_BYTES // max(1, w * 4))
+        for y in range(0, h, rows):
+            band = image.crop((0, y, w, min(h, y + rows))).tobytes()
+            self._shm.buf[y * w * 4:y * w * 4 + len(band)] = band
+        self._shm_image = weakref.ref(image)
+        self.shared += 1
+        return self._shm.name
+
+    def _free_shm(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = self._shm_image = None
+
+class _PipeCancelToken(CancelToken):
+    """Child side: a ("cancel",) message from the parent cancels the running export."""
+    def __init__(self, conn):
+        super().__init__()
+        self._conn = conn
+
+    def check(self) -> None:
+        while not self.cancelled and self._conn.poll():
+            if self._conn.recv()[0] == "cancel":
+                self.cancel()
+        super().check()
+
+def _child_main(conn) -> None:
+    from .session import IconSession
+
+    current = None  # (shm name, SharedMemory, IconSession) of the last shared image
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg[0] == "close":
+            break
+        if msg[0] != "export":
+            continue  # a cancel that arrived after its export finished
+        _, name, size, out, sizes, kwargs = msg
+        try:
+            if current is None or current[0] != name:
+                if current is not None:
+                    old, current = current[1], None  # drops the old session and its views of old.buf
+                    _close_shm(old)
+                shm = shared_memory.SharedMemory(name=name)
+                # No local reference to the image: only the session may view shm.buf
+                current = (name, shm, IconSession(Image.frombuffer("RGBA", tuple(size), shm.buf,
+                                                                   "raw", "RGBA", 0, 1)))
+            current[2].export(out, sizes, on_progress=lambda *p: conn.send(("progress",) + p),
+                              cancel=_PipeCancelToken(conn), **kwargs)
+            conn.send(("done",))
+        except ExportCancelled:
+            conn.send(("cancelled",))
+        except Exception as e:
+            conn.send(("error", type(e).__name__, str(e)))
+    if current is not None:
+        old, current = current[1], None
+        _close_shm(old)
+
+def _close_shm(shm: shared_memory.SharedMemory) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        pass  # an image still views the buffer; the mapping goes away with the process
+
+def _rebuild_error(type_name: str, message: str) -> Exception:
+    cls = {"ValueError": ValueError, "FileNotFoundError": FileNotFoundError,
+           "PermissionError": PermissionError, "OSError": OSError}.get(type_name)
+    return cls(message) if cls is not None else RuntimeError(f"{type_name}: {message}")
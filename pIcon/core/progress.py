@@ -0,0 +1,49 @@
+import threading
+from typing import Callable, Optional
+
+# on_progress(stage, done, total): stage label ("decode", "fit", "resize 48",
+# "encode 48", "write") and overall steps completed out of total
+ProgressCallback = Callable[[str, int, int], None]
+
+class ExportCancelled(Exception):
+    """Raised inside an export when its CancelToken was cancelled."""
+
+class CancelToken:
+    """
+    Cooperative cancellation: the caller cancel()s from any thread and the
+    export checks between steps (sizes, entries, before publishing the file),
+    so a cancelled export stops at the next step boundary.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise ExportCancelled("Export cancelled")
+
+class Steps:
+    """Counts export steps, reports each to on_progress and checks the token between them."""
+    def __init__(self, total: int, on_progress: Optional[ProgressCallback] = None,
+                 cancel: Optional[CancelToken] = None):
+        self.total = total
+        self.done = 0
+        self.on_progress = on_progress
+        self.cancel = cancel
+
+    def check(self) -> None:
+        if self.cancel is not None:
+            self.cancel.check()
+
+    def step(self, stage: str) -> None:
+        self.done += 1
+        if self.on_progress is not None:
+            self.on_progress(stage, self.done, self.total)
+        if self.done < self.total:  # once the last step is done there is nothing left to stop
+            self.check()
@@ -0,0 +1,226 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from .geometry import EXIF_TRANSPOSE, Box, FitPlan, oriented_size, plan_square, render_frames
+from .ico import DEFAULT_COMPRESS_LEVEL, PNG_MIN_SIZE, encode_entry, pack_ico, write_bytes_atomic
+from .images import MAX_ICO_SIZE, ORIENTATION_KEY, RGBA, ImageSource, load_image_as_rgba
+from .probe import probe_image
+from .progress import CancelToken, ProgressCallback, Steps
+from .timings import stage
+
+# Fit plans whose frames/entries are kept; older ones are dropped first
+SESSION_PLANS = 4
+# Plan memo entries; a drag makes one per event and a plan is cheap to redo
+_MAX_PLAN_KEYS = 64
+# Source of IconSession.serial
+_SERIALS = itertools.count(1)
+
+class IconSession:
+    """
+    One decoded source and the memoized stages of turning it into an .ico:
+        source -> oriented image -> fit plan -> per-size frames -> encoded entries
+    Each stage is keyed by its own inputs only:
+    - plan: (fit_mode, pad_rgba, crop_center, crop_zoom)
+    - frame: (plan, size); changing the size set renders just the new sizes,
+      from the reduced levels of the region pyramid kept for the last plan's
+      source box (the full-resolution level is dropped once they exist)
+    - entry: (plan, size, png_min_size, compress_level)
+    so moving the crop re-renders frames but never re-decodes, and toggling a
+    size or the compression level reuses everything upstream of it.
+    The source is decoded once at full resolution with EXIF orientation deferred;
+    crop_center is in upright full-resolution pixels (the coordinates of .image).
+    Safe to call from several threads; stages are computed under one lock.
+    serial is unique per process and never reused (unlike id()), so caches
+    outside the session can key on it without holding the session alive.
+    """
+    def __init__(self, source: ImageSource, max_pixels: Optional[int] = None):
+        if isinstance(source, (str, os.PathLike)):
+            # Headers first: rejects unsupported files and bombs before decoding
+            self.probe = probe_image(os.fspath(source), max_pixels)
+            self.path: Optional[str] = os.fspath(source)
+        else:
+            self.probe = None
+            self.path = None
+        self.source = load_image_as_rgba(source, defer_orientation=True)
+        self.orientation = self.source.info.get(ORIENTATION_KEY, 1)
+        self.size = oriented_size(self.source.size, self.orientation)  # upright (w, h)
+        self.serial = next(_SERIALS)
+        self._image: Optional[Image.Image] = None
+        self._plans: Dict[Hashable, FitPlan] = {}
+        self._frames: "OrderedDict[FitPlan, Dict[int, Image.Image]]" = OrderedDict()
+        self._entries: Dict[Tuple[FitPlan, int, int, int], bytes] = {}
+        self._levels: Tuple[Optional[Box], List[Image.Image]] = (None, [])  # region pyramid of the last src_box
+        self._lock = threading.RLock()
+        self._counters = {"plan_hits": 0, "plan_misses": 0, "frame_hits": 0, "frame_misses": 0,
+                          "entry_hits": 0, "entry_misses": 0}
+
+    @property
+    def image(self) -> Image.Image:
+        """The source upright (EXIF orientation applied once, on first use)."""
+        with self._lock:
+            if self._image is None:
+                method = EXIF_TRANSPOSE.get(self.orientation)
+                if method is None:
+                    self._image = self.source
+                else:
+                    with stage("exif_transpose"):
+                        self._image = self.source.transpose(method)
+            return self._image
+
+    def plan(self, fit_mode: str = "pad",
+             pad_rgba: RGBA = (0, 0, 0, 0),
+             crop_center: Optional[Tuple[float, float]] = None,
+             crop_zoom: float = 1.0) -> FitPlan:
+        """Fit geometry for these settings (boxes only, see geometry.plan_square)."""
+        key = (fit_mode, tuple(pad_rgba),
+               None if crop_center is None else (float(crop_center[0]), float(crop_center[1])),
+               float(crop_zoom or 1.0))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self._counters["plan_misses"] += 1
+                if len(self._plans) >= _MAX_PLAN_KEYS:
+                    self._plans.clear()
+                plan = self._plans[key] = plan_square(self.size, *key)
+            else:
+                self._counters["plan_hits"] += 1
+            return plan
+
+    def frames(self, sizes: Iterable[int], **fit) -> Dict[int, Image.Image]:
+        """{size: square RGBA frame}; only sizes not rendered for this plan before are rendered."""
+        return self._frames_for(self.plan(**fit), _ico_sizes(sizes))
+
+    def _frames_for(self, plan: FitPlan, ico_sizes: List[int],
+                    steps: Optional[Steps] = None) -> Dict[int, Image.Image]:
+        with self._lock:
+            cached = self._frames.get(plan)
+            if cached is None:
+                cached = self._frames[plan] = {}
+                while len(self._frames) > SESSION_PLANS:
+                    old, _ = self._frames.popitem(last=False)
+                    for k in [k for k in self._entries if k[0] == old]:
+                        del self._entries[k]
+            else:
+                self._frames.move_to_end(plan)
+            missing = [n for n in ico_sizes if n not in cached]
+            self._counters["frame_hits"] += len(ico_sizes) - len(missing)
+            self._counters["frame_misses"] += len(missing)
+            if missing:
+                with stage("render", sizes=len(missing), upscale=plan.side < max(missing)):
+                    if self._levels[0] != plan.src_box:
+                        self._levels = (plan.src_box, [])
+                    # With progress, one size per call (the shared levels keep that cheap)
+                    batches = [missing] if steps is None else [[n] for n in reversed(missing)]
+                    levels = self._levels[1]
+                    for batch in batches:
+                        cached.update(render_frames(self.source, plan, batch, orientation=self.orientation,
+                                                    levels=levels))
+                        if len(levels) > 1:
+                            levels[0] = None  # a full-size RGBa copy; later sizes start from the reduced levels
+                        if steps is not None:
+                            steps.step(f"resize {batch[0]}")
+            if steps is not None:
+                for n in ico_sizes:
+                    if n not in missing:
+                        steps.step(f"resize {n}")
+            return {n: cached[n] for n in ico_sizes}
+
+    def entries(self, sizes: Iterable[int],
+                png_min_size: int = PNG_MIN_SIZE,
+                compress_level: int = DEFAULT_COMPRESS_LEVEL,
+                on_progress: Optional[ProgressCallback] = None,
+                cancel: Optional[CancelToken] = None,
+                **fit) -> Dict[int, bytes]:
+        """
+        {size: encoded ICO entry}, reusing entries already encoded with the same settings.
+        on_progress/cancel: see export().
+        """
+        ico_sizes = _ico_sizes(sizes)
+        return self._entries_for(ico_sizes, png_min_size, compress_level,
+                                 self._steps(ico_sizes, on_progress, cancel), fit)
+
+    def _entries_for(self, ico_sizes: List[int], png_min_size: int, compress_level: int,
+                     steps: Optional[Steps], fit) -> Dict[int, bytes]:
+        if steps is not None:
+            steps.check()
+            steps.step("decode")  # decoded when the session was created
+        plan = self.plan(**fit)
+        if steps is not None:
+            steps.step("fit")
+        frames = self._frames_for(plan, ico_sizes, steps)
+        with self._lock:
+            out: Dict[int, bytes] = {}
+            missing: List[int] = []
+            for n in frames:
+                data = self._entries.get((plan, n, int(png_min_size), int(compress_level)))
+                if data is None:
+                    missing.append(n)
+                else:
+                    out[n] = data
+                    if steps is not None:
+                        steps.step(f"encode {n}")
+            self._counters["entry_hits"] += len(out)
+            self._counters["entry_misses"] += len(missing)
+            if missing:
+                with stage("encode", entries=len(missing)):
+                    for n in missing:
+                        data = encode_entry(frames[n], png_min_size=png_min_size, compress_level=compress_level)
+                        self._entries[(plan, n, int(png_min_size), int(compress_level))] = out[n] = data
+                        if steps is not None:
+                            steps.step(f"encode {n}")
+            return {n: out[n] for n in sorted(out)}
+
+    def build(self, sizes: Iterable[int], **kwargs) -> bytes:
+        """Encoded .ico bytes; kwargs are the fit settings plus png_min_size/compress_level."""
+        entries = self.entries(sizes, **kwargs)
+        return pack_ico(list(entries), list(entries.values()))
+
+    def export(self, output_ico_path: str, sizes: Iterable[int],
+               on_progress: Optional[ProgressCallback] = None,
+               cancel: Optional[CancelToken] = None,
+               png_min_size: int = PNG_MIN_SIZE,
+               compress_level: int = DEFAULT_COMPRESS_LEVEL,
+               **fit) -> None:
+        """
+        build() and write the result atomically to output_ico_path.
+        - on_progress(stage, done, total) is called after every step: decode,
+          fit, resize per size, encode per size, write (core.progress)
+        - cancel: a CancelToken checked between steps and once more before the
+          file is renamed into place; a cancelled export raises ExportCancelled
+          and leaves output_ico_path untouched (no partial .ico)
+        """
+        ico_sizes = _ico_sizes(sizes)
+        steps = self._steps(ico_sizes, on_progress, cancel, write=True)
+        entries = self._entries_for(ico_sizes, png_min_size, compress_level, steps, fit)
+        data = pack_ico(list(entries), list(entries.values()))
+        with stage("write", bytes=len(data)):
+            write_bytes_atomic(output_ico_path, data, cancel=cancel)
+        if steps is not None:
+            steps.step("write")
+
+    @staticmethod
+    def _steps(sizes: Iterable[int], on_progress: Optional[ProgressCallback],
+               cancel: Optional[CancelToken], write: bool = False) -> Optional[Steps]:
+        if on_progress is None and cancel is None:
+            return None
+        n = len(_ico_sizes(sizes))
+        return Steps(2 + 2 * n + (1 if write else 0), on_progress, cancel)
+
+    def stats(self) -> Dict[str, int]:
+        """Hits/misses per stage since the session was created."""
+        with self._lock:
+            return dict(self._counters)
+
+def _ico_sizes(sizes: Iterable[int]) -> List[int]:
+    sizes = sorted(set(int(s) for s in sizes))
+    if not sizes:
+        raise ValueError("No icon sizes specified.")
+    ico_sizes = [n for n in sizes if n <= MAX_ICO_SIZE]
+    if not ico_sizes:
+        raise ValueError(f"ICO entries are limited to {MAX_ICO_SIZE} px.")
+    return ico_sizes
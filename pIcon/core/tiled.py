@@ -0,0 +1,254 @@
+import math
+import os
+import struct
+import warnings
+import zlib
+from typing import Iterator, Optional, Tuple
+
+from PIL import Image
+
+from .geometry import EXIF_TRANSPOSE
+from .probe import decoded_bytes, exif_orientation
+from .timings import stage
+
+# Decoded-size ceiling above which load_and_plan switches to the banded path
+DEFAULT_MAX_MEMORY = 1024 * 1024 * 1024
+
+# Bits per pixel of the raw modes the banded reader can split by rows
+_RAW_BITS = {
+    "1": 1, "L": 8, "P": 8, "LA": 16, "La": 16, "RGB": 24, "BGR": 24,
+    "RGBA": 32, "RGBa": 32, "RGBX": 32, "BGRA": 32, "BGRX": 32, "CMYK": 32,
+}
+# 8-bit, non-interlaced PNG color types -> raw mode
+_PNG_RAWMODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_CHUNK = struct.Struct(">I4s")
+
+def parse_memory(text: str) -> int:
+    """'512M', '2G', '1500000' (bytes) -> bytes; '0' disables the ceiling."""
+    t = str(text).strip().upper().rstrip("B")
+    mult = 1
+    if t and t[-1] in "KMGT":
+        mult = 1024 ** ("KMGT".index(t[-1]) + 1)
+        t = t[:-1]
+    value = float(t)
+    if value < 0:
+        raise ValueError("memory size must be >= 0")
+    return int(value * mult)
+
+def supports_banded(img: Image.Image) -> bool:
+    """True if img (opened, not loaded) can be decoded a band of rows at a time."""
+    if img.format == "PNG":
+        return _png_header(img) is not None
+    if not img.tile or getattr(img, "n_frames", 1) > 1:
+        return False
+    return all(_raw_args(t) is not None for t in img.tile)
+
+def load_bounded(path: str, target_size: int, fit_mode: str = "pad",
+                 max_memory: int = DEFAULT_MAX_MEMORY) -> Optional[Image.Image]:
+    """
+    Decode path within roughly max_memory bytes, or return None when the normal
+    path is fine (small enough) or the format cannot be read in bands.
+    Rows are decoded band by band (PNG: streamed IDAT; raw TIFF/BMP/PPM/TGA:
+    row-split tiles), premultiplied, box-reduced by an integer factor k and
+    accumulated into an image about 2x target_size per side. The result is RGBA
+    with EXIF orientation applied; img.info[DRAFT_SCALE_KEY] = k as for JPEG draft.
+    Sources over max_memory that cannot be read in bands (compressed TIFF, WebP,
+    ...) return None with a RuntimeWarning; JPEG is left to its reduced-scale decode.
+    """
+    from .images import DRAFT_FORMATS, DRAFT_SCALE_KEY, _open_source
+
+    if not max_memory:
+        return None
+    img = _open_source(path)
+    try:
+        need = decoded_bytes(img.size, img.mode)
+        if need <= max_memory:
+            return None
+        if not supports_banded(img):
+            if img.format not in DRAFT_FORMATS:
+                warnings.warn(f"{path}: {img.format} images cannot be decoded in bands; decoding it whole "
+                              f"(~{need // (1024 * 1024)} MB, over max_memory)",
+                              RuntimeWarning, stacklevel=3)
+            return None
+        w, h = img.size
+        k = reduce_factor(img.size, fit_mode, target_size)
+        # Per band we hold the decoded rows, an RGBA and an RGBa copy (+ PNG scratch)
+        per_row = w * (len(img.getbands()) + 12)
+        rows = max(k, (max_memory // 4) // max(1, per_row))
+        rows -= rows % k
+
+        acc = Image.new("RGBa", (math.ceil(w / k), math.ceil(h / k)))
+        bands = _png_bands(img, path, rows) if img.format == "PNG" else _raw_bands(img, path, rows)
+        pending = None  # premultiplied rows not yet reduced (fewer than k)
+        y_out = 0
+        with stage("decode_banded", format=img.format, reduce=k, band_rows=rows):
+            for band in bands:
+                band = _premultiplied(band, img)
+                if pending is not None:
+                    band = _vstack(pending, band)
+                    pending = None
+                usable = band.height - band.height % k
+                if usable < band.height:
+                    pending = band.crop((0, usable, w, band.height))
+                    band = band.crop((0, 0, w, usable)) if usable else None
+                if band is not None:
+                    small = band.reduce(k) if k > 1 else band
+                    acc.paste(small, (0, y_out))
+                    y_out += small.height
+            if pending is not None:
+                small = pending.reduce(k) if k > 1 else pending
+                acc.paste(small, (0, y_out))
+
+        out = acc.convert("RGBA")
+        method = EXIF_TRANSPOSE.get(exif_orientation(img))
+        if method is not None:
+            out = out.transpose(method)
+        if k != 1:
+            out.info[DRAFT_SCALE_KEY] = k
+        return out
+    finally:
+        img.close()
+
+def reduce_factor(size: Tuple[int, int], fit_mode: str, target_size: int) -> int:
+    """Largest integer reduction that keeps the visible content >= 2x target_size."""
+    w, h = size
+    # pad shows the whole image scaled by its long side; crop/stretch by the short side
+    side = max(w, h) if fit_mode == "pad" else min(w, h)
+    return max(1, int(side // (2 * max(1, int(target_size)))))
+
+def _premultiplied(band: Image.Image, src: Image.Image) -> Image.Image:
+    if band.mode == "P":
+        band.putpalette(src.getpalette() or [])
+    if "transparency" in src.info and band.mode in ("P", "L", "RGB"):
+        band.info["transparency"] = src.info["transparency"]
+    if band.mode != "RGBA":
+        band = band.convert("RGBA")
+    return band.convert("RGBa")
+
+def _vstack(top: Image.Image, bottom: Image.Image) -> Image.Image:
+    out = Image.new(top.mode, (top.width, top.height + bottom.height))
+    out.paste(top, (0, 0))
+    out.paste(bottom, (0, top.height))
+    return out
+
+# ---- raw (uncompressed) tiles: TIFF strips/tiles, BMP, PPM, TGA, ...
+def _raw_args(tile) -> Optional[Tuple[Tuple[int, int, int, int], int, str, int, int]]:
+    """
+    (extents, offset, rawmode, stride, ystep) of a raw tile with an explicit
+    stride, or None if its rows can't be addressed.
+    Tiles are read positionally (codec, extents, offset, args), the layout
+    Image.tile has always had, as a plain tuple or as a named tuple.
+    """
+    try:
+        codec, extents, offset, args = tuple(tile)[:4]
+        if codec != "raw":
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        ystep = args[2] if len(args) > 2 else 1
+        x0, y0, x1, y1 = extents
+    except (TypeError, ValueError, IndexError):
+        return None
+    if ystep not in (1, -1):
+        return None
+    if not stride:
+        bits = _RAW_BITS.get(rawmode)
+        if bits is None:
+            return None
+        stride = ((x1 - x0) * bits + 7) // 8
+    return (x0, y0, x1, y1), int(offset), rawmode, stride, ystep
+
+def _raw_bands(img: Image.Image, path: str, rows: int) -> Iterator[Image.Image]:
+    """
+    Decode rows [y, y + rows) at a time: only those rows' bytes are read from
+    each raw tile and unpacked (Image.frombytes) into a band-sized image.
+    """
+    w, h = img.size
+    tiles = [_raw_args(t) for t in img.tile]
+    with open(path, "rb") as f:
+        for y0 in range(0, h, rows):
+            y1 = min(h, y0 + rows)
+            band = Image.new(img.mode, (w, y1 - y0))
+            for (tx0, ty0, tx1, ty1), offset, rawmode, stride, ystep in tiles:
+                r0, r1 = max(ty0, y0), min(ty1, y1)
+                if r0 >= r1:
+                    continue
+                skip = (r0 - ty0) if ystep == 1 else (ty1 - r1)  # bottom-up tiles store the last row first
+                f.seek(offset + skip * stride)
+                data = f.read((r1 - r0) * stride)
+                if len(data) < (r1 - r0) * stride:
+                    raise ValueError("Image data ends early")
+                part = Image.frombytes(img.mode, (tx1 - tx0, r1 - r0), data, "raw", rawmode, stride, ystep)
+                band.paste(part, (tx0, r0 - y0))
+            yield band
+
+# ---- PNG: stream IDAT through zlib, decode each band of filtered rows with Pillow
+def _png_header(img: Image.Image) -> Optional[Tuple[int, str]]:
+    """(bytes per pixel, rawmode) for 8-bit non-interlaced PNGs, else None."""
+    try:
+        with open(img.filename, "rb") as f:
+            head = f.read(8 + 8 + 13)
+    except (OSError, AttributeError, TypeError):
+        return None
+    if head[:8] != _PNG_SIGNATURE or head[12:16] != b"IHDR":
+        return None
+    _, _, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", head[16:29])
+    rawmode = _PNG_RAWMODES.get(color)
+    if depth != 8 or interlace or rawmode is None or rawmode != img.mode:
+        return None
+    return len(rawmode), rawmode
+
+def _idat_payloads(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(8)
+        while True:
+            head = f.read(_CHUNK.size)
+            if len(head) < _CHUNK.size:
+                return
+            length, ctype = _CHUNK.unpack(head)
+            if ctype == b"IDAT":
+                yield f.read(length)
+                f.seek(4, os.SEEK_CUR)
+            elif ctype == b"IEND":
+                return
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+
+def _png_bands(img: Image.Image, path: str, rows: int) -> Iterator[Image.Image]:
+    """
+    PNG filters reference the previous row, so each band is decoded as a tiny PNG
+    stream whose first row is the previous band's last (unfiltered) row.
+    """
+    bpp, rawmode = _png_header(img)
+    w, h = img.size
+    row_len = 1 + w * bpp
+    inflate = zlib.decompressobj()
+    buf = bytearray()
+    prev: Optional[bytes] = None
+    y = 0
+    payloads = _idat_payloads(path)
+    while y < h:
+        n = min(rows, h - y)
+        need = n * row_len
+        while len(buf) < need:
+            chunk = next(payloads, None)
+            if chunk is None:
+                data = inflate.flush()
+                if not data:
+                    raise ValueError("PNG image data ends early")
+            else:
+                data = inflate.decompress(chunk)
+            buf += data
+        filtered = bytes(buf[:need])
+        del buf[:need]
+        prefix = b"\0" + prev if prev is not None else b""
+        total = n + (1 if prev is not None else 0)
+        band = Image.frombytes(img.mode, (w, total), zlib.compress(prefix + filtered, 0), "zip", rawmode)
+        if prev is not None:
+            band = band.crop((0, 1, w, total))
+        prev = band.crop((0, n - 1, w, n)).tobytes("raw", rawmode)
+        y += n
+        yield band
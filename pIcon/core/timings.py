@@ -0,0 +1,111 @@
+import contextlib
+import sys
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+# Installed recorder for the current context (thread/task); None = instrumentation off
+_RECORDER: ContextVar[Optional["TimingRecorder"]] = ContextVar("pIcon_timings", default=None)
+_NULL = contextlib.nullcontext()
+
+class TimingRecorder:
+    """
+    Collects one event per pipeline stage:
+        {"stage": "decode", "seconds": 0.0123, "rss_peak_mb": 87.1, ...extra}
+    - memory=True adds the process peak RSS after each stage
+    - on_event, if given, is called with every event as it is recorded
+    Install it with recording(); stages outside a recording cost one ContextVar lookup.
+    """
+    def __init__(self, memory: bool = True, on_event: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.memory = memory
+        self.on_event = on_event
+        self.events: List[Dict[str, Any]] = []
+
+    def record(self, name: str, seconds: float, **extra) -> None:
+        ev: Dict[str, Any] = {"stage": name, "seconds": seconds}
+        if self.memory:
+            rss = peak_rss_mb()
+            if rss is not None:
+                ev["rss_peak_mb"] = rss
+        ev.update(extra)
+        self.events.append(ev)
+        if self.on_event is not None:
+            self.on_event(ev)
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per stage name (summed if a stage ran more than once), in first-seen order."""
+        out: Dict[str, float] = {}
+        for ev in self.events:
+            out[ev["stage"]] = out.get(ev["stage"], 0.0) + ev["seconds"]
+        return out
+
+class _Stage:
+    __slots__ = ("rec", "name", "extra", "t0")
+
+    def __init__(self, rec: TimingRecorder, name: str, extra: Dict[str, Any]):
+        self.rec, self.name, self.extra = rec, name, extra
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.rec.record(self.name, time.perf_counter() - self.t0,
+                        **(dict(self.extra, error=exc_type.__name__) if exc_type else self.extra))
+        return False
+
+def stage(name: str, **extra):
+    """Context manager timing one stage into the active recorder (a shared no-op if none)."""
+    rec = _RECORDER.get()
+    if rec is None:
+        return _NULL
+    return _Stage(rec, name, extra)
+
+def active() -> bool:
+    return _RECORDER.get() is not None
+
+@contextlib.contextmanager
+def recording(recorder: Optional[TimingRecorder] = None):
+    """Install recorder (or a fresh one) for the duration of the with-block and yield it."""
+    rec = recorder if recorder is not None else TimingRecorder()
+    token = _RECORDER.set(rec)
+    try:
+        yield rec
+    finally:
+        _RECORDER.reset(token)
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, where the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def percentiles(samples_by_stage: Dict[str, Iterable[float]], qs=(50, 95)) -> Dict[str, Dict[str, float]]:
+    """{stage: {"p50": s, "p95": s, "count": n}} from per-item stage seconds (nearest rank)."""
+    out: Dict[str, Dict[str, float]] = {}
+    for name, samples in samples_by_stage.items():
+        vals = sorted(samples)
+        if not vals:
+            continue
+        row: Dict[str, float] = {"count": len(vals)}
+        for q in qs:
+            row[f"p{q}"] = vals[min(len(vals) - 1, max(0, int(round(q / 100 * (len(vals) - 1)))))]
+        out[name] = row
+    return out
+
+def format_table(totals: Dict[str, float], wall: Optional[float] = None) -> str:
+    """Human-readable stage table; shares are of wall (or of the stage sum)."""
+    whole = wall if wall else sum(totals.values())
+    lines = [f"{'stage':<16}{'ms':>10}{'share':>8}"]
+    for name, secs in totals.items():
+        share = secs / whole * 100 if whole else 0.0
+        lines.append(f"{name:<16}{secs * 1000:>10.1f}{share:>7.0f}%")
+    if wall is not None:
+        lines.append(f"{'total':<16}{wall * 1000:>10.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,404 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .batch import IMAGE_EXTENSIONS, BatchJob, BatchResult, convert_job, source_extensions
+from .images import RGBA
+
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 2.0
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+_EVENT = struct.Struct("iIII")
+
+Signature = Tuple[int, int]  # (st_mtime_ns, st_size)
+
+class WatchLimitError(OSError):
+    """inotify_add_watch hit fs.inotify.max_user_watches (ENOSPC)."""
+
+@dataclass
+class WatchEvent:
+    result: BatchResult
+    latency: float  # seconds from the first change seen to the .ico being written
+
+def output_for(path: str, src_root: str, out_root: str) -> str:
+    """Mirror src_root/<rel>.<ext> to out_root/<rel>.ico."""
+    rel = os.path.relpath(path, src_root)
+    return os.path.join(out_root, os.path.splitext(rel)[0] + ".ico")
+
+def is_watched_name(name: str, extensions: Tuple[str, ...] = IMAGE_EXTENSIONS) -> bool:
+    """Image files only; skips hidden files and editor/download temporaries."""
+    if name.startswith(".") or name.endswith("~"):
+        return False
+    return name.lower().endswith(extensions)
+
+class IconWatcher:
+    """
+    Keep out_root in sync with the images under src_root.
+    - change detection: inotify on Linux, otherwise scandir/stat polling every
+      poll_interval seconds; the loop sleeps in select() between events
+    - debounce: a file is converted once it has been quiet for `debounce`
+      seconds and its (mtime, size) is unchanged since the last event, so
+      files still being written are skipped until they settle
+    - at most one conversion per output runs at a time; changes during a
+      conversion queue exactly one rerun
+    - on start, sources whose .ico is missing or older are converted (catch_up)
+    - out_root below src_root is not watched; if it is src_root (icons written
+      in place) or above it, .ico files are not sources, so the watcher never
+      converts its own output
+    - if the tree needs more inotify watches than the system allows, at start
+      or when a new subdirectory appears, it warns (RuntimeWarning) and
+      switches to polling
+    """
+    def __init__(self, src_root: str, out_root: str,
+                 sizes: Iterable[int],
+                 fit_mode: str = "pad",
+                 pad_rgba: RGBA = (0, 0, 0, 0),
+                 workers: int = 2,
+                 debounce: float = DEFAULT_DEBOUNCE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 backend: str = "auto",
+                 catch_up: bool = True,
+                 on_event: Optional[Callable[[WatchEvent], None]] = None,
+                 **convert_kwargs):
+        self.src_root = os.path.abspath(src_root)
+        self.out_root = os.path.abspath(out_root)
+        self.sizes = list(sizes)
+        self.fit_mode = fit_mode
+        self.pad_rgba = pad_rgba
+        self.workers = max(1, int(workers))
+        self.debounce = max(0.0, float(debounce))
+        self.poll_interval = max(0.05, float(poll_interval))
+        self.catch_up = catch_up
+        self.on_event = on_event
+        self.convert_kwargs = convert_kwargs
+        self.backend_name = backend
+        self._pending: Dict[str, Tuple[float, Optional[Signature], float]] = {}  # path -> (deadline, sig, first_seen)
+        self._running: Dict[str, Tuple[Future, float]] = {}  # path -> (future, first_seen)
+        self._rerun: Set[str] = set()
+        self._stop = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+
+    def stop(self) -> None:
+        """Ask run() to return; safe to call from another thread or a signal handler."""
+        self._stop = True
+        self._wake()
+
+    def run(self) -> None:
+        if not os.path.isdir(self.src_root):
+            raise NotADirectoryError(self.src_root)
+        backend = _make_backend(self.backend_name, self.src_root, self.out_root, self.poll_interval)
+        self.backend_name = backend.name
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                if self.catch_up:
+                    self._resync(backend.known_files())
+                while not self._stop:
+                    now = time.monotonic()
+                    self._dispatch(pool, now)
+                    timeout = self._next_timeout(backend, now)
+                    fds = [self._wake_r] + ([backend.fileno()] if backend.fileno() is not None else [])
+                    try:
+                        ready, _, _ = select.select(fds, [], [], timeout)
+                    except InterruptedError:
+                        continue
+                    if self._wake_r in ready:
+                        self._drain_wake()
+                    now = time.monotonic()
+                    try:
+                        changed = backend.changes(now)
+                    except WatchLimitError as e:
+                        backend.close()
+                        backend = _poll_fallback(e, self.src_root, self.out_root, self.poll_interval)
+                        self.backend_name = backend.name
+                        changed = []
+                        self._resync(backend.known_files())  # what the full watch list would have seen
+                    for path in changed:
+                        self._touch(path, now)
+                    if backend.lost_events:
+                        backend.lost_events = False
+                        self._resync(backend.known_files())
+                    self._collect()
+                for fut, _ in list(self._running.values()):
+                    fut.cancel()
+        finally:
+            backend.close()
+
+    # ---- scheduling
+    def _touch(self, path: str, now: float) -> None:
+        if path in self._running:
+            self._rerun.add(path)
+            return
+        first_seen = self._pending.get(path, (0, None, now))[2]
+        self._pending[path] = (now + self.debounce, _signature(path), first_seen)
+
+    def _dispatch(self, pool: ProcessPoolExecutor, now: float) -> None:
+        for path, (deadline, sig, first_seen) in list(self._pending.items()):
+            if deadline > now or path in self._running:
+                continue
+            current = _signature(path)
+            if current is None:
+                del self._pending[path]  # deleted or renamed away before it settled
+                continue
+            if current != sig:
+                self._pending[path] = (now + self.debounce, current, first_seen)
+                continue
+            del self._pending[path]
+            job = BatchJob(path, output_for(path, self.src_root, self.out_root))
+            fut = pool.submit(convert_job, job, self.sizes, self.fit_mode, self.pad_rgba, self.convert_kwargs)
+            fut.add_done_callback(lambda _f: self._wake())
+            self._running[path] = (fut, first_seen)
+
+    def _collect(self) -> None:
+        now = time.monotonic()
+        for path, (fut, first_seen) in list(self._running.items()):
+            if not fut.done():
+                continue
+            del self._running[path]
+            try:
+                res = fut.result()
+            except Exception as e:  # worker died (e.g., BrokenProcessPool)
+                res = BatchResult(BatchJob(path, output_for(path, self.src_root, self.out_root)),
+                                  False, 0.0, str(e) or type(e).__name__)
+            if self.on_event is not None:
+                self.on_event(WatchEvent(res, time.monotonic() - first_seen))
+            if path in self._rerun:
+                self._rerun.discard(path)
+                self._touch(path, now)
+
+    def _next_timeout(self, backend, now: float) -> Optional[float]:
+        waits = [deadline - now for deadline, _, _ in self._pending.values()]
+        nxt = backend.next_poll()
+        if nxt is not None:
+            waits.append(nxt - now)
+        return max(0.0, min(waits)) if waits else None
+
+    def _resync(self, paths: Iterable[str]) -> None:
+        now = time.monotonic()
+        for path in paths:
+            if self._out_of_date(path):
+                self._touch(path, now)
+
+    def _out_of_date(self, path: str) -> bool:
+        try:
+            out_st = os.stat(output_for(path, self.src_root, self.out_root))
+        except OSError:
+            return True
+        try:
+            return os.stat(path).st_mtime_ns > out_st.st_mtime_ns
+        except OSError:
+            return False
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _drain_wake(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+def _signature(path: str) -> Optional[Signature]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _walk(root: str, skip: str, exts: Tuple[str, ...]) -> Iterable[Tuple[str, List[os.DirEntry]]]:
+    """Yield (dir_path, watched file entries) for every directory below root, except skip."""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            entries = list(os.scandir(d))
+        except OSError:
+            continue
+        files = []
+        for e in entries:
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    if e.path != skip and not e.name.startswith("."):
+                        stack.append(e.path)
+                elif is_watched_name(e.name, exts):
+                    files.append(e)
+            except OSError:
+                continue
+        yield d, files
+
+def _make_backend(name: str, root: str, skip: str, interval: float):
+    if name in ("auto", "inotify") and sys.platform.startswith("linux"):
+        try:
+            return _InotifyBackend(root, skip)
+        except WatchLimitError as e:
+            return _poll_fallback(e, root, skip, interval)
+        except OSError:
+            if name == "inotify":
+                raise
+    elif name == "inotify":
+        raise OSError("inotify is only available on Linux")
+    return _PollBackend(root, skip, interval)
+
+def _poll_fallback(err: WatchLimitError, root: str, skip: str, interval: float) -> "_PollBackend":
+    warnings.warn(f"{err}; falling back to polling every {interval:g}s "
+                  "(raise fs.inotify.max_user_watches to use inotify)", RuntimeWarning, stacklevel=3)
+    return _PollBackend(root, skip, interval)
+
+class _PollBackend:
+    """
+    stat() every watched file each interval; reports files whose (mtime, size) changed.
+    The interval stretches to keep scanning under ~2% of one core on huge trees.
+    """
+    name = "poll"
+    lost_events = False
+    _MAX_DUTY = 0.02
+
+    def __init__(self, root: str, skip: str, interval: float):
+        self.root, self.skip, self.interval = root, skip, interval
+        self.exts = source_extensions(root, skip)
+        t0 = time.monotonic()
+        self._snapshot = self._scan()
+        self._next = self._schedule(t0)
+
+    def _scan(self) -> Dict[str, Signature]:
+        snap = {}
+        for _, files in _walk(self.root, self.skip, self.exts):
+            for e in files:
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                snap[e.path] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def _schedule(self, scan_started: float) -> float:
+        now = time.monotonic()
+        return now + max(self.interval, (now - scan_started) / self._MAX_DUTY)
+
+    def known_files(self) -> List[str]:
+        return list(self._snapshot)
+
+    def fileno(self):
+        return None
+
+    def next_poll(self) -> Optional[float]:
+        return self._next
+
+    def changes(self, now: float) -> List[str]:
+        if now < self._next:
+            return []
+        t0 = time.monotonic()
+        snap = self._scan()
+        old = self._snapshot
+        self._snapshot = snap
+        self._next = self._schedule(t0)
+        return [p for p, sig in snap.items() if old.get(p) != sig]
+
+    def close(self) -> None:
+        pass
+
+class _InotifyBackend:
+    """Recursive inotify watches via libc; new subdirectories are watched as they appear."""
+    name = "inotify"
+    lost_events = False
+
+    def __init__(self, root: str, skip: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.root, self.skip = root, skip
+        self.exts = source_extensions(root, skip)
+        self._dirs: Dict[int, str] = {}
+        self._files: Optional[List[str]] = []  # from the initial walk, handed out once
+        try:
+            self._watch_tree(root, self._files)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, top: str, found: List[str]) -> None:
+        for d, files in _walk(top, self.skip, self.exts):
+            wd = self._add(self._fd, os.fsencode(d), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # vanished while walking
+                cls = WatchLimitError if err == errno.ENOSPC else OSError  # max_user_watches exhausted
+                raise cls(err, f"inotify_add_watch({d}): {os.strerror(err)}")
+            self._dirs[wd] = d
+            found.extend(e.path for e in files)
+
+    def known_files(self) -> List[str]:
+        if self._files is not None:
+            files, self._files = self._files, None
+            return files
+        return [e.path for _, files in _walk(self.root, self.skip, self.exts) for e in files]
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def next_poll(self) -> Optional[float]:
+        return None
+
+    def changes(self, now: float) -> List[str]:
+        out: List[str] = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            off = 0
+            while off + _EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, off)
+                name = buf[off + _EVENT.size: off + _EVENT.size + length].rstrip(b"\0")
+                off += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    self.lost_events = True  # the watcher rescans for out-of-date outputs
+                    continue
+                d = self._dirs.get(wd)
+                if d is None or not name:
+                    continue
+                path = os.path.join(d, os.fsdecode(name))
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO) and path != self.skip:
+                        self._watch_tree(path, out)
+                elif is_watched_name(os.path.basename(path), self.exts):
+                    out.append(path)
+        return out
+
+    def close(self) -> None:
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
@@ -0,0 +1,153 @@
+"""
+Resident CLI worker: keeps Pillow (and pi-heif) imported and runs forwarded
+CLI invocations from pIcon.client over a Unix domain socket.
+
+    python -m pIcon.cli --cli daemon [--socket PATH] [--idle-timeout 600] [--jobs N]
+"""
+import contextlib
+import io
+import os
+import socket
+import socketserver
+import sys
+import time
+from typing import List, Optional
+
+from .client import _exit_code, connect, default_socket_path, recv_msg, send_msg
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+# Seconds the serving process waits for a connected client's request
+_READ_TIMEOUT = 5.0
+
+def run_forwarded(argv: List[str], cwd: Optional[str]) -> dict:
+    """
+    Run the CLI with captured output; never raises. It changes directory and
+    redirects sys.stdout/stderr, so the daemon calls it in a forked child per request.
+    """
+    from .cli import _cli
+
+    if argv[:1] == ["daemon"]:
+        return {"code": 1, "stdout": "", "stderr": "Cannot start a daemon from inside the daemon.\n"}
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    prev = os.getcwd()
+    try:
+        if cwd:
+            os.chdir(cwd)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                _cli(argv)
+            except SystemExit as e:
+                code = _exit_code(e.code)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                code = 2
+    finally:
+        os.chdir(prev)
+    return {"code": code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Runs in the forked child; the serving process has already read the request."""
+    def handle(self):
+        msg = self.server.pending
+        send_msg(self.request, run_forwarded(list(msg.get("argv") or []), msg.get("cwd")))
+
+class DaemonServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves until stopped or idle for idle_timeout seconds.
+    Each forwarded call runs in its own forked child (which already has Pillow
+    imported), so parallel clients, e.g. a make -j build, convert in parallel;
+    at most max_children (default: CPU count) run at once, later ones wait.
+    """
+    request_queue_size = 64
+
+    def __init__(self, path: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 max_children: Optional[int] = None):
+        self.stop = False
+        self.served = 0
+        self.pending: dict = {}
+        self.timeout = idle_timeout if idle_timeout and idle_timeout > 0 else None
+        self.max_children = max(1, int(max_children or os.cpu_count() or 1))
+        _remove_stale_socket(path)
+        super().__init__(path, _Handler)
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    def process_request(self, request, client_address):
+        # Read the request here, not in the child, so "shutdown" stops this process
+        try:
+            request.settimeout(_READ_TIMEOUT)
+            msg = recv_msg(request)
+            request.settimeout(None)
+        except (OSError, ValueError):
+            msg = None
+        if not msg:
+            self.shutdown_request(request)
+            return
+        if msg.get("cmd") == "shutdown":
+            self.stop = True
+            try:
+                send_msg(request, {"code": 0, "stdout": "", "stderr": "pIcon daemon stopping\n"})
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.served += 1
+        self.pending = msg
+        self.collect_children()  # reap finished children; waits while max_children are running
+        super().process_request(request, client_address)
+
+    def handle_timeout(self):
+        super().handle_timeout()
+        self.stop = True
+
+    def run(self) -> None:
+        try:
+            while not self.stop:
+                self.handle_request()
+        finally:
+            self.server_close()  # waits for running children
+            try:
+                os.remove(self.server_address)
+            except OSError:
+                pass
+
+def serve(path: Optional[str] = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+          max_children: Optional[int] = None) -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("The pIcon daemon needs Unix domain sockets (not available on this platform).")
+    path = path or default_socket_path()
+    # Warm the expensive imports before accepting work
+    from . import cli  # noqa: F401
+    from .core import images  # noqa: F401
+    srv = DaemonServer(path, idle_timeout, max_children)
+    print(f"pIcon daemon listening on {path} (idle timeout {idle_timeout:g}s, "
+          f"{srv.max_children} parallel calls)", file=sys.stderr, flush=True)
+    t0 = time.monotonic()
+    srv.run()
+    print(f"pIcon daemon exiting after {srv.served} requests, {time.monotonic() - t0:.0f}s",
+          file=sys.stderr, flush=True)
+
+def stop(path: Optional[str] = None) -> bool:
+    """Ask a running daemon to exit; False if none is listening."""
+    sock = connect(path)
+    if sock is None:
+        return False
+    try:
+        send_msg(sock, {"cmd": "shutdown"})
+        recv_msg(sock)
+    finally:
+        sock.close()
+    return True
+
+def _remove_stale_socket(path: str) -> None:
+    """Unlink a leftover socket file, refusing if a live daemon owns it."""
+    if not os.path.exists(path):
+        return
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        raise RuntimeError(f"A pIcon daemon is already listening on {path}")
+    os.remove(path)
@@ -0,0 +1,290 @@
+"""
+Local HTTP conversion service.
+
+    python -m pIcon.server --port 8765 --workers 4 --queue 32
+
+POST /icon?sizes=16,32,256&fit=crop&padrgb=0,0,0,0  (body: image bytes) -> image/x-icon
+GET  /metrics                                       -> JSON queue/latency/throughput
+GET  /health                                        -> "ok"
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image, UnidentifiedImageError
+
+from .core.images import build_ico
+from .core.sizes import DEFAULT_SIZES, parse_custom_sizes
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+_FIT_MODES = ("pad", "crop", "stretch")
+_LATENCY_WINDOW = 2048
+_THROUGHPUT_WINDOW = 60.0
+# Raised for bad input (unreadable, truncated, bombs, bad sizes): answered 422.
+# Pillow's decode failures are errno-less OSErrors; _convert turns them into ValueError
+_INPUT_ERRORS = (ValueError, UnidentifiedImageError, Image.DecompressionBombError)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class IconServer:
+    """
+    asyncio HTTP front end over a bounded process pool.
+    At most workers + queue_size conversions are admitted at once; anything
+    beyond that is answered 503 immediately instead of piling up.
+    Input/decoding errors are answered 422 and anything else 500; if a worker
+    dies the pool is replaced and the requests it took down are answered 503.
+    Workers are spawned, never forked from the running event loop.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 workers: Optional[int] = None, queue_size: int = 32,
+                 max_body: int = DEFAULT_MAX_BODY):
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.queue_size = max(0, int(queue_size))
+        self.max_body = max_body
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._admitted = 0  # accepted conversions not yet finished (running + queued)
+        self._started = time.monotonic()
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+        self._finished = deque()  # completion timestamps inside the throughput window
+        self._counts = {"completed": 0, "failed": 0, "errors": 0, "rejected": 0, "pool_restarts": 0}
+
+    async def start(self) -> None:
+        self._pool = _new_pool(self.workers)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port=0 picks a free port; expose the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> Dict[str, object]:
+        now = time.monotonic()
+        while self._finished and now - self._finished[0] > _THROUGHPUT_WINDOW:
+            self._finished.popleft()
+        lat = sorted(self._latencies)
+        window = min(_THROUGHPUT_WINDOW, max(now - self._started, 1e-9))
+        return {
+            "workers": self.workers,
+            "queue_capacity": self.queue_size,
+            "queue_depth": max(0, self._admitted - self.workers),
+            "in_flight": min(self._admitted, self.workers),
+            **self._counts,
+            "latency_ms": {f"p{q}": round(_percentile(lat, q) * 1000, 2) for q in (50, 95, 99)},
+            "throughput_rps": round(len(self._finished) / window, 3),
+            "uptime_s": round(now - self._started, 1),
+        }
+
+    # ---- HTTP plumbing
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader, self.max_body)
+                except HttpError as e:
+                    await _respond(writer, e.status, str(e).encode() + b"\n", close=True)
+                    return
+                if req is None:
+                    return
+                method, target, headers, body = req
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, ctype, payload, extra = await self._dispatch(method, target, body)
+                await _respond(writer, status, payload, ctype, extra, close=not keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _dispatch(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, "text/plain", b"ok\n", {}
+        if url.path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics()).encode(), {}
+        if url.path != "/icon":
+            return 404, "text/plain", b"not found\n", {}
+        if method != "POST":
+            return 405, "text/plain", b"use POST\n", {"Allow": "POST"}
+        try:
+            sizes, fit, rgba = _parse_params(url.query)
+        except HttpError as e:
+            return e.status, "text/plain", str(e).encode() + b"\n", {}
+        if not body:
+            return 400, "text/plain", b"empty body\n", {}
+
+        if self._admitted >= self.workers + self.queue_size:
+            self._counts["rejected"] += 1
+            return 503, "text/plain", b"busy, retry later\n", {"Retry-After": "1"}
+
+        self._admitted += 1
+        t0 = time.monotonic()
+        pool = self._pool
+        try:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(pool, _convert, body, sizes, fit, rgba)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            self._counts["errors"] += 1
+            return 503, "text/plain", b"worker crashed, retry later\n", {"Retry-After": "1"}
+        except _INPUT_ERRORS as e:
+            self._counts["failed"] += 1
+            return 422, "text/plain", f"conversion failed: {e}\n".encode(), {}
+        except Exception as e:
+            self._counts["errors"] += 1
+            print(f"pIcon server: internal error: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+            return 500, "text/plain", b"internal error\n", {}
+        finally:
+            self._admitted -= 1
+        done = time.monotonic()
+        self._latencies.append(done - t0)
+        self._finished.append(done)
+        self._counts["completed"] += 1
+        return 200, "image/x-icon", data, {}
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken pool once, however many requests saw it break."""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = _new_pool(self.workers)
+            self._counts["pool_restarts"] += 1
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _convert(body: bytes, sizes, fit: str, rgba) -> bytes:
+    """Pool worker. The body is in memory, so an errno-less OSError is Pillow failing to decode it."""
+    try:
+        return build_ico(body, sizes, fit_mode=fit, pad_rgba=rgba)
+    except UnidentifiedImageError:
+        raise
+    except OSError as e:
+        if e.errno is not None:
+            raise  # a real I/O failure, not the client's image
+        raise ValueError(str(e) or type(e).__name__) from e
+
+def _parse_params(query: str) -> Tuple[list, str, Tuple[int, int, int, int]]:
+    """Mirror the CLI's --sizes/--fit/--padrgb."""
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    sizes = parse_custom_sizes(q["sizes"]) if "sizes" in q else list(DEFAULT_SIZES)
+    if not sizes:
+        raise HttpError(400, "No valid sizes provided.")
+    fit = q.get("fit", "pad")
+    if fit not in _FIT_MODES:
+        raise HttpError(400, f"fit must be one of {', '.join(_FIT_MODES)}")
+    try:
+        rgba = tuple(int(x) for x in q.get("padrgb", "0,0,0,0").split(","))
+        if len(rgba) != 4 or not all(0 <= c <= 255 for c in rgba):
+            raise ValueError
+    except ValueError:
+        raise HttpError(400, "padrgb must be R,G,B,A")
+    return sizes, fit, rgba
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int):
+    """Returns (method, target, headers, body), or None on a clean EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: bytes,
+                   ctype: str = "text/plain", extra: Optional[Dict[str, str]] = None,
+                   close: bool = False) -> None:
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Type: {ctype}",
+            f"Content-Length: {len(payload)}"]
+    for k, v in (extra or {}).items():
+        head.append(f"{k}: {v}")
+    if close:
+        head.append("Connection: close")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+def _percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(prog="python -m pIcon.server",
+                                description="Serve .ico conversion over HTTP with a bounded worker pool.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.add_argument("--queue", type=int, default=32,
+                   help="Requests allowed to wait for a worker before answering 503")
+    p.add_argument("--max-body-mb", type=int, default=DEFAULT_MAX_BODY // (1024 * 1024))
+    ns = p.parse_args(argv)
+
+    server = IconServer(ns.host, ns.port, ns.workers, ns.queue, ns.max_body_mb * 1024 * 1024)
+
+    async def _run():
+        await server.start()
+        print(f"pIcon server on http://{server.host}:{server.port} "
+              f"({server.workers} workers, queue {server.queue_size})", file=sys.stderr, flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,13 @@ from tkinter import ttk, filedialog, messagebox
 
 from PIL import Image
 
+from ..core.procexport import ProcessExporter
+from ..core.session import IconSession
 from .components import Nav
 from .theme import apply_theme, system_is_light
 from .components import install_styles
 from .pages.page_icon_export import IconExportPage
+from .pages.page_batch import BatchPage
 from .pages.page_recent import RecentPage
 from .pages.page_settings import SettingsPage
 
@@ -31,6 +34,7 @@ class Model:
     fit_mode: tk.StringVar = field(default_factory=lambda: tk.StringVar(value="crop"))
     pad_color: tuple = (0, 0, 0, 0)  # RGBA
     loaded_img: Image.Image | None = None
+    session: IconSession | None = None  # decoded source + memoized export stages
     crop_zoom: float = 1.0
     crop_cx: float | None = None
     crop_cy: float | None = None
@@ -47,6 +51,9 @@ class AppRoot:
 
 
 class IconMakerApp:
+    # Seconds closing the window waits for a cancelled process export to stop
+    CLOSE_EXPORT_TIMEOUT = 1.0
+
     def __init__(self):
         self._root_wrapper = AppRoot()
         self.root: tk.Tk = self._root_wrapper.root
@@ -70,6 +77,7 @@ class IconMakerApp:
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self.model = Model()
+        self.exporter: ProcessExporter | None = None  # set while "export in a separate process" is on
 
         # Theme state
         self.appearance_mode = tk.StringVar(value="System")
@@ -94,6 +102,10 @@ class IconMakerApp:
             except Exception:
                 pass
 
+        # Warm the export process after the window is up, so the first export skips the spawn
+        if self.settings.get("export_in_process"):
+            self.root.after(500, lambda: self.set_export_in_process(True))
+
         # Watch system theme
         from .theme import ThemeWatcher
         self.theme_watcher = ThemeWatcher(self.root, system_is_light, lambda: self.set_theme(self.appearance_mode.get()))
@@ -116,7 +128,8 @@ class IconMakerApp:
             "last_dirs": {
                 "open_image": None,
                 "save_ico": None,
-            }
+            },
+            "export_in_process": False,
         }
         try:
             with open(self._settings_file, "r", encoding="utf-8") as f:
@@ -130,6 +143,8 @@ class IconMakerApp:
                 self.settings["recent_files"] = v
             elif k == "last_dirs" and isinstance(v, dict):
                 self.settings["last_dirs"].update(v)
+            elif k == "export_in_process" and isinstance(v, bool):
+                self.settings["export_in_process"] = v
         # hydrate in-memory lists
         self.recent_files = list(self.settings.get("recent_files") or [])
 
@@ -158,8 +173,32 @@ class IconMakerApp:
         except Exception:
             pass
 
+    def set_export_in_process(self, on: bool):
+        """Turn the process-isolated exporter on (spawned and warmed now) or off, and persist it."""
+        self.settings["export_in_process"] = bool(on)
+        self._save_settings()
+        if on and self.exporter is None:
+            self.exporter = ProcessExporter()
+            try:
+                self.exporter.start()
+            except OSError as e:
+                self.exporter = None
+                self.toast(f"Could not start the export process: {e}")
+        elif not on and self.exporter is not None:
+            exporter, self.exporter = self.exporter, None
+            # close() waits for a running export; keep the Tk loop free
+            threading.Thread(target=exporter.close, daemon=True).start()
+
     def _on_close(self):
         self._save_settings()
+        # A running export stops at its next step; close() cuts it short if that takes too long
+        self.pages["icon"]._cancel_export()
+        if self.exporter is not None:
+            self.exporter.close(timeout=self.CLOSE_EXPORT_TIMEOUT)
+        try:
+            self.pages["batch"].queue.shutdown()
+        except Exception:
+            pass
         try:
             self.root.destroy()
         except Exception:
@@ -223,6 +262,7 @@ class IconMakerApp:
         # Left nav
         nav_items = [
             ("icon", "Icon Maker", "icon"),
+            ("batch", "Batch", "batch"),
             ("recent", "Recent", "recent"),
             ("settings", "Settings", "theme"),
         ]
@@ -236,6 +276,7 @@ class IconMakerApp:
 
         self.pages: dict[str, tk.Frame] = {}
         self.pages["icon"] = IconExportPage(self.content, self)
+        self.pages["batch"] = BatchPage(self.content, self)
         self.pages["recent"] = RecentPage(self.content, self)
         self.pages["settings"] = SettingsPage(self.content, self)
 
@@ -246,6 +287,7 @@ class IconMakerApp:
         self.navigate("icon")
 
     def navigate(self, key: str):
+        self.current_page = key
         for k, p in self.pages.items():
             if k == key:
                 p.lift()
@@ -408,7 +450,13 @@ class IconMakerApp:
                 buf += ch
         if buf:
             paths.append(buf)
-        if paths:
+        if not paths:
+            return
+        # Several files, a folder, or a drop onto the Batch page go to the batch queue
+        if len(paths) > 1 or os.path.isdir(paths[0]) or self.current_page == "batch":
+            self.navigate("batch")
+            self.pages["batch"].enqueue(paths)
+        else:
             self.navigate("icon")
             self.pages["icon"].open_path(paths[0])
             self._add_recent(paths[0])
@@ -0,0 +1,187 @@
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from ...core.batch import BatchQueue, collect_jobs
+from ...core.images import MAX_ICO_SIZE
+from ..components import Card, CommandBar
+
+class BatchPage(ttk.Frame):
+    """
+    Batch page: dropped/added files and folders are queued and converted by a
+    background process pool (core.batch.BatchQueue) while the Tk loop stays free.
+    Each add snapshots the Icon Maker's sizes, fit mode and pad colour into the
+    jobs, so editing there afterwards does not change what is already queued.
+    Crop uses the centred default square per image.
+    The list is updated from a POLL_MS timer that only touches changed rows.
+    """
+    POLL_MS = 100
+
+    def __init__(self, master, app):
+        super().__init__(master)
+        self.app = app
+        self.queue = BatchQueue(max_workers=max(1, (os.cpu_count() or 2) - 1))
+        self._poll_id = None
+
+        cmd_card = Card(self)
+        cmd_card.pack(fill=tk.X, padx=8, pady=(0, 8))
+        cmd = CommandBar(cmd_card)
+        cmd.pack(fill=tk.X)
+        ttk.Button(cmd, text="Add files…", command=self._add_files).pack(side=tk.LEFT, padx=4)
+        ttk.Button(cmd, text="Add folder…", command=self._add_folder).pack(side=tk.LEFT, padx=4)
+        ttk.Button(cmd, text="Cancel", command=self._cancel_selected).pack(side=tk.LEFT, padx=4)
+        ttk.Button(cmd, text="Retry", command=self._retry_selected).pack(side=tk.LEFT, padx=4)
+        ttk.Button(cmd, text="Cancel all", command=self._cancel_all).pack(side=tk.LEFT, padx=4)
+        ttk.Button(cmd, text="Clear finished", command=self._clear_finished).pack(side=tk.LEFT, padx=4)
+
+        card = Card(self)
+        card.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
+
+        out_row = ttk.Frame(card)
+        out_row.pack(fill=tk.X, pady=(0, 6))
+        ttk.Button(out_row, text="Output folder…", command=self._choose_output).pack(side=tk.LEFT)
+        self.output_root = tk.StringVar(value="")
+        ttk.Label(out_row, textvariable=self.output_root, width=48).pack(side=tk.LEFT, padx=6)
+        ttk.Label(out_row, text="(empty: next to each source)").pack(side=tk.LEFT)
+
+        tree_frame = ttk.Frame(card)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=("file", "status", "time"), show="headings",
+                                 selectmode="extended")
+        self.tree.heading("file", text="File")
+        self.tree.heading("status", text="Status")
+        self.tree.heading("time", text="Time")
+        self.tree.column("file", width=420, stretch=True)
+        self.tree.column("status", width=220, stretch=True)
+        self.tree.column("time", width=70, stretch=False, anchor="e")
+        scroll = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.status_var = tk.StringVar(value="Drop files or folders here, or use Add.")
+        ttk.Label(card, textvariable=self.status_var).pack(anchor="w", pady=(6, 0))
+
+    # ---- Queueing
+    def enqueue(self, paths):
+        """Queue files and folders (folders recursively) with the Icon Maker's current settings."""
+        icon_page = self.app.pages["icon"]
+        sizes = [n for n in icon_page._gather_sizes() if n <= MAX_ICO_SIZE]
+        if not sizes:
+            self.app.toast("Select at least one size on the Icon Maker page.")
+            return
+        fit_mode = icon_page.fit_mode.get()
+        options = {"sizes": sizes, "fit_mode": fit_mode,
+                   "pad_rgba": self.app.model.pad_color if fit_mode == "pad" else (0, 0, 0, 0)}
+        out_root = self.output_root.get().strip()
+        jobs = []
+        try:
+            for p in paths:
+                # Without an output folder each .ico lands beside its source (folders mirror in place)
+                root = out_root or (p if os.path.isdir(p) else os.path.dirname(p) or ".")
+                jobs.extend(collect_jobs([p], root))
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Batch", f"Could not queue:\n{e}")
+            return
+        for job in jobs:
+            job.options = dict(options)
+        ids = self.queue.add(jobs)
+        for i in ids:
+            self.tree.insert("", tk.END, iid=str(i), values=(self.queue.get(i).job.input_path, "Queued", ""))
+        if len(ids) < len(jobs):
+            self.app.toast(f"{len(jobs) - len(ids)} already queued; skipped.")
+        self._schedule_poll()
+
+    def _add_files(self):
+        paths = filedialog.askopenfilenames(
+            title="Add images",
+            initialdir=self.app.get_last_dir("open_image"),
+            filetypes=[("Images", "*.png;*.jpg;*.jpeg;*.webp;*.gif;*.bmp;*.tif;*.tiff;*.ico;*.heic;*.heif"),
+                       ("All files", "*.*")])
+        if paths:
+            self.enqueue(list(paths))
+
+    def _add_folder(self):
+        path = filedialog.askdirectory(title="Add folder", initialdir=self.app.get_last_dir("open_image"))
+        if path:
+            self.enqueue([path])
+
+    def _choose_output(self):
+        path = filedialog.askdirectory(title="Output folder")
+        if path:
+            self.output_root.set(path)
+
+    # ---- Item actions
+    def _selected_ids(self):
+        return [int(i) for i in self.tree.selection()]
+
+    def _cancel_selected(self):
+        for i in self._selected_ids():
+            self.queue.cancel(i)
+        self._schedule_poll()
+
+    def _retry_selected(self):
+        ids = self._selected_ids()
+        if not ids:  # nothing selected: retry every failed item
+            ids = [int(i) for i in self.tree.get_children() if self.tree.set(i, "status").startswith("Failed")]
+        for i in ids:
+            self.queue.retry(i)
+        self._schedule_poll()
+
+    def _cancel_all(self):
+        self.queue.cancel_all()
+        self._schedule_poll()
+
+    def _clear_finished(self):
+        for i in self.queue.remove_finished():
+            if self.tree.exists(str(i)):
+                self.tree.delete(str(i))
+        self._update_status()
+
+    # ---- Polling (Tk thread only)
+    def _schedule_poll(self):
+        if self._poll_id is None:
+            self._poll_id = self.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        busy = self.queue.busy()  # read first: once idle, every final change is already in updates()
+        for it in self.queue.updates():
+            iid = str(it.id)
+            if not self.tree.exists(iid):
+                continue
+            res = it.result
+            if it.state == "failed":
+                status = f"Failed: {res.error}" if res is not None else "Failed"
+            elif it.state == "done" and res is not None and res.cached:
+                status = "Done (cached)"
+            else:
+                status = it.state.capitalize()
+            self.tree.item(iid, values=(it.job.input_path, status,
+                                        f"{res.seconds:.2f}s" if res is not None else ""))
+        self._update_status()
+        if busy:
+            self._schedule_poll()
+
+    def _update_status(self):
+        c = self.queue.counts()
+        total = sum(c.values())
+        if not total:
+            self.status_var.set("Drop files or folders here, or use Add.")
+            return
+        parts = [f"{c['done']}/{total} done"]
+        if c["failed"]:
+            parts.append(f"{c['failed']} failed")
+        if c["cancelled"]:
+            parts.append(f"{c['cancelled']} cancelled")
+        if c["running"] or c["queued"]:
+            parts.append(f"{c['running']} running, {c['queued']} queued")
+        parts.append(f"{self.queue.rate():.1f} items/s")
+        self.status_var.set(" · ".join(parts))
+
+    def destroy(self):
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.queue.shutdown()
+        super().destroy()
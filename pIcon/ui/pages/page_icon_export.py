@@ -2,12 +2,14 @@ import os
 import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
-from PIL import Image
 
-from ...core.images import load_image_as_rgba, make_square, create_multi_resolution_ico
+from ...core.geometry import MipPyramid, plan_square
+from ...core.images import MAX_ICO_SIZE
+from ...core.progress import CancelToken, ExportCancelled
+from ...core.session import IconSession
 from ...core.sizes import DEFAULT_SIZES, parse_custom_sizes
 from ..components import Card, SegmentedControl, Chip, Banner, CommandBar
-from ..preview import PreviewCanvas
+from ..preview import PreviewCanvas, PreviewJob, SizeStrip, StripJob
 from .. import tokens  # add near the top of the file if not present
 
 class IconExportPage(ttk.Frame):
@@ -19,6 +21,17 @@ class IconExportPage(ttk.Frame):
         super().__init__(master)
         self.app = app
         self.model = app.model  # shared state
+        self._pyramid = None    # MipPyramid of model.loaded_img, built by the preview worker
+        self._pyramid_lock = threading.Lock()
+        self._proxy = None      # (image, MipPyramid.proxy(image)) for placeholders
+        # Export: one worker thread at a time; a new request supersedes the running one
+        self._export_lock = threading.Lock()
+        self._export_thread = None
+        self._export_current = None   # (request key, CancelToken) of the running export
+        self._export_next = None      # (request key, session, out, sizes, fit) waiting to start
+        self._export_state = None     # latest (stage, done, total), written by the worker
+        self._export_done = []        # (kind, text, out) outcomes for the Tk thread
+        self._export_poll_id = None
 
         # Layout: left preview (hero), right controls
         self.columnconfigure(0, weight=3)
@@ -38,6 +51,8 @@ class IconExportPage(ttk.Frame):
 
         ttk.Button(cmd, text="Open", command=app.action_open).pack(side=tk.LEFT, padx=4)
         ttk.Button(cmd, text="Export ICO", command=self._export).pack(side=tk.LEFT, padx=4)
+        self.cancel_btn = ttk.Button(cmd, text="Cancel export", command=self._cancel_export, state="disabled")
+        self.cancel_btn.pack(side=tk.LEFT, padx=4)
 
         # --- Banner area
         self.banner_area = ttk.Frame(self)
@@ -52,9 +67,13 @@ class IconExportPage(ttk.Frame):
         left_card.columnconfigure(0, weight=1)
         left_card.rowconfigure(0, weight=1)
 
-        self.preview = PreviewCanvas(left_card, self._get_square_for_preview, self.app.is_light_ui)
+        self.preview = PreviewCanvas(left_card, self._preview_renderer, self.app.is_light_ui)
         self.preview.grid(row=0, column=0, sticky="nsew")
 
+        # Every selected size as exported, rendered in the background from the session
+        self.size_strip = SizeStrip(left_card, self._strip_job, self.app.is_light_ui)
+        self.size_strip.grid(row=1, column=0, sticky="ew", pady=(8, 0))
+
         # Hook crop interactions to app handlers
         self.preview.bind("<MouseWheel>", self._on_wheel)
         self.preview.bind("<Button-4>", lambda e: self._on_wheel(_mkdelta(e, +120)))
@@ -98,6 +117,8 @@ class IconExportPage(ttk.Frame):
         grid = ttk.Frame(sizes_frame)
         grid.pack(fill=tk.X, pady=(6,0))
         self.size_vars = {n: tk.IntVar(value=1) for n in DEFAULT_SIZES}
+        for v in self.size_vars.values():
+            v.trace_add("write", lambda *_: self.size_strip.refresh())
         cols = 4
         for i, n in enumerate(DEFAULT_SIZES):
             chip = Chip(grid, f"{n}", self.size_vars[n])
@@ -107,6 +128,7 @@ class IconExportPage(ttk.Frame):
         custom_row.pack(fill=tk.X, pady=(6,0))
         ttk.Label(custom_row, text="Custom (comma/space)").pack(side=tk.LEFT)
         self.custom_sizes_str = tk.StringVar()
+        self.custom_sizes_str.trace_add("write", lambda *_: self.size_strip.refresh())
         ttk.Entry(custom_row, textvariable=self.custom_sizes_str, width=26).pack(side=tk.LEFT, padx=(6, 0))
 
         # Output paths
@@ -115,23 +137,86 @@ class IconExportPage(ttk.Frame):
         ttk.Button(out_frame, text="Save as…", command=self._choose_output).pack(side=tk.LEFT)
         ttk.Label(out_frame, textvariable=self.model.output_path, width=32).pack(side=tk.LEFT, padx=6)
 
-        # Status
+        # Status + export progress
         self.status_var = tk.StringVar(value="")
         ttk.Label(right_card, textvariable=self.status_var).pack(anchor="w", pady=(8,0))
+        self.progress = ttk.Progressbar(right_card, mode="determinate", maximum=1.0)
+        self.progress.pack(fill=tk.X, pady=(4, 0))
+        # A failed preview/strip render is shown here; the widgets keep rendering
+        self.preview.on_error_cb = self._on_render_error
+        self.size_strip.on_error_cb = self._on_render_error
+
+    def _on_render_error(self, err: BaseException):
+        self.status_var.set(f"Preview failed: {err}")
 
     # ---- App state integration
-    def _get_square_for_preview(self):
+    def _preview_renderer(self):
+        """
+        PreviewJob for the PreviewCanvas, with the fit state captured now:
+        render runs on the preview worker and draws from the mip pyramid,
+        building it on first use; quick draws from a coarse proxy made when the
+        image was opened. Crop values stay in full-resolution units; in crop
+        mode the job is pannable around the centre the plan actually uses.
+        """
         img = self.model.loaded_img
+        # Whatever invalidated the preview may have changed the fit the strip shows
+        self.size_strip.refresh()
         if img is None:
             return None
-        if self.fit_mode.get() == "crop":
-            return make_square(img, mode="crop",
-                               crop_center=(self.model.crop_cx, self.model.crop_cy),
-                               crop_zoom=self.model.crop_zoom)
-        elif self.fit_mode.get() == "pad":
-            return make_square(img, mode="pad", pad_rgba=self.model.pad_color)
-        else:
-            return make_square(img, mode="stretch")
+        kw = self._fit_kwargs()
+        proxy = self._proxy[1] if self._proxy is not None and self._proxy[0] is img else None
+
+        def render(side, margin):
+            return self._get_pyramid(img).render(side, margin=margin, **kw)
+
+        def quick(side, margin):
+            small = min(side, max(proxy.size))
+            return proxy.render(small, margin=round(margin * small / side), **kw)
+
+        center, span = None, 0.0
+        if kw["mode"] == "crop":
+            x0, y0, x1, y1 = plan_square(img.size, **kw).src_box
+            center, span = ((x0 + x1) / 2, (y0 + y1) / 2), float(x1 - x0)
+        key = (self.model.session.serial, kw["mode"], kw.get("crop_zoom"), kw.get("pad_rgba"))
+        return PreviewJob(render, quick if proxy is not None else None, key, center, span)
+
+    def _strip_job(self):
+        """
+        StripJob for the size strip: the selected sizes and the session frames
+        for the current fit. The key is the session serial plus the fit plan
+        itself (computed here without the session lock), so settings that land
+        on the same pixels share cached frames; the serial, unlike id(), is
+        never reused by a later image.
+        """
+        session = self.model.session
+        sizes = tuple(n for n in self._gather_sizes() if n <= MAX_ICO_SIZE)
+        if session is None or not sizes:
+            return None
+        plan = plan_square(session.size, **self._fit_kwargs())
+        fit = self._session_kwargs()
+        return StripJob((session.serial, plan), sizes, lambda n: session.frames([n], **fit)[n])
+
+    def _get_pyramid(self, img):
+        # Called from the preview worker; the lock keeps one build per image
+        with self._pyramid_lock:
+            if self._pyramid is None or self._pyramid.levels[0] is not img:
+                self._pyramid = MipPyramid(img)
+            return self._pyramid
+
+    def _fit_kwargs(self):
+        mode = self.fit_mode.get()
+        if mode == "crop":
+            return {"mode": "crop", "crop_center": (self.model.crop_cx, self.model.crop_cy),
+                    "crop_zoom": self.model.crop_zoom}
+        if mode == "pad":
+            return {"mode": "pad", "pad_rgba": self.model.pad_color}
+        return {"mode": "stretch"}
+
+    def _session_kwargs(self):
+        """_fit_kwargs() spelled for IconSession (fit_mode instead of mode)."""
+        kw = self._fit_kwargs()
+        kw["fit_mode"] = kw.pop("mode")
+        return kw
 
     # ---- Event handlers
     def _on_fit_changed(self):
@@ -215,37 +300,95 @@ class IconExportPage(ttk.Frame):
             self.app.toast("Choose where to save the .ico file.")
             return
 
-        # Pre-warn about upscaling
+        session = self.model.session
+        fit = self._session_kwargs()
+
+        # Pre-warn about upscaling (plan only: no pixels, and no session lock a render may hold)
         try:
-            sq = self._get_square_for_preview()
-            if sq and sq.size[0] < max(sizes):
+            if plan_square(session.size, **self._fit_kwargs()).side < max(sizes):
                 self.app.toast("Warning: source smaller than largest size (will upscale).", duration_ms=4000)
         except Exception:
             pass
 
-        def worker():
+        key = (session.serial, os.path.normcase(os.path.abspath(out)), tuple(sizes), tuple(sorted(fit.items())))
+        with self._export_lock:
+            current = self._export_current
+            if current is not None and current[0] == key and not current[1].cancelled:
+                self.app.toast("This export is already running.")
+                return
+            if current is not None:
+                current[1].cancel()  # superseded: stops at its next step, leaves no file
+            self._export_next = (key, session, out, sizes, fit)
+            if self._export_thread is None:
+                self._export_thread = threading.Thread(target=self._export_loop, name="pIcon-export", daemon=True)
+                self._export_thread.start()
+        self.cancel_btn.state(["!disabled"])
+        if self._export_poll_id is None:
+            self._export_poll_id = self.after(50, self._poll_export)
+
+    def _export_loop(self):
+        """Export worker: runs the newest request, then any request that superseded it."""
+        while True:
+            with self._export_lock:
+                if self._export_next is None:
+                    self._export_thread = None
+                    return
+                (key, session, out, sizes, fit), self._export_next = self._export_next, None
+                token = CancelToken()
+                self._export_current = (key, token)
             try:
-                create_multi_resolution_ico(
-                    input_png_path=self.model.input_path.get(),
-                    output_ico_path=out,
-                    sizes=sizes,
-                    fit_mode=self.fit_mode.get(),
-                    # pad_rgba=self.model.pad_color if self.fit_mode.get() == "pad" else (0,0,0,0),
-                    crop_center=(self.model.crop_cx, self.model.crop_cy) if self.fit_mode.get() == "crop" else None,
-                    crop_zoom=self.model.crop_zoom if self.fit_mode.get() == "crop" else 1.0,
-                )
+                exporter = self.app.exporter
+                if exporter is not None:
+                    # Warm child process; the decoded image is shared with it, not copied or re-decoded
+                    exporter.export(session.image, out, sizes, on_progress=self._on_export_progress,
+                                    cancel=token, **fit)
+                else:
+                    # The session already holds the decoded source; unchanged frames/entries are reused
+                    session.export(out, sizes, on_progress=self._on_export_progress, cancel=token, **fit)
+                outcome = ("info", f"Saved: {os.path.basename(out)}", out)
+            except ExportCancelled:
+                outcome = None
             except Exception as e:
-                self.after(0, lambda: self._show_banner("error", f"Export failed: {e}"))
-                return
-
-            # define a local callback that uses the closed-over 'out' and 'self'
-            def _on_success():
-                banner = self._show_banner("info", f"Saved: {os.path.basename(out)}")
+                outcome = ("error", f"Export failed: {e}", None)
+            with self._export_lock:
+                self._export_current = None
+                self._export_state = None
+                if outcome is None and self._export_next is None:  # a superseded export ends silently
+                    outcome = ("info", "Export cancelled; nothing was written.", None)
+                if outcome is not None:
+                    self._export_done.append(outcome)
+
+    def _on_export_progress(self, stage, done, total):
+        # Worker thread: only publish; _poll_export updates the widgets
+        self._export_state = (stage, done, total)
+
+    def _cancel_export(self):
+        with self._export_lock:
+            self._export_next = None
+            if self._export_current is not None:
+                self._export_current[1].cancel()
+
+    def _poll_export(self):
+        """Tk thread: mirror the worker's progress and report finished exports."""
+        self._export_poll_id = None
+        with self._export_lock:
+            done, self._export_done = self._export_done, []
+            running = self._export_thread is not None
+            state = self._export_state
+        for kind, text, out in done:
+            banner = self._show_banner(kind, text)
+            if out is not None:
                 banner.add_action("Open Folder", lambda p=out: self._reveal_in_explorer(p))
-
-            self.after(0, _on_success)
-
-        threading.Thread(target=worker, daemon=True).start()
+        if state is not None:
+            stage, n, total = state
+            self.progress.configure(value=n / total)
+            self.status_var.set(f"Exporting: {stage} ({n}/{total})")
+        if running:
+            self._export_poll_id = self.after(50, self._poll_export)
+        else:
+            self.progress.configure(value=0)
+            self.status_var.set("")
+            self.cancel_btn.state(["disabled"])
 
     # ---- Crop interactions (delegated to model)
     def _on_wheel(self, event):
@@ -316,16 +459,13 @@ class IconExportPage(ttk.Frame):
     # ---- Open helper used by App
     def open_path(self, path: str):
         try:
-            # Probe animation
-            is_anim = False
-            try:
-                _probe = Image.open(path)
-                is_anim = bool(getattr(_probe, "is_animated", False))
-                _probe.close()
-            except Exception:
-                pass
+            # Probes headers first (rejects unsupported files), then decodes once
+            session = IconSession(path)
+            is_anim = session.probe.is_animated
 
-            self.model.loaded_img = load_image_as_rgba(path)
+            self.model.session = session
+            self.model.loaded_img = session.image
+            self._proxy = (self.model.loaded_img, MipPyramid.proxy(self.model.loaded_img))
             w, h = self.model.loaded_img.size
             self.model.crop_zoom = 1.0
             self.model.crop_cx = w / 2
@@ -45,6 +45,12 @@ class SettingsPage(ttk.Frame):
         # ttk.Label(card, text="Optional features").pack(anchor="w", pady=(16,6))
         # ttk.Label(card, text="- Drag & drop: tkinterdnd2\n- HEIC/HEIF: pi-heif").pack(anchor="w")
 
+        ttk.Label(card, text="Performance").pack(anchor="w", pady=(16,6))
+        self.export_process_var = tk.BooleanVar(value=bool(self.app.settings.get("export_in_process")))
+        ttk.Checkbutton(card, text="Export in a separate process (smoother UI during large exports)",
+                        variable=self.export_process_var,
+                        command=lambda: self.app.set_export_in_process(self.export_process_var.get())).pack(anchor="w")
+
         ttk.Label(card, text="Keyboard shortcuts").pack(anchor="w", pady=(16,6))
         shortcuts = (
             "Ctrl+O Open   •  Ctrl+S Export  •  Ctrl+Shift+S Save As\n"
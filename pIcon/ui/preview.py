@@ -1,16 +1,181 @@
+import threading
+import time
 import tkinter as tk
+from collections import OrderedDict, deque
 from PIL import Image, ImageTk, ImageDraw
-from typing import Optional, Tuple
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
 
 from . import tokens
 
+class RenderScheduler:
+    """
+    Coalesces invalidations into at most one render per frame interval.
+    - request(): mark the view dirty; a render is scheduled with widget.after
+      unless one is already pending, so a burst of events costs one render
+    - request(delay_ms=N): debounce; the pending callback is cancelled and
+      rescheduled N ms from now (used while the widget is being resized)
+    - flush(): render now if dirty; cancel(): drop the pending callback
+    Counters (stats()) show requested vs rendered frames.
+    """
+    def __init__(self, widget: tk.Misc, render: Callable[[], None], interval_ms: int = 16):
+        self._widget = widget
+        self._render = render
+        self.interval_ms = interval_ms
+        self._after_id = None
+        self._dirty = False
+        self._last = 0.0
+        self.requested = 0
+        self.rendered = 0
+        self.cancelled = 0
+
+    def request(self, delay_ms: Optional[int] = None) -> None:
+        self.requested += 1
+        self._dirty = True
+        if delay_ms is not None:
+            self.cancel()
+        elif self._after_id is not None:
+            return
+        else:
+            since = (time.perf_counter() - self._last) * 1000
+            delay_ms = max(0, int(self.interval_ms - since))
+        self._after_id = self._widget.after(delay_ms, self._fire)
+
+    def flush(self) -> None:
+        self.cancel()
+        self._fire()
+
+    def cancel(self) -> None:
+        if self._after_id is not None:
+            try:
+                self._widget.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+            self._after_id = None
+            self.cancelled += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"requested": self.requested, "rendered": self.rendered,
+                "coalesced": self.requested - self.rendered, "cancelled": self.cancelled}
+
+    def _fire(self) -> None:
+        self._after_id = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._last = time.perf_counter()
+        self.rendered += 1
+        self._render()
+
+class PreviewWorker:
+    """
+    Runs preview render jobs on one daemon thread, newest first.
+    - submit(gen, fn): queue fn (a no-arg Pillow job); a job still waiting is
+      replaced and counted as dropped, so at most one is ever queued
+    - take_result(): (gen, image, error) of the last finished job, or None;
+      called from the Tk thread, which alone touches widgets
+    A job already running is not interrupted; its result carries its generation
+    and the caller drops it if the view has moved on.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._job = None       # (gen, fn) waiting to run
+        self._running = False
+        self._result = None    # (gen, image, error)
+        self._thread = None
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+
+    def submit(self, gen: int, fn: Callable[[], Image.Image]) -> None:
+        with self._cond:
+            if self._job is not None:
+                self.dropped += 1
+            self._job = (gen, fn)
+            self.submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="pIcon-preview", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def take_result(self):
+        with self._cond:
+            res, self._result = self._result, None
+            return res
+
+    def busy(self) -> bool:
+        with self._cond:
+            return self._job is not None or self._running or self._result is not None
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._job is None:
+                    self._cond.wait()
+                (gen, fn), self._job = self._job, None
+                self._running = True
+            img = err = None
+            try:
+                img = fn()
+            except Exception as e:
+                err = e
+            with self._cond:
+                self._running = False
+                self._result = (gen, img, err)
+                self.completed += 1
+
+def _report(widget, err: BaseException) -> None:
+    """
+    Surface a render that failed on a worker without leaving the poll loop:
+    widget.on_error_cb(err) if the host set one, else Tk's callback-error report.
+    """
+    widget.errors += 1
+    if widget.on_error_cb is not None:
+        widget.on_error_cb(err)
+    else:
+        widget.report_callback_exception(type(err), err, err.__traceback__)
+
+class PreviewJob(NamedTuple):
+    """
+    What the host wants on screen, captured on the Tk thread by get_renderer().
+    - render(side, margin): (side + 2 * margin)^2 RGBA, run on the worker; it
+      may only use state captured here
+    - quick(side, margin): cheap low-res stand-in of the same framing (Tk thread)
+    - key: the view state other than the pan position (image, fit, zoom, ...)
+    - center/span: pan position and source px across the square, when the view
+      can be panned (crop); buffers are then rendered with a margin and moved
+      by offset until the pointer pauses or the margin runs out
+    """
+    render: Callable[[int, int], Image.Image]
+    quick: Optional[Callable[[int, int], Image.Image]] = None
+    key: tuple = ()
+    center: Optional[Tuple[float, float]] = None
+    span: float = 0.0
+
 class PreviewCanvas(tk.Canvas):
     """
     Square preview canvas with checkerboard and interactive crop (pan/zoom).
+    get_renderer() is called on the Tk thread and returns None (nothing loaded)
+    or a PreviewJob. Rendering runs on a background PreviewWorker; only the
+    PhotoImage handoff runs on Tk. A placeholder from job.quick is drawn when
+    the sharp frame takes longer than PLACEHOLDER_AFTER_MS.
+    Frames carry generation numbers: a finished frame is shown only if it is
+    newer than what is on screen (so a drag keeps moving even when renders
+    take longer than the event rate), otherwise it is dropped as stale.
+    Retained: the checkerboard, preview and mask items are created once and one
+    PhotoImage per layer is updated in place with paste(); a pannable view is
+    moved by offset inside its margin and re-rendered once the drag pauses.
     """
-    def __init__(self, master, get_image_callable, is_light_callable):
+    # Poll interval for worker results, and the wait before a placeholder is drawn
+    POLL_MS = 8
+    PLACEHOLDER_AFTER_MS = 24
+    # Extra source rendered around a pannable square (fraction of side), and the
+    # pause after which a panned buffer is re-centred at full quality
+    PAN_MARGIN = 0.25
+    SETTLE_MS = 120
+
+    def __init__(self, master, get_renderer_callable, is_light_callable):
         super().__init__(master, highlightthickness=0, background="#000000")
-        self._get_image = get_image_callable
+        self._get_renderer = get_renderer_callable
         self._is_light = is_light_callable
         self._preview_side = 256
         self._preview_w = 256
@@ -19,14 +184,36 @@ class PreviewCanvas(tk.Canvas):
         self._checker_imgtk = None
         self._checker_imgtk_size = None
         self._checker_is_light = None
+        self._bg = None
 
         self.preview_imgtk = None
+        self._checker_item = None
+        self._preview_item = None
+        self._mask_items = []
+        self._buf = None           # (key, center, span, margin, side, sharp) of the shown buffer
+        self._settle_id = None
+        self._resample_next = False
+
+        self.scheduler = RenderScheduler(self, self._render)
+        self.worker = PreviewWorker()
+        self._gen = 0              # generation of the newest requested frame
+        self._shown_gen = 0        # generation of the frame (or placeholder) on screen
+        self._pending = None       # (gen, job, side, margin, t_submit) while waiting for the worker
+        self._poll_id = None
+        self.stale_dropped = 0     # finished frames discarded because the view moved on
+        self.placeholders = 0
+        self.panned = 0            # frames served by moving the buffer
+        self.photo_allocs = 0      # PhotoImage objects created
+        self.items_created = 0     # canvas items created
+        self._frame_ms = deque(maxlen=512)  # Tk-thread time per shown/moved frame
 
         # Crop interaction state (owned by host; mirrored here for keys)
         self.on_wheel_cb = None
         self.on_drag_start_cb = None
         self.on_drag_move_cb = None
         self.on_drag_end_cb = None
+        self.on_error_cb = None    # on_error_cb(exc) for a failed render; see _report
+        self.errors = 0            # failed renders
 
         self.bind("<Configure>", self._on_resize)
 
@@ -59,36 +246,342 @@ class PreviewCanvas(tk.Canvas):
                     draw.rectangle([xx0, yy0, xx1, yy1], fill=c2)
 
             img = img.crop((0, 0, side, side))
-            self._checker_imgtk = ImageTk.PhotoImage(img)
+            if self._checker_imgtk is not None and self._checker_imgtk_size == side:
+                self._checker_imgtk.paste(img)
+            else:
+                self._checker_imgtk = ImageTk.PhotoImage(img)
+                self.photo_allocs += 1
             self._checker_imgtk_size = side
             self._checker_is_light = self._is_light()
 
-        try:
-            self.configure(background=c1)
-        except Exception:
-            pass
+        if c1 != self._bg:
+            try:
+                self.configure(background=c1)
+            except Exception:
+                pass
+            self._bg = c1
 
         x0 = (w - side) // 2
         y0 = (h - side) // 2
 
-        self.delete("checker")
-        self.create_image(x0 + side // 2, y0 + side // 2, image=self._checker_imgtk, tags="checker")
+        if self._checker_item is None:
+            self._checker_item = self.create_image(0, 0, image=self._checker_imgtk, tags="checker")
+            # Background-coloured bands hide the margin of an oversized (pannable) buffer
+            self._mask_items = [self.create_rectangle(0, 0, 0, 0, width=0, tags="mask") for _ in range(4)]
+            self.items_created += 5
+        self.itemconfigure(self._checker_item, image=self._checker_imgtk)
+        self.coords(self._checker_item, x0 + side // 2, y0 + side // 2)
+        big = 1 << 15
+        for item, box in zip(self._mask_items, ((-big, -big, big, y0), (-big, y0 + side, big, big),
+                                                (-big, y0, x0, y0 + side), (x0 + side, y0, big, y0 + side))):
+            self.coords(item, *box)
+            self.itemconfigure(item, fill=c1)
 
     def refresh(self):
+        """Invalidate the preview; renders are coalesced to at most one per frame."""
+        self.scheduler.request()
+
+    def render_stats(self) -> Dict[str, float]:
+        st = self.scheduler.stats()
+        st.update(submitted=self.worker.submitted, completed=self.worker.completed,
+                  dropped=self.worker.dropped, stale=self.stale_dropped, placeholders=self.placeholders,
+                  panned=self.panned, photo_allocs=self.photo_allocs, items_created=self.items_created)
+        samples = sorted(self._frame_ms)
+        if samples:
+            st["tk_frame_ms_p50"] = samples[len(samples) // 2]
+            st["tk_frame_ms_p95"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return st
+
+    def destroy(self):
+        self.scheduler.cancel()
+        for attr in ("_poll_id", "_settle_id"):
+            if getattr(self, attr) is not None:
+                self.after_cancel(getattr(self, attr))
+                setattr(self, attr, None)
+        super().destroy()
+
+    def _render(self):
         self._draw_checkerboard()
-        img = self._get_image()
-        if img is None:
-            self.delete("preview")
-            return
+        self._gen += 1
         side = int(self._preview_side)
-        disp = img.resize((side, side))
-        self.preview_imgtk = ImageTk.PhotoImage(disp)
-        self.delete("preview")
-        self.create_image(self._preview_w // 2, self._preview_h // 2, image=self.preview_imgtk, tags="preview")
+        job = self._get_renderer()
+        if job is None:
+            self._pending = None
+            self._buf = None
+            self._shown_gen = self._gen
+            if self._preview_item is not None:
+                self.itemconfigure(self._preview_item, state="hidden")
+            return
+        if not isinstance(job, PreviewJob):
+            job = PreviewJob(*job)
+        resample, self._resample_next = self._resample_next, False
+        if not resample and self._pan_to(job, side):
+            return
+        margin = max(32, int(side * self.PAN_MARGIN)) if job.center is not None else 0
+        render = job.render
+        self.worker.submit(self._gen, lambda: render(side, margin))
+        self._pending = (self._gen, job, side, margin, time.perf_counter())
+        if self._poll_id is None:
+            self._poll_id = self.after(self.POLL_MS, self._poll)
+
+    def _pan_to(self, job: PreviewJob, side: int) -> bool:
+        """Move the shown buffer to job.center if it still covers the view; True if done."""
+        buf = self._buf
+        if job.center is None or buf is None or not buf[5] or buf[0] != job.key or buf[4] != side:
+            return False
+        _, center, span, margin, _, _ = buf
+        scale = span / side  # source px per screen px
+        ox = (center[0] - job.center[0]) / scale
+        oy = (center[1] - job.center[1]) / scale
+        if abs(ox) > margin or abs(oy) > margin:
+            return False
+        t0 = time.perf_counter()
+        self._pending = None
+        self._shown_gen = self._gen
+        self.coords(self._preview_item, self._preview_w // 2 + round(ox), self._preview_h // 2 + round(oy))
+        self._frame_ms.append((time.perf_counter() - t0) * 1000)
+        self.panned += 1
+        if self._settle_id is not None:
+            self.after_cancel(self._settle_id)
+        self._settle_id = self.after(self.SETTLE_MS, self._settle)
+        return True
+
+    def _settle(self):
+        self._settle_id = None
+        self._resample_next = True
+        self.scheduler.request()
+
+    def _poll(self):
+        self._poll_id = None
+        res = self.worker.take_result()
+        if res is not None:
+            gen, img, err = res
+            if gen <= self._shown_gen:
+                self.stale_dropped += 1
+            else:
+                self._shown_gen = gen
+                meta = None
+                if self._pending is not None and gen == self._pending[0]:
+                    meta, self._pending = self._pending, None
+                if err is not None:
+                    _report(self, err)  # the view stays as it was; the next change renders again
+                elif meta is not None:
+                    _, job, side, margin, _ = meta
+                    self._show(img, side + 2 * margin, (job.key, job.center, job.span, margin, side, True))
+                else:
+                    # an older frame finishing first: show it, but never pan from it
+                    self._show(img, img.width, None)
+        pending = self._pending
+        if pending is not None and pending[1].quick is not None:
+            gen, job, side, margin, t0 = pending
+            if (time.perf_counter() - t0) * 1000 >= self.PLACEHOLDER_AFTER_MS:
+                self._pending = (gen, job._replace(quick=None), side, margin, t0)  # one placeholder per frame
+                self._shown_gen = max(self._shown_gen, gen - 1)  # only this frame's sharp version beats it
+                self.placeholders += 1
+                self._show(job.quick(side, margin), side + 2 * margin,
+                           (job.key, job.center, job.span, margin, side, False), Image.Resampling.BILINEAR)
+        if self._pending is not None or self.worker.busy():
+            self._poll_id = self.after(self.POLL_MS, self._poll)
+
+    def _show(self, img, full, buf, resample=Image.Resampling.BICUBIC):
+        """Put img (resized to full x full if needed) on screen, reusing the PhotoImage when it fits."""
+        t0 = time.perf_counter()
+        full = int(full)
+        disp = img if img.size == (full, full) else img.resize((full, full), resample)
+        photo = self.preview_imgtk
+        if photo is not None and (photo.width(), photo.height()) == disp.size:
+            photo.paste(disp)
+        else:
+            photo = self.preview_imgtk = ImageTk.PhotoImage(disp)
+            self.photo_allocs += 1
+        x, y = self._preview_w // 2, self._preview_h // 2
+        if self._preview_item is None:
+            self._preview_item = self.create_image(x, y, image=photo, tags="preview")
+            self.items_created += 1
+        else:
+            self.itemconfigure(self._preview_item, image=photo, state="normal")
+            self.coords(self._preview_item, x, y)
+        self.tag_raise("mask")
+        self._buf = buf
+        self._frame_ms.append((time.perf_counter() - t0) * 1000)
 
     def _on_resize(self, event):
         self._preview_w = max(1, int(event.width))
         self._preview_h = max(1, int(event.height))
         side = max(64, min(self._preview_w, self._preview_h))
         self._preview_side = side
-        self.after(50, self.refresh)
+        # Wait for the size to settle; each <Configure> supersedes the last
+        self.scheduler.request(delay_ms=50)
+
+class StripJob(NamedTuple):
+    """
+    What the size strip should show, captured on the Tk thread.
+    - key: identifies the fit (same key + size = same pixels)
+    - sizes: icon sizes to show, any order
+    - render(n): the n x n RGBA frame as exported; runs on the strip's worker
+    """
+    key: Hashable
+    sizes: Tuple[int, ...]
+    render: Callable[[int], Image.Image]
+
+class SizeStrip(tk.Canvas):
+    """
+    Row of tiles showing every selected icon size as it will be exported.
+    get_job() is called on the Tk thread and returns None or a StripJob.
+    - frames are cached per (key, size): toggling a size chip renders only the
+      added size, and an unchanged fit re-renders nothing
+    - missing sizes render on a background PreviewWorker one at a time,
+      smallest first, each shown as soon as it is done
+    - a fit change (crop drag, zoom) waits DEBOUNCE_MS so a drag renders once
+    Sizes up to TILE are drawn 1:1; larger ones are shrunk to fit their tile.
+    A tile keeps its previous pixels until the new fit's frame replaces them.
+    """
+    TILE = 64
+    LABEL_H = 18
+    GAP = 10
+    POLL_MS = 16
+    DEBOUNCE_MS = 150
+    # Fits whose frames are kept, most recent last
+    CACHED_KEYS = 4
+
+    def __init__(self, master, get_job_callable, is_light_callable):
+        super().__init__(master, highlightthickness=0, height=self.TILE + self.LABEL_H + 8, background="#000000")
+        self._get_job = get_job_callable
+        self._is_light = is_light_callable
+        self._cache: "OrderedDict[Hashable, Dict[int, Image.Image]]" = OrderedDict()
+        self._tiles: Dict[int, list] = {}   # size -> [checker item, image item, label item, PhotoImage]
+        self._checker_imgtk = None
+        self._checker_is_light = None
+        self._key = None
+        self._queue: list = []              # sizes still to render for self._key, smallest first
+        self._gen = 0
+        self._running = None                # (gen, key, size) submitted to the worker
+        self._poll_id = None
+        self.scheduler = RenderScheduler(self, self._render)
+        self.worker = PreviewWorker()
+        self.rendered = 0                   # frames rendered (cache misses)
+        self.reused = 0                     # frames shown from the cache
+        self.on_error_cb = None             # on_error_cb(exc) for a failed render; see _report
+        self.errors = 0                     # failed renders
+
+    def refresh(self):
+        """Invalidate the strip; a changed fit is picked up after DEBOUNCE_MS of quiet."""
+        self.scheduler.request(delay_ms=self.DEBOUNCE_MS)
+
+    def destroy(self):
+        self.scheduler.cancel()
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
+        super().destroy()
+
+    def _render(self):
+        job = self._get_job()
+        self._gen += 1
+        self._queue = []
+        if job is None:
+            self._key = None
+            self._layout(())
+            return
+        sizes = tuple(sorted(set(int(n) for n in job.sizes)))
+        frames = self._cache.get(job.key)
+        if frames is None:
+            frames = self._cache[job.key] = {}
+            while len(self._cache) > self.CACHED_KEYS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(job.key)
+        self._key = job.key
+        self._layout(sizes)
+        for n in sizes:
+            if n in frames:
+                self.reused += 1
+                self._show(n, frames[n])
+            else:
+                self._queue.append(n)
+        self._render_next(job)
+
+    def _render_next(self, job: StripJob):
+        if not self._queue:
+            return
+        n = self._queue.pop(0)
+        render, tile = job.render, self.TILE
+
+        def fn():
+            frame = render(n)
+            if frame.width > tile:
+                frame = frame.resize((tile, tile), Image.Resampling.LANCZOS)
+            return frame
+
+        self._running = (self._gen, job, n)
+        self.worker.submit(self._gen, fn)
+        if self._poll_id is None:
+            self._poll_id = self.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        res = self.worker.take_result()
+        if res is not None and self._running is not None and res[0] == self._running[0]:
+            gen, img, err = res
+            _, job, n = self._running
+            self._running = None
+            if err is not None:
+                _report(self, err)  # the tile keeps its old pixels; the other sizes still render
+            else:
+                self.rendered += 1
+                frames = self._cache.get(job.key)
+                if frames is not None:
+                    frames[n] = img
+            if gen == self._gen:
+                if err is None:
+                    self._show(n, img)
+                self._render_next(job)
+        if self._running is not None or self.worker.busy():
+            self._poll_id = self.after(self.POLL_MS, self._poll)
+
+    def _layout(self, sizes):
+        """Create/move/drop tiles so there is one per size, left to right."""
+        colors = tokens.get_colors(self._is_light())
+        try:
+            self.configure(background=colors["card"])
+        except Exception:
+            pass
+        if self._checker_imgtk is None or self._checker_is_light != self._is_light():
+            tile, cell = self.TILE, 8
+            img = Image.new("RGB", (tile, tile), colors["checker_dark"])
+            draw = ImageDraw.Draw(img)
+            for y in range(0, tile, cell):
+                for x in range((y // cell) % 2 * cell, tile, 2 * cell):
+                    draw.rectangle([x, y, x + cell - 1, y + cell - 1], fill=colors["checker_light"])
+            if self._checker_imgtk is not None:
+                self._checker_imgtk.paste(img)
+            else:
+                self._checker_imgtk = ImageTk.PhotoImage(img)
+            self._checker_is_light = self._is_light()
+        for n in [n for n in self._tiles if n not in sizes]:
+            for item in self._tiles.pop(n)[:3]:
+                self.delete(item)
+        for i, n in enumerate(sizes):
+            x = self.GAP + i * (self.TILE + self.GAP) + self.TILE // 2
+            y = 4 + self.TILE // 2
+            t = self._tiles.get(n)
+            if t is None:
+                t = self._tiles[n] = [self.create_image(x, y, image=self._checker_imgtk),
+                                      self.create_image(x, y, state="hidden"),
+                                      self.create_text(x, y + self.TILE // 2 + self.LABEL_H // 2 + 2, text=str(n)),
+                                      None]
+            self.coords(t[0], x, y)
+            self.coords(t[1], x, y)
+            self.coords(t[2], x, y + self.TILE // 2 + self.LABEL_H // 2 + 2)
+            self.itemconfigure(t[2], fill=colors["muted"])
+
+    def _show(self, n: int, img: Image.Image):
+        t = self._tiles.get(n)
+        if t is None:
+            return
+        photo = t[3]
+        if photo is not None and (photo.width(), photo.height()) == img.size:
+            photo.paste(img)
+        else:
+            photo = t[3] = ImageTk.PhotoImage(img)
+        self.itemconfigure(t[1], image=photo, state="normal")
@@ -1,5 +1,8 @@
 # run_app.py (entrypoint for PyInstaller)
+import multiprocessing
+
 from pIcon.ui.app import main
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # the Batch page's process pool re-launches this exe
     main()
@@ -0,0 +1,127 @@
+"""BatchQueue against a real process pool; run_batch and collect_jobs."""
+import os
+import time
+from concurrent.futures import Future
+
+from PIL import Image
+
+from pIcon.core import batch
+from pIcon.core.batch import BatchJob, BatchQueue, BatchResult, collect_jobs, run_batch
+
+def _jobs(tmp_path, names):
+    jobs = []
+    for name in names:
+        src = tmp_path / f"{name}.png"
+        Image.new("RGBA", (64, 64), (200, 10, 10, 255)).save(src)
+        jobs.append(BatchJob(str(src), str(tmp_path / "out" / f"{name}.ico")))
+    return jobs
+
+def _wait_idle(queue, timeout=120):
+    deadline = time.monotonic() + timeout
+    while queue.busy():
+        assert time.monotonic() < deadline, queue.counts()
+        time.sleep(0.05)
+
+def test_queue_converts_with_a_spawn_pool(tmp_path):
+    queue = BatchQueue(sizes=[16, 32], max_workers=1)
+    try:
+        ids = queue.add(_jobs(tmp_path, ["a", "b"]))
+        _wait_idle(queue)
+        assert queue._executor._mp_context.get_start_method() == "spawn"
+        assert [queue.get(i).state for i in ids] == ["done", "done"]
+        assert (tmp_path / "out" / "b.ico").exists()
+    finally:
+        queue.shutdown()
+
+def test_items_submitted_to_a_broken_pool_are_requeued(tmp_path):
+    queue = BatchQueue(sizes=[16], max_workers=1)
+    try:
+        queue.add(_jobs(tmp_path, ["first"]))
+        _wait_idle(queue)
+        broken = queue._executor
+        for proc in list(broken._processes.values()):
+            proc.kill()
+        deadline = time.monotonic() + 30
+        while not broken._broken:  # the pool notices the dead worker on its management thread
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        ids = queue.add(_jobs(tmp_path, ["x", "y", "z"]))
+        _wait_idle(queue)
+        assert queue._executor is not broken
+        assert [queue.get(i).state for i in ids] == ["done"] * 3
+    finally:
+        queue.shutdown()
+
+class _Counted(Future):
+    """A finished future that counts itself outstanding until its result is read."""
+    outstanding = peak = 0
+
+    def __init__(self, value):
+        super().__init__()
+        self.set_result(value)
+        _Counted.outstanding += 1
+        _Counted.peak = max(_Counted.peak, _Counted.outstanding)
+
+    def result(self, timeout=None):
+        _Counted.outstanding -= 1
+        return super().result(timeout)
+
+class _InlineExecutor:
+    def __init__(self, max_workers=None, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        return _Counted(fn(*args))
+
+def test_run_batch_bounds_in_flight_submissions(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(batch, "convert_job", lambda job, *a: BatchResult(job, True, 0.0))
+    jobs = [BatchJob(f"in{i}.png", f"out{i}.ico") for i in range(50)]
+    results = run_batch(jobs, [16], max_workers=3)
+    assert len(results) == 50 and all(r.ok for r in results)
+    assert _Counted.peak <= 6
+
+def test_glob_patterns_mirror_below_the_wildcard(tmp_path):
+    for rel in ("a/x.png", "a/sub/y.png", "a/notes.txt"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_bytes(b"")
+    jobs = collect_jobs([str(tmp_path / "a" / "**" / "*.png")], str(tmp_path / "out"))
+    outs = sorted(os.path.relpath(j.output_path, tmp_path / "out") for j in jobs)
+    assert outs == [os.path.join("sub", "y.ico"), "x.ico"]
+
+def _png(path, side=40):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGBA", (side, side), (1, 2, 3, 255)).save(path)
+
+def test_in_place_folder_can_be_queued_again(tmp_path):
+    _png(tmp_path / "a.png")
+    _png(tmp_path / "sub" / "b.png")
+    (tmp_path / "x.ico").write_bytes(b"not ours")
+    first = collect_jobs([str(tmp_path)], str(tmp_path))
+    assert sorted(os.path.relpath(j.input_path, tmp_path) for j in first) == ["a.png", os.path.join("sub", "b.png")]
+    assert all(r.ok for r in run_batch(first, [16], max_workers=1))
+    assert (tmp_path / "a.ico").exists() and (tmp_path / "sub" / "b.ico").exists()
+    again = collect_jobs([str(tmp_path)], str(tmp_path))
+    assert [(j.input_path, j.output_path) for j in again] == [(j.input_path, j.output_path) for j in first]
+    assert (tmp_path / "x.ico").read_bytes() == b"not ours"
+
+def test_output_root_inside_the_tree_is_not_expanded(tmp_path):
+    _png(tmp_path / "a.png")
+    _png(tmp_path / "out" / "stray.png")
+    (tmp_path / "out" / "a.ico").write_bytes(b"")
+    for item in (str(tmp_path), str(tmp_path / "**" / "*.*")):
+        jobs = collect_jobs([item], str(tmp_path / "out"))
+        assert [os.path.basename(j.input_path) for j in jobs] == ["a.png"]
+
+def test_inputs_written_by_a_job_are_dropped(tmp_path):
+    _png(tmp_path / "a.png")
+    (tmp_path / "a.ico").write_bytes(b"")
+    (tmp_path / "x.ico").write_bytes(b"")
+    jobs = collect_jobs([str(tmp_path / "a.png"), str(tmp_path / "a.ico"), str(tmp_path / "x.ico")], str(tmp_path))
+    assert [os.path.basename(j.input_path) for j in jobs] == ["a.png"]
@@ -0,0 +1,57 @@
+"""IconCache publishing and eviction."""
+import os
+
+from pIcon.core import cache as cache_mod
+from pIcon.core.cache import IconCache
+
+def _src(tmp_path, n: int, size: int = 1000) -> str:
+    path = tmp_path / f"src{n}.ico"
+    path.write_bytes(bytes([n % 256]) * size)
+    return str(path)
+
+def _dir_bytes(root) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+def test_store_keeps_directory_under_cap(tmp_path):
+    cache = IconCache(str(tmp_path / "c"), max_bytes=10_000)
+    for n in range(50):
+        cache.store(f"{n:064x}", _src(tmp_path, n))
+        assert _dir_bytes(cache.root) <= 10_000
+    assert cache.stats()["entries"] == 10
+    # the newest entries survive
+    assert os.path.exists(cache.entry_path(f"{49:064x}"))
+    assert not os.path.exists(cache.entry_path(f"{0:064x}"))
+
+def test_store_scans_only_when_over_budget(tmp_path, monkeypatch):
+    scans = []
+    real_scan = IconCache._scan
+    monkeypatch.setattr(IconCache, "_scan", lambda self: (scans.append(1), real_scan(self))[1])
+    root = str(tmp_path / "c")
+    n_files = 3 * cache_mod._RESCAN_STORES
+    for n in range(n_files):
+        IconCache(root, max_bytes=10 ** 9).store(f"{n:064x}", _src(tmp_path, n))  # one instance per file, as batch does
+    assert len(scans) <= 1 + n_files // cache_mod._RESCAN_STORES
+
+def test_hits_leave_earlier_outputs_untouched(tmp_path):
+    cache = IconCache(str(tmp_path / "c"))
+    key = f"{1:064x}"
+    cache.store(key, _src(tmp_path, 1))
+    first = tmp_path / "first.ico"
+    assert cache.fetch(key, str(first))
+    os.utime(first, (1_000_000, 1_000_000))  # as recorded by an earlier build
+    assert cache.fetch(key, str(tmp_path / "second.ico"))
+    assert os.stat(first).st_mtime == 1_000_000
+    assert os.stat(cache.entry_path(key)).st_mtime == 1_000_000  # linked: one inode
+
+def test_hits_count_as_use_for_eviction(tmp_path):
+    cache = IconCache(str(tmp_path / "c"), max_bytes=10 ** 9)
+    old, new = f"{1:064x}", f"{2:064x}"
+    cache.store(old, _src(tmp_path, 1))
+    cache.store(new, _src(tmp_path, 2))
+    os.utime(cache.entry_path(old), (1_000, 1_000))
+    os.utime(cache.entry_path(new), (2_000, 2_000))
+    assert cache.fetch(old, str(tmp_path / "out.ico"))
+    assert cache.evict(max_bytes=1000) == 1
+    assert os.path.exists(cache.entry_path(old))
+    assert not os.path.exists(cache.entry_path(new))
+    assert cache.stats()["entries"] == 1
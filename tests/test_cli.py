@@ -0,0 +1,25 @@
+"""Command-line argument handling."""
+import subprocess
+import sys
+
+from PIL import Image
+
+def _run(*args, stdin=b""):
+    return subprocess.run([sys.executable, "-m", "pIcon.cli", "--cli", *args], input=stdin,
+                          capture_output=True, timeout=60)
+
+def test_cache_dir_is_rejected_with_stdin_or_stdout(tmp_path):
+    png = tmp_path / "a.png"
+    Image.new("RGBA", (32, 32), (1, 2, 3, 255)).save(png)
+    cache = str(tmp_path / "cache")
+    for args in (["-", str(tmp_path / "a.ico")], [str(png), "-"]):
+        proc = _run(*args, "--cache-dir", cache, "--cache-stats", stdin=png.read_bytes())
+        assert proc.returncode == 1
+        assert b"--cache-dir" in proc.stderr and b"Cache:" not in proc.stdout + proc.stderr
+
+def test_stdin_to_stdout_without_cache(tmp_path):
+    png = tmp_path / "a.png"
+    Image.new("RGBA", (32, 32), (1, 2, 3, 255)).save(png)
+    proc = _run("-", "-", "--sizes", "16,32", stdin=png.read_bytes())
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout[:4] == b"\0\0\1\0"
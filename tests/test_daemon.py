@@ -0,0 +1,65 @@
+"""The resident daemon over a real Unix socket."""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from pIcon.client import connect, recv_msg, send_msg
+from pIcon.daemon import stop
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="the daemon forks per request")
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = str(tmp_path / "d.sock")
+    proc = subprocess.Popen([sys.executable, "-m", "pIcon.cli", "--cli", "daemon", "--socket", path,
+                             "--idle-timeout", "120", "--jobs", "4"], stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while (sock := connect(path)) is None:
+        assert proc.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    sock.close()
+    yield path
+    stop(path)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        raise
+
+def _call(path, argv, cwd, timeout=60):
+    sock = connect(path)
+    sock.settimeout(timeout)
+    try:
+        send_msg(sock, {"argv": argv, "cwd": str(cwd)})
+        return recv_msg(sock)
+    finally:
+        sock.close()
+
+def test_calls_run_in_parallel_each_in_its_own_directory(daemon, tmp_path):
+    blocked = tmp_path / "blocked.json"
+    os.mkfifo(blocked)  # opening it for reading waits for a writer
+    replies = {}
+    first = threading.Thread(target=lambda: replies.update(a=_call(daemon, ["build", "blocked.json",
+                                                                             "--dry-run"], tmp_path)))
+    first.start()
+    time.sleep(0.5)
+
+    try:
+        other = tmp_path / "other"
+        other.mkdir()
+        Image.new("RGB", (40, 30)).save(other / "a.png")
+        reply = _call(daemon, ["probe", "a.png"], other, timeout=30)  # a serial daemon times out here
+        assert reply["code"] == 0 and "PNG 40x30" in reply["stdout"]
+        assert first.is_alive()
+        Image.new("RGB", (8, 8)).save(tmp_path / "s.png")
+    finally:
+        fd = os.open(blocked, os.O_WRONLY | os.O_NONBLOCK)  # the blocked call is reading it
+        os.write(fd, b'{"icon": [{"source": "s.png", "output": "s.ico"}]}')
+        os.close(fd)
+    first.join(60)
+    assert replies["a"]["code"] == 0 and "would build" in replies["a"]["stdout"]
@@ -0,0 +1,100 @@
+"""Fit plans and per-size rendering in core.geometry."""
+import random
+
+from PIL import Image, ImageChops, ImageFilter
+
+from pIcon.core.geometry import EXIF_TRANSPOSE, FitPlan, compare_strategies, plan_square, render_frames
+from pIcon.core.images import make_square
+
+PAD = (10, 20, 30, 40)
+
+def _source(size=(300, 200)) -> Image.Image:
+    rgb = Image.merge("RGB", [Image.linear_gradient("L").resize(size),
+                              Image.effect_noise(size, 40),
+                              Image.linear_gradient("L").rotate(90).resize(size)])
+    return rgb.convert("RGBA")
+
+def _photo(size) -> Image.Image:
+    """Deterministic photo-like RGBA: seeded noise softened to natural image detail."""
+    noise = Image.frombytes("RGB", size, random.Random(0).randbytes(size[0] * size[1] * 3))
+    return noise.filter(ImageFilter.GaussianBlur(1)).convert("RGBA")
+
+def _max_diff(a: Image.Image, b: Image.Image) -> int:
+    return max(hi for _, hi in ImageChops.difference(a, b).getextrema())
+
+def test_plan_square_describes_each_mode_as_boxes():
+    assert plan_square((300, 200), "pad", PAD) == FitPlan((0, 0, 300, 200), (0, 50, 300, 250), 300, PAD)
+    assert plan_square((200, 301), "pad").dst_box == (50, 0, 250, 301)
+    assert plan_square((300, 200), "stretch") == FitPlan((0, 0, 300, 200), (0, 0, 300, 300), 300, (0, 0, 0, 0))
+    assert plan_square((300, 200), "crop").src_box == (50, 0, 250, 200)
+
+def test_crop_plan_honours_center_and_zoom_within_the_image():
+    plan = plan_square((300, 200), "crop", crop_center=(100, 120), crop_zoom=2.0)
+    assert plan.side == 100 and plan.src_box == (50, 70, 150, 170)
+    assert plan.dst_box == (0, 0, 100, 100)
+    edge = plan_square((300, 200), "crop", crop_center=(0, 1000), crop_zoom=2.0)
+    assert edge.src_box == (0, 100, 100, 200)  # clamped, never outside the source
+    assert plan_square((300, 200), "crop", crop_zoom=0.5).side == 200  # zoom below 1 is 1
+
+def test_crop_frames_are_the_region_resampled_once():
+    img = _source()
+    plan = plan_square(img.size, "crop", crop_center=(180, 90))
+    frames = render_frames(img, plan, [16, 48, 200], strategy="direct")
+    assert frames[200].tobytes() == img.crop(plan.src_box).tobytes()
+    for n in (16, 48):
+        ref = img.crop(plan.src_box).resize((n, n), Image.Resampling.LANCZOS)
+        assert frames[n].size == (n, n)
+        assert _max_diff(frames[n], ref) <= 1
+
+def test_pad_frames_fill_outside_the_content_with_the_pad_colour():
+    img = _source()
+    plan = plan_square(img.size, "pad", PAD)
+    frames = render_frames(img, plan, [32, 64])
+    for n, frame in frames.items():
+        assert frame.size == (n, n) and frame.mode == "RGBA"
+        assert frame.getpixel((0, 0)) == PAD and frame.getpixel((n - 1, n - 1)) == PAD
+        assert frame.getpixel((n // 2, n // 2)) != PAD
+
+def test_stretch_fills_the_whole_square():
+    img = _source()
+    frame = render_frames(img, plan_square(img.size, "stretch"), [64], strategy="direct")[64]
+    assert _max_diff(frame, img.resize((64, 64), Image.Resampling.LANCZOS)) <= 1
+
+def test_make_square_keeps_the_source_at_one_to_one():
+    img = _source()
+    padded = make_square(img, "pad", PAD)
+    assert padded.size == (300, 300)
+    assert padded.crop((0, 50, 300, 250)).tobytes() == img.tobytes()
+    assert padded.getpixel((0, 0)) == PAD
+    square = _source((128, 128))
+    assert make_square(square) is square
+
+def test_mip_chain_stays_within_the_error_bound_of_direct_resampling():
+    img = _photo((1537, 1023))  # odd sides: partial boxes at every pyramid level
+    plan = plan_square(img.size, "pad", PAD)
+    report = compare_strategies(img, plan, [16, 24, 32, 48, 64, 128, 256], repeat=1)
+    assert max(report["max_error"].values()) <= 5, report["max_error"]
+
+def test_reused_levels_give_the_same_frames():
+    img = _source((1200, 900))
+    plan = plan_square(img.size, "crop")
+    ref = render_frames(img, plan, [16, 32, 256])
+    levels = []
+    first = render_frames(img, plan, [32], levels=levels)
+    assert len(levels) > 1
+    levels[0] = None  # callers may drop the full-resolution level once reduced ones exist
+    later = render_frames(img, plan, [16, 256], levels=levels)
+    assert levels[0] is None
+    assert first[32].tobytes() == ref[32].tobytes()
+    for n in (16, 256):
+        assert later[n].tobytes() == ref[n].tobytes()
+
+def test_orientation_renders_as_the_transposed_source():
+    img = _source((301, 199))
+    for orientation, method in EXIF_TRANSPOSE.items():
+        upright = img.transpose(method)
+        plan = plan_square(upright.size, "crop", crop_center=(90, 120), crop_zoom=1.3)
+        ref = render_frames(upright, plan, [16, 48, 100])
+        got = render_frames(img, plan, [16, 48, 100], orientation=orientation)
+        for n in ref:
+            assert got[n].tobytes() == ref[n].tobytes(), (orientation, n)
@@ -0,0 +1,99 @@
+"""Round-trips of core.ico output through Pillow's own ICO reader."""
+import io
+import random
+import struct
+
+import pytest
+from PIL import Image
+
+from pIcon.core.ico import PNG_MIN_SIZE, encode_ico
+
+SIZES = [16, 24, 32, 48, 64, 128, 256]
+
+def _noise(side: int, seed: int = 0) -> Image.Image:
+    """RGBA noise that covers every alpha value, including 0 and 255."""
+    rng = random.Random(seed + side)
+    return Image.frombytes("RGBA", (side, side), rng.randbytes(side * side * 4))
+
+def _read(data: bytes, side: int) -> Image.Image:
+    ico = Image.open(io.BytesIO(data))
+    assert ico.format == "ICO"
+    frame = ico.ico.getimage((side, side))
+    return frame.convert("RGBA")
+
+def _directory(data: bytes):
+    """[(side, bpp, payload)] straight from the ICONDIR/ICONDIRENTRY tables."""
+    reserved, kind, count = struct.unpack_from("<HHH", data)
+    assert (reserved, kind) == (0, 1)
+    out = []
+    for i in range(count):
+        w, h, _, _, planes, bpp, size, offset = struct.unpack_from("<BBBBHHII", data, 6 + 16 * i)
+        assert w == h and planes == 1
+        out.append((w or 256, bpp, data[offset:offset + size]))
+    return out
+
+def test_all_sizes_round_trip_exactly():
+    frames = [_noise(n) for n in SIZES]
+    data = encode_ico(frames)
+    assert sorted(Image.open(io.BytesIO(data)).info["sizes"]) == [(n, n) for n in SIZES]
+    for frame in frames:
+        assert _read(data, frame.width).tobytes() == frame.tobytes()
+
+def test_entry_format_follows_png_min_size():
+    data = encode_ico([_noise(n) for n in SIZES])
+    for side, bpp, payload in _directory(data):
+        assert bpp == 32
+        is_png = payload.startswith(b"\x89PNG\r\n\x1a\n")
+        assert is_png == (side >= PNG_MIN_SIZE)
+
+@pytest.mark.parametrize("png_min_size", [1, 32, 257])
+def test_png_min_size_is_configurable(png_min_size):
+    frames = [_noise(n) for n in (16, 32, 48, 256)]
+    data = encode_ico(frames, png_min_size=png_min_size)
+    for (side, _, payload), frame in zip(_directory(data), frames):
+        assert payload.startswith(b"\x89PNG") == (side >= png_min_size)
+        assert _read(data, side).tobytes() == frame.tobytes()
+
+@pytest.mark.parametrize("side", [16, 24, 48])
+def test_bmp_and_mask_marks_only_fully_transparent_pixels(side):
+    frame = _noise(side, seed=7)
+    (entry_side, _, payload), = _directory(encode_ico([frame]))
+    assert entry_side == side
+    header_size, w, h2 = struct.unpack_from("<Iii", payload)
+    assert (header_size, w, h2) == (40, side, 2 * side)
+    stride = ((side + 31) // 32) * 4
+    mask = payload[40 + side * side * 4:]
+    assert len(mask) == stride * side
+    alpha = frame.getchannel("A").load()
+    for y in range(side):
+        row = mask[(side - 1 - y) * stride:][:stride]  # bottom-up
+        for x in range(side):
+            bit = (row[x // 8] >> (7 - x % 8)) & 1
+            assert bit == (alpha[x, y] == 0), (x, y, alpha[x, y])
+
+@pytest.mark.parametrize("alpha", [0, 1, 128, 254, 255])
+@pytest.mark.parametrize("side", [16, 64])
+def test_uniform_alpha_keeps_colour_and_alpha(alpha, side):
+    frame = Image.new("RGBA", (side, side), (12, 200, 99, alpha))
+    assert _read(encode_ico([frame]), side).tobytes() == frame.tobytes()
+
+def test_non_rgba_frames_are_converted():
+    frames = [Image.new("RGB", (16, 16), (1, 2, 3)), Image.new("LA", (64, 64), (50, 128))]
+    data = encode_ico(frames)
+    assert _read(data, 16).getpixel((0, 0)) == (1, 2, 3, 255)
+    assert _read(data, 64).getpixel((5, 5)) == (50, 50, 50, 128)
+
+def test_serial_and_parallel_encoding_match():
+    frames = [_noise(n) for n in SIZES]
+    assert encode_ico(frames, max_workers=1) == encode_ico(frames, max_workers=4)
+
+def test_compress_level_trades_size_not_pixels():
+    frame = Image.radial_gradient("L").convert("RGBA").resize((256, 256))
+    fast, small = encode_ico([frame], compress_level=0), encode_ico([frame], compress_level=9)
+    assert len(small) < len(fast)
+    assert _read(fast, 256).tobytes() == _read(small, 256).tobytes() == frame.tobytes()
+
+@pytest.mark.parametrize("frames", [[], [Image.new("RGBA", (16, 8))], [Image.new("RGBA", (512, 512))]])
+def test_invalid_frames_are_rejected(frames):
+    with pytest.raises(ValueError):
+        encode_ico(frames)
@@ -0,0 +1,70 @@
+"""Source decoding in core.images: reduced-scale JPEG/MPO draft, caller-owned images."""
+import io
+
+from PIL import Image, ImageChops
+
+from pIcon.core.images import DRAFT_SCALE_KEY, ORIENTATION_KEY, build_ico, load_and_plan, load_image_as_rgba
+
+def _jpeg(path, size=(2000, 1600)) -> str:
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    img.save(path, "JPEG", quality=95)
+    return str(path)
+
+def test_jpeg_is_drafted_to_the_smallest_scale_still_covering_the_target(tmp_path):
+    src = _jpeg(tmp_path / "a.jpg")
+    img = load_image_as_rgba(src, target_size=256)
+    assert img.size == (500, 400)  # 1/8 would leave a 200 px short side
+    assert img.info[DRAFT_SCALE_KEY] == 4
+    assert img.mode == "RGBA"
+
+def test_full_decode_without_target_or_when_the_source_is_small(tmp_path):
+    src = _jpeg(tmp_path / "a.jpg")
+    full = load_image_as_rgba(src)
+    assert full.size == (2000, 1600) and DRAFT_SCALE_KEY not in full.info
+    small = load_image_as_rgba(_jpeg(tmp_path / "b.jpg", (400, 300)), target_size=256)
+    assert small.size == (400, 300) and DRAFT_SCALE_KEY not in small.info
+
+def test_non_jpeg_sources_are_never_drafted(tmp_path):
+    path = tmp_path / "a.png"
+    Image.new("RGB", (2000, 1600)).save(path)
+    img = load_image_as_rgba(str(path), target_size=256)
+    assert img.size == (2000, 1600) and DRAFT_SCALE_KEY not in img.info
+
+def test_crop_center_is_given_in_original_pixels(tmp_path):
+    src = _jpeg(tmp_path / "a.jpg")
+    base, plan, _ = load_and_plan(src, [64], "crop", crop_center=(1600, 800), crop_zoom=2.0)
+    scale = base.info[DRAFT_SCALE_KEY]
+    assert scale > 1
+    x0, y0, x1, y1 = plan.src_box
+    assert abs((x0 + x1) / 2 * scale - 1600) <= scale
+    assert abs((y0 + y1) / 2 * scale - 800) <= scale
+
+def test_drafted_icons_match_a_full_decode(tmp_path):
+    src = _jpeg(tmp_path / "a.jpg")
+    drafted = Image.open(io.BytesIO(build_ico(src, [32])))
+    full = Image.open(io.BytesIO(build_ico(load_image_as_rgba(src), [32])))
+    diff = ImageChops.difference(drafted.convert("RGBA"), full.convert("RGBA"))
+    assert max(hi for _, hi in diff.getextrema()) <= 8
+
+def test_mpo_sources_are_drafted_like_jpeg(tmp_path):
+    frame = Image.linear_gradient("L").resize((2000, 1600)).convert("RGB")
+    path = tmp_path / "a.mpo"
+    frame.save(path, "MPO", save_all=True, append_images=[frame.rotate(180)])
+    assert Image.open(path).format == "MPO"
+    img = load_image_as_rgba(str(path), target_size=256)
+    assert img.size == (500, 400) and img.info[DRAFT_SCALE_KEY] == 4
+
+def test_caller_images_are_not_modified(tmp_path):
+    src = Image.linear_gradient("L").resize((300, 200)).convert("RGBA")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    src.info["exif"] = exif.tobytes()
+    before = dict(src.info)
+    out = load_image_as_rgba(src, target_size=16, defer_orientation=True)
+    assert out is not src and out.info[ORIENTATION_KEY] == 6
+    assert src.info == before
+
+    jpeg = Image.open(_jpeg(tmp_path / "a.jpg"))
+    out = load_image_as_rgba(jpeg, target_size=256)
+    assert jpeg.size == (2000, 1600) and out.size == (2000, 1600)  # not drafted
+    assert DRAFT_SCALE_KEY not in jpeg.info and DRAFT_SCALE_KEY not in out.info
@@ -0,0 +1,81 @@
+"""Manifest parsing and incremental build staleness."""
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from pIcon.core.manifest import build, load_manifest, plan_build, read_state
+
+def _project(tmp_path, **icon):
+    Image.new("RGBA", (64, 48), (200, 30, 30, 255)).save(tmp_path / "a.png")
+    manifest = tmp_path / "icons.json"
+    manifest.write_text(json.dumps({"defaults": {"sizes": [16, 32]},
+                                    "icon": [dict({"source": "a.png", "output": "out/a.ico"}, **icon)]}))
+    return str(manifest), str(tmp_path / "icons.state.json")
+
+def _reasons(manifest, state_path):
+    plan = plan_build(load_manifest(manifest), read_state(state_path))
+    return [reason for _, reason in plan.stale]
+
+def _build(manifest, state_path):
+    plan, results = build(load_manifest(manifest), state_path, max_workers=1)
+    assert all(r.ok for r in results), [r.error for r in results]
+    return plan
+
+def test_second_build_is_a_no_op(tmp_path):
+    manifest, state = _project(tmp_path)
+    assert _reasons(manifest, state) == ["new"]
+    _build(manifest, state)
+    assert (tmp_path / "out" / "a.ico").exists()
+    assert _reasons(manifest, state) == []
+
+def test_touched_source_is_hashed_not_rebuilt(tmp_path):
+    manifest, state = _project(tmp_path)
+    _build(manifest, state)
+    os.utime(tmp_path / "a.png", ns=(1, 10 ** 18))
+    plan = plan_build(load_manifest(manifest), read_state(state))
+    assert plan.stale == [] and list(plan.touched.values()) == [10 ** 18]
+    build(load_manifest(manifest), state, max_workers=1, plan=plan)
+    assert read_state(state)["entries"][str(tmp_path / "out" / "a.ico")]["src_mtime_ns"] == 10 ** 18
+
+def test_edited_source_is_rebuilt(tmp_path):
+    manifest, state = _project(tmp_path)
+    _build(manifest, state)
+    Image.new("RGBA", (64, 48), (0, 0, 200, 255)).save(tmp_path / "a.png")
+    assert _reasons(manifest, state) == ["source changed"]
+    _build(manifest, state)
+    assert _reasons(manifest, state) == []
+
+def test_changed_parameters_are_rebuilt(tmp_path):
+    manifest, state = _project(tmp_path)
+    _build(manifest, state)
+    manifest, _ = _project(tmp_path, fit="crop")
+    assert _reasons(manifest, state) == ["parameters changed"]
+
+def test_modified_or_missing_output_is_rebuilt(tmp_path):
+    manifest, state = _project(tmp_path)
+    _build(manifest, state)
+    out = tmp_path / "out" / "a.ico"
+    out.write_bytes(out.read_bytes() + b"\0")
+    assert _reasons(manifest, state) == ["output modified"]
+    _build(manifest, state)
+    out.unlink()
+    assert _reasons(manifest, state) == ["output missing"]
+
+@pytest.mark.parametrize("field, value, message", [
+    ("padrgb", [0, 0, 0, 256], "padrgb"),
+    ("padrgb", "1,2,3", "padrgb"),
+    ("crop_center", ["x", 3], "crop_center x must be a number"),
+    ("crop_center", [1], "crop_center must be [x, y]"),
+    ("crop_zoom", "deep", "crop_zoom must be a number"),
+    ("crop_zoom", 0, "crop_zoom must be > 0"),
+    ("compress_level", 12, "compress_level must be 0-9"),
+    ("png_min_size", "big", "png_min_size must be an integer"),
+    ("fit", "zoom", "fit must be one of"),
+])
+def test_bad_entries_name_the_icon(tmp_path, field, value, message):
+    manifest, _ = _project(tmp_path, **{field: value})
+    with pytest.raises(ValueError) as e:
+        load_manifest(manifest)
+    assert str(e.value).startswith(f"{manifest}: icon #1: ") and message in str(e.value)
@@ -0,0 +1,65 @@
+"""Header-only probing: cache invalidation and early rejection."""
+import os
+
+import pytest
+from PIL import Image, ImageFile
+
+from pIcon.core.images import build_ico, create_multi_resolution_ico
+from pIcon.core.probe import clear_probe_cache, probe_counters, probe_image
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    clear_probe_cache()
+    yield
+    clear_probe_cache()
+
+def _png(path, size=(40, 30), orientation=None):
+    img = Image.new("RGB", size, (9, 9, 9))
+    if orientation is None:
+        img.save(path)
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        img.save(path, exif=exif.tobytes())
+    return str(path)
+
+def test_repeated_probes_hit_the_cache(tmp_path):
+    path = _png(tmp_path / "a.png", orientation=6)
+    first = probe_image(path)
+    before = probe_counters()
+    assert probe_image(path) == first
+    after = probe_counters()
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (1, 0)
+    assert first.size == (40, 30) and first.oriented_size == (30, 40) and first.orientation == 6
+
+def test_an_edited_file_is_probed_again(tmp_path):
+    path = _png(tmp_path / "a.png")
+    assert probe_image(path).size == (40, 30)
+    st = os.stat(path)
+    _png(path, size=(50, 20))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    before = probe_counters()["misses"]
+    assert probe_image(path).size == (50, 20)
+    assert probe_counters()["misses"] == before + 1
+
+def test_max_pixels_rejects_before_decoding(tmp_path, monkeypatch):
+    path = _png(tmp_path / "a.png", size=(400, 300))
+    with pytest.raises(ValueError, match="above the 0.1 MP limit"):
+        probe_image(path, max_pixels=100_000)
+    assert probe_image(path, max_pixels=120_000).pixels == 120_000
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("decoded a rejected source")
+    monkeypatch.setattr(ImageFile.ImageFile, "load", no_decode)
+    with pytest.raises(ValueError):
+        build_ico(path, [16], max_pixels=100_000)
+    with pytest.raises(ValueError):
+        create_multi_resolution_ico(path, str(tmp_path / "a.ico"), [16], max_pixels=100_000)
+
+def test_missing_and_non_image_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        probe_image(str(tmp_path / "nope.png"))
+    junk = tmp_path / "junk.png"
+    junk.write_bytes(b"definitely not an image")
+    with pytest.raises(ValueError, match="Not a supported image"):
+        probe_image(str(junk))
@@ -0,0 +1,85 @@
+"""ProcessExporter: exports in a warm child process from a shared-memory image."""
+import gc
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from pIcon.core import procexport
+from pIcon.core.procexport import ProcessExporter
+from pIcon.core.session import IconSession
+
+SIZES = [16, 32, 48]
+
+@pytest.fixture
+def exporter():
+    ex = ProcessExporter()
+    yield ex
+    ex.close()
+
+def _session(colour) -> IconSession:
+    return IconSession(Image.new("RGBA", (96, 64), colour))
+
+def _check(exporter, session, path):
+    exporter.export(session.image, str(path), SIZES, fit_mode="pad")
+    with open(path, "rb") as f:
+        assert f.read() == session.build(SIZES, fit_mode="pad")
+
+def test_export_matches_in_process_build(exporter, tmp_path):
+    session = _session((10, 20, 30, 255))
+    _check(exporter, session, tmp_path / "a.ico")
+    _check(exporter, session, tmp_path / "again.ico")
+    assert exporter.stats()["shared"] == 1  # the second export reused the shared image
+
+def test_new_image_is_never_mistaken_for_a_freed_one(exporter, tmp_path, monkeypatch):
+    # The export page's pattern: export A, open B without exporting, open C
+    # (same size) and export it. Once A is freed, C can get A's id(); make that
+    # certain by giving every object the same id() inside procexport.
+    monkeypatch.setattr(procexport, "id", lambda obj: 1, raising=False)
+    paths = []
+    for i, colour in enumerate([(255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255)]):
+        paths.append(str(tmp_path / f"src{i}.png"))
+        Image.new("RGBA", (96, 64), colour).save(paths[-1])
+    session = IconSession(paths[0])
+    _check(exporter, session, tmp_path / "a.ico")
+    session = IconSession(paths[1])  # opened, never exported
+    session = IconSession(paths[2])
+    gc.collect()
+    _check(exporter, session, tmp_path / "c.ico")
+    assert exporter.stats()["shared"] == 2
+
+def test_progress_callback_error_leaves_the_child_in_step(exporter, tmp_path):
+    session = _session((1, 2, 3, 255))
+
+    def boom(stage, done, total):
+        raise KeyError(stage)
+
+    with pytest.raises(KeyError):
+        exporter.export(session.image, str(tmp_path / "x.ico"), SIZES, on_progress=boom, fit_mode="pad")
+    # the abandoned export's remaining replies must not be read as this export's
+    _check(exporter, _session((200, 100, 0, 255)), tmp_path / "next.ico")
+    assert exporter.stats()["spawned"] == 1
+
+def test_close_with_timeout_cuts_a_running_export_short(exporter, tmp_path):
+    big = IconSession(Image.effect_noise((6000, 6000), 64).convert("RGBA"))
+    started = threading.Event()
+    errors = []
+
+    def run():
+        try:
+            exporter.export(big.image, str(tmp_path / "big.ico"), [16, 256],
+                            on_progress=lambda *p: started.set(), fit_mode="pad")
+        except Exception as e:
+            errors.append(e)
+        started.set()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(60)
+    t0 = time.monotonic()
+    exporter.close(timeout=0.1)
+    assert time.monotonic() - t0 < 10
+    thread.join(30)
+    assert not thread.is_alive()
+    assert not errors or isinstance(errors[0], RuntimeError)
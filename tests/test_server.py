@@ -0,0 +1,99 @@
+"""The HTTP service against a real localhost socket."""
+import asyncio
+import errno
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from pIcon import server as server_mod
+from pIcon.server import IconServer
+
+@pytest.fixture
+def server():
+    loop = asyncio.new_event_loop()
+    srv = IconServer(port=0, workers=1, queue_size=1)
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield srv
+    asyncio.run_coroutine_threadsafe(srv.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+
+def _request(srv, path, body=None):
+    req = urllib.request.Request(f"http://127.0.0.1:{srv.port}{path}", data=body,
+                                 method="POST" if body is not None else "GET")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def _png(side=300) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGBA", (side, side // 2), (10, 20, 30, 255)).save(buf, "PNG")
+    return buf.getvalue()
+
+def test_health(server):
+    assert _request(server, "/health") == (200, b"ok\n")
+
+def test_icon_round_trip(server):
+    status, data = _request(server, "/icon?sizes=16,48,256&fit=crop", _png())
+    assert status == 200
+    ico = Image.open(io.BytesIO(data))
+    assert sorted(ico.info["sizes"]) == [(16, 16), (48, 48), (256, 256)]
+
+def test_bad_params_and_bodies(server):
+    assert _request(server, "/icon?fit=zoom", _png())[0] == 400
+    assert _request(server, "/icon?padrgb=1,2,3", _png())[0] == 400
+    assert _request(server, "/icon", b"")[0] == 400
+    assert _request(server, "/icon")[0] == 405
+    assert _request(server, "/nope")[0] == 404
+
+def test_undecodable_body_is_422(server):
+    status, body = _request(server, "/icon", b"not an image")
+    assert status == 422 and body.startswith(b"conversion failed")
+    assert _request(server, "/icon", _png()[:100])[0] == 422  # truncated PNG
+    metrics = json.loads(_request(server, "/metrics")[1])
+    assert metrics["failed"] == 2 and metrics["errors"] == 0
+
+def test_pool_is_replaced_after_a_worker_crash(server):
+    assert _request(server, "/icon?sizes=16", _png())[0] == 200
+    for proc in list(server._pool._processes.values()):
+        proc.kill()
+    deadline = time.monotonic() + 30
+    status = _request(server, "/icon?sizes=16", _png())[0]
+    assert status == 503
+    while status != 200 and time.monotonic() < deadline:
+        status = _request(server, "/icon?sizes=16", _png())[0]
+    assert status == 200
+    metrics = json.loads(_request(server, "/metrics")[1])
+    assert metrics["pool_restarts"] == 1 and metrics["completed"] >= 2
+
+def test_pool_workers_are_spawned(server):
+    assert server._pool._mp_context.get_start_method() == "spawn"
+
+def test_only_decode_errors_are_422(server, monkeypatch):
+    def fail(body, *args, **kwargs):
+        raise errors.pop(0)
+    errors = [OSError("image file is truncated"), OSError(errno.EIO, "Input/output error"),
+              RuntimeError("bug")]
+    monkeypatch.setattr(server_mod, "build_ico", fail)
+    pool, server._pool = server._pool, ThreadPoolExecutor(1)  # runs the patched build_ico in this process
+    try:
+        assert _request(server, "/icon", _png())[0] == 422
+        assert _request(server, "/icon", _png())[0] == 500
+        assert _request(server, "/icon", _png())[0] == 500
+    finally:
+        server._pool.shutdown()
+        server._pool = pool
+    metrics = json.loads(_request(server, "/metrics")[1])
+    assert metrics["failed"] == 1 and metrics["errors"] == 2
@@ -0,0 +1,80 @@
+"""IconSession stage memoization."""
+import pytest
+from PIL import Image
+
+from pIcon.core.images import build_ico
+from pIcon.core.progress import CancelToken, ExportCancelled
+from pIcon.core.session import SESSION_PLANS, IconSession
+
+SIZES = [16, 32, 48, 256]
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "a.png"
+    Image.radial_gradient("L").resize((600, 400)).convert("RGBA").save(path)
+    return str(path)
+
+def _delta(session, before):
+    return {k: v - before[k] for k, v in session.stats().items() if v != before[k]}
+
+def test_build_matches_the_one_shot_pipeline(src):
+    session = IconSession(src)
+    for fit in ("pad", "crop", "stretch"):
+        assert session.build(SIZES, fit_mode=fit) == build_ico(src, SIZES, fit_mode=fit)
+
+def test_new_sizes_reuse_frames_and_entries(src):
+    session = IconSession(src)
+    session.entries([16, 32])
+    before = session.stats()
+    session.entries([16, 32, 48])
+    assert _delta(session, before) == {"plan_hits": 1, "frame_hits": 2, "frame_misses": 1,
+                                       "entry_hits": 2, "entry_misses": 1}
+
+def test_compression_change_reencodes_only(src):
+    session = IconSession(src)
+    session.entries(SIZES, compress_level=6)
+    before = session.stats()
+    session.entries(SIZES, compress_level=1)
+    assert _delta(session, before) == {"plan_hits": 1, "frame_hits": 4, "entry_misses": 4}
+
+def test_moving_the_crop_rerenders_without_redecoding(src):
+    session = IconSession(src)
+    source = session.source
+    a = session.frames([32], fit_mode="crop", crop_center=(200, 200))
+    b = session.frames([32], fit_mode="crop", crop_center=(400, 200))
+    assert session.source is source
+    assert a[32].tobytes() != b[32].tobytes()
+    assert session.stats()["frame_misses"] == 2
+    again = session.frames([32], fit_mode="crop", crop_center=(200, 200))
+    assert again[32] is a[32]
+
+def test_old_plans_are_dropped_with_their_entries(src):
+    session = IconSession(src)
+    for i in range(SESSION_PLANS + 1):
+        session.entries([16], fit_mode="crop", crop_center=(200 + 50 * i, 200))
+    assert len(session._frames) == SESSION_PLANS
+    assert len(session._entries) == SESSION_PLANS
+    before = session.stats()
+    session.entries([16], fit_mode="crop", crop_center=(200, 200))  # the first, evicted plan
+    assert _delta(session, before) == {"plan_hits": 1, "frame_misses": 1, "entry_misses": 1}
+
+def test_sizes_may_be_a_one_shot_iterable(src):
+    session = IconSession(src)
+    seen = []
+    entries = session.entries((n for n in SIZES), on_progress=lambda *a: seen.append(a))
+    assert sorted(entries) == SIZES
+    assert seen[-1][1:] == (2 + 2 * len(SIZES), 2 + 2 * len(SIZES))
+
+def test_cancelled_export_leaves_no_file(src, tmp_path):
+    session = IconSession(src)
+    token = CancelToken()
+    out = tmp_path / "a.ico"
+
+    def progress(stage, done, total):
+        if stage.startswith("encode"):
+            token.cancel()
+    with pytest.raises(ExportCancelled):
+        session.export(str(out), SIZES, on_progress=progress, cancel=token)
+    assert not out.exists()
+    session.export(str(out), SIZES)
+    assert out.read_bytes() == session.build(SIZES)
@@ -0,0 +1,94 @@
+"""Banded (bounded-memory) decoding against the normal full decode."""
+import struct
+
+import pytest
+from PIL import Image, ImageChops
+
+from pIcon.core import tiled
+from pIcon.core.images import DRAFT_SCALE_KEY, load_image_as_rgba
+from pIcon.core.tiled import load_bounded
+
+W, H = 1500, 1000
+MAX_MEMORY = 1024 * 1024  # a few dozen rows per band at this width
+
+def _source(mode: str) -> Image.Image:
+    r = Image.linear_gradient("L").resize((W, H))
+    g = Image.effect_noise((W, H), 48)
+    b = Image.linear_gradient("L").rotate(90).resize((W, H))
+    bands = [r, g, b] + ([Image.radial_gradient("L").resize((W, H))] if mode == "RGBA" else [])
+    return Image.merge(mode, bands)
+
+def _reference(path: str, k: int) -> Image.Image:
+    """What the banded path computes, from a full decode: premultiplied box reduce by k."""
+    return load_image_as_rgba(path).convert("RGBa").reduce(k).convert("RGBA")
+
+def _save_tiled_tiff(img: Image.Image, path: str, tile: int) -> None:
+    """Uncompressed RGB TIFF in tile x tile tiles (Pillow only writes strips); edge tiles are padded."""
+    w, h = img.size
+    tiles = []
+    for ty in range(0, h, tile):
+        for tx in range(0, w, tile):
+            padded = Image.new("RGB", (tile, tile))
+            padded.paste(img.crop((tx, ty, min(w, tx + tile), min(h, ty + tile))))
+            tiles.append(padded.tobytes())
+    n = len(tiles)
+    entries = 11
+    ifd = 8
+    extra = ifd + 2 + 12 * entries + 4  # BitsPerSample, TileOffsets, TileByteCounts, then tile data
+    bps, offs, counts = extra, extra + 6, extra + 6 + 4 * n
+    data = counts + 4 * n
+    tags = [(256, 4, 1, w), (257, 4, 1, h), (258, 3, 3, bps), (259, 3, 1, 1), (262, 3, 1, 2),
+            (277, 3, 1, 3), (284, 3, 1, 1), (322, 3, 1, tile), (323, 3, 1, tile),
+            (324, 4, n, offs), (325, 4, n, counts)]
+    out = [b"II*\0", struct.pack("<I", ifd), struct.pack("<H", entries)]
+    out += [struct.pack("<HHII", *t) for t in tags] + [struct.pack("<I", 0), struct.pack("<HHH", 8, 8, 8)]
+    out += [struct.pack("<I", data + i * len(tiles[0])) for i in range(n)]
+    out += [struct.pack("<I", len(t)) for t in tiles] + tiles
+    with open(path, "wb") as f:
+        f.write(b"".join(out))
+
+@pytest.mark.parametrize("fmt,ext,mode", [
+    ("PNG", ".png", "RGB"), ("PNG", ".png", "RGBA"),
+    ("TIFF", ".tif", "RGB"), ("TIFF", ".tif", "RGBA"),
+    ("BMP", ".bmp", "RGB"),
+])
+def test_banded_matches_full_decode(tmp_path, fmt, ext, mode):
+    path = str(tmp_path / ("src" + ext))
+    _source(mode).save(path, fmt)
+    out = load_bounded(path, 64, "pad", max_memory=MAX_MEMORY)
+    assert out is not None, "expected the banded path"
+    k = out.info[DRAFT_SCALE_KEY]
+    assert k > 1
+    ref = _reference(path, k)
+    assert out.size == ref.size
+    assert max(hi for _, hi in ImageChops.difference(out, ref).getextrema()) == 0
+
+def test_tiled_tiff_matches_full_decode(tmp_path):
+    path = str(tmp_path / "tiles.tif")
+    src = _source("RGB")
+    _save_tiled_tiff(src, path, 256)
+    with Image.open(path) as img:
+        assert len(img.tile) > 1 and img.tile[-1][1][2] - img.tile[-1][1][0] < 256  # clipped edge tiles
+        assert img.convert("RGB").tobytes() == src.tobytes()
+    out = load_bounded(path, 64, "crop", max_memory=MAX_MEMORY)
+    assert out is not None
+    ref = _reference(path, out.info[DRAFT_SCALE_KEY])
+    assert max(hi for _, hi in ImageChops.difference(out, ref).getextrema()) == 0
+
+def test_raw_bands_allocate_band_sized_buffers(tmp_path):
+    path = str(tmp_path / "src.tif")
+    _source("RGB").save(path, "TIFF")
+    with Image.open(path) as img:
+        bands = list(tiled._raw_bands(img, path, 100))
+    assert [b.im.size for b in bands] == [(W, 100)] * (H // 100)
+
+def test_compressed_tiff_over_budget_warns(tmp_path):
+    path = str(tmp_path / "lzw.tif")
+    _source("RGB").save(path, "TIFF", compression="tiff_lzw")
+    with pytest.warns(RuntimeWarning, match="cannot be decoded in bands"):
+        assert load_bounded(path, 64, "pad", max_memory=MAX_MEMORY) is None
+
+def test_small_sources_use_the_normal_path(tmp_path):
+    path = str(tmp_path / "src.png")
+    _source("RGB").save(path, "PNG")
+    assert load_bounded(path, 64, "pad", max_memory=1024 ** 3) is None
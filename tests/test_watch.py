@@ -0,0 +1,71 @@
+"""IconWatcher backends and the inotify watch-limit fallback."""
+import errno
+import os
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from pIcon.core import watch
+from pIcon.core.watch import IconWatcher, WatchLimitError
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+
+def _limit(*_args, **_kwargs):
+    raise WatchLimitError(errno.ENOSPC, "inotify_add_watch(x): No space left on device")
+
+@linux_only
+def test_watch_limit_at_start_falls_back_to_polling(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch._InotifyBackend, "_watch_tree", _limit)
+    for name in ("auto", "inotify"):
+        with pytest.warns(RuntimeWarning, match="falling back to polling"):
+            backend = watch._make_backend(name, str(tmp_path), str(tmp_path / "out"), 1.0)
+        assert backend.name == "poll"
+
+@linux_only
+def test_watch_limit_while_running_falls_back_and_keeps_converting(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    monkeypatch.setattr(watch._InotifyBackend, "changes", _limit)
+    events = []
+    watcher = IconWatcher(str(src), str(out), [16], debounce=0.05, poll_interval=0.1,
+                          backend="inotify", workers=1, on_event=events.append)
+    with pytest.warns(RuntimeWarning, match="falling back to polling"):
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            Image.new("RGBA", (40, 40), (1, 2, 3, 255)).save(src / "a.png")
+            deadline = time.monotonic() + 30
+            while not events and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+            thread.join(30)
+    assert watcher.backend_name == "poll"
+    assert events and events[0].result.ok
+    assert (out / "a.ico").exists()
+
+@pytest.mark.parametrize("backend", ["poll"] + (["inotify"] if sys.platform.startswith("linux") else []))
+def test_in_place_watch_never_converts_its_own_output(tmp_path, backend):
+    existing = tmp_path / "old.ico"
+    existing.write_bytes(b"not ours")
+    events = []
+    watcher = IconWatcher(str(tmp_path), str(tmp_path), [16], debounce=0.05, poll_interval=0.1,
+                          backend=backend, workers=1, on_event=events.append)
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        time.sleep(0.2)
+        Image.new("RGBA", (40, 40), (1, 2, 3, 255)).save(tmp_path / "a.png")
+        deadline = time.monotonic() + 30
+        while not events and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(1.0)  # long enough for several polls and debounces of a.ico
+    finally:
+        watcher.stop()
+        thread.join(30)
+    assert [os.path.basename(e.result.job.input_path) for e in events] == ["a.png"]
+    assert (tmp_path / "a.ico").exists() and existing.read_bytes() == b"not ours"